@@ -0,0 +1,139 @@
+"""Local store of daily bars and the returns matrices built from it.
+
+Bars are downloaded incrementally (only dates after the newest stored bar,
+and only completed sessions) at most once per REFRESH_INTERVAL per symbol;
+a symbol whose download failed is retried after FAILURE_BACKOFF instead.
+Returns matrices are cached per (symbols, lookback, latest bar date), so
+analytics built on them only recompute when a new bar lands.
+"""
+import threading
+from collections import OrderedDict
+from datetime import datetime, date, timedelta
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+import yfinance as yf
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, select, func
+from app.trading_models import DailyBar
+
+REFRESH_INTERVAL = timedelta(hours=6)
+FAILURE_BACKOFF = timedelta(minutes=5)
+DEFAULT_HISTORY_DAYS = 400
+MATRIX_CACHE_SIZE = 64
+
+_refreshed_at: Dict[str, datetime] = {}
+_matrix_cache: "OrderedDict[tuple, Tuple[List[str], np.ndarray]]" = OrderedDict()
+_lock = threading.Lock()
+
+def latest_bar_date(session: Session, symbols: List[str]) -> Optional[date]:
+    return session.exec(select(func.max(DailyBar.date)).where(DailyBar.symbol.in_(symbols))).one()
+
+def refresh_bars(session: Session, symbols: List[str], history_days: int = DEFAULT_HISTORY_DAYS):
+    """Download bars missing from the store for symbols (one batched call)"""
+    now = datetime.utcnow()
+    with _lock:
+        stale = sorted({s for s in symbols if now - _refreshed_at.get(s, datetime.min) > REFRESH_INTERVAL})
+        for s in stale:
+            _refreshed_at[s] = now # Claimed, so concurrent callers don't download it too
+    if not stale:
+        return
+
+    def failed(symbols):
+        # Retry after FAILURE_BACKOFF rather than a full REFRESH_INTERVAL
+        with _lock:
+            for s in symbols:
+                _refreshed_at[s] = now - REFRESH_INTERVAL + FAILURE_BACKOFF
+
+    latest = dict(session.exec(
+        select(DailyBar.symbol, func.max(DailyBar.date))
+        .where(DailyBar.symbol.in_(stale))
+        .group_by(DailyBar.symbol)
+    ).all())
+    today = now.date()
+    default_start = today - timedelta(days=history_days)
+    start = min(latest[s] + timedelta(days=1) if s in latest else default_start for s in stale)
+    if start >= today:
+        return
+
+    try:
+        data = yf.download(stale, start=start.isoformat(), progress=False, auto_adjust=True)
+    except Exception as e:
+        print(f"⚠️ Bar download failed for {stale}: {e}")
+        failed(stale)
+        return
+    if data is None or data.empty:
+        failed(stale)
+        return
+
+    rows = []
+    missing = []
+    for symbol in stale:
+        try:
+            frame = data.xs(symbol, axis=1, level=1) if isinstance(data.columns, pd.MultiIndex) else data
+        except KeyError:
+            missing.append(symbol)
+            continue
+        frame = frame.dropna(subset=["Close"])
+        if frame.empty:
+            missing.append(symbol)
+            continue
+        after = latest.get(symbol)
+        for ts, row in frame.iterrows():
+            bar_date = ts.date()
+            # Today's bar is still forming; only store completed sessions
+            if bar_date >= today or (after and bar_date <= after):
+                continue
+            rows.append({
+                "symbol": symbol,
+                "date": bar_date,
+                "open": float(row["Open"]),
+                "high": float(row["High"]),
+                "low": float(row["Low"]),
+                "close": float(row["Close"]),
+                "volume": float(row.get("Volume", 0) or 0),
+            })
+    failed(missing)
+    if rows:
+        # Another worker may have stored some of the same bars meanwhile
+        dialect = {"sqlite": sqlite, "postgresql": postgresql}[session.get_bind().dialect.name]
+        session.execute(dialect.insert(DailyBar).on_conflict_do_nothing(index_elements=["symbol", "date"]), rows)
+        session.commit()
+        print(f"📈 Stored {len(rows)} daily bars for {len(stale)} symbols")
+
+def load_closes(session: Session, symbols: List[str], lookback: int) -> pd.DataFrame:
+    """Date x symbol frame of closes covering roughly the last lookback sessions"""
+    # Calendar days cover weekends and holidays with some slack
+    cutoff = date.today() - timedelta(days=int(lookback * 1.6) + 10)
+    rows = session.exec(
+        select(DailyBar.date, DailyBar.symbol, DailyBar.close)
+        .where(DailyBar.symbol.in_(symbols), DailyBar.date >= cutoff)
+    ).all()
+    if not rows:
+        return pd.DataFrame(columns=symbols)
+    closes = pd.DataFrame(rows, columns=["date", "symbol", "close"]).pivot(index="date", columns="symbol", values="close")
+    return closes.sort_index()
+
+def returns_matrix(session: Session, symbols: List[str], lookback: int = 252, as_of: Optional[date] = None) -> Tuple[List[str], np.ndarray]:
+    """Aligned daily simple returns, shape (days, symbols).
+
+    Different exchange calendars are aligned by carrying the last close
+    forward; symbols with no stored bars are dropped from the result. Days
+    any symbol lacks are dropped too, so callers leave out short histories.
+    """
+    key = (tuple(sorted(symbols)), lookback, as_of or latest_bar_date(session, symbols))
+    with _lock:
+        if key in _matrix_cache:
+            _matrix_cache.move_to_end(key)
+            return _matrix_cache[key]
+
+    closes = load_closes(session, list(key[0]), lookback)
+    closes = closes.dropna(axis=1, how="all").ffill()
+    returns = closes.pct_change(fill_method=None).iloc[1:].tail(lookback).dropna()
+    result = (list(returns.columns), returns.to_numpy(dtype=float))
+
+    with _lock:
+        _matrix_cache[key] = result
+        while len(_matrix_cache) > MATRIX_CACHE_SIZE:
+            _matrix_cache.popitem(last=False)
+    return result
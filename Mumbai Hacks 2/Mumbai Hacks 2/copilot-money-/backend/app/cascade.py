@@ -0,0 +1,150 @@
+"""Per-task model selection on top of the LLM gateway.
+
+Each task (routing, answer, summary, ...) has quality tiers, cheapest first;
+a tier lists interchangeable alternates in order of preference. A call tries
+the first tier and moves to the next only when the output fails the task's
+validator. A rate-limited model is failed over to the next alternate at once
+(no backoff) and skipped for a cooldown. Within a tier, models whose observed
+latency (EWMA, tracked by the gateway) is over the task's budget are tried
+after the ones within it.
+"""
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Dict, List, Optional
+from groq import RateLimitError, APIConnectionError, APITimeoutError, InternalServerError
+from app.llm import llm
+from app.jsonstream import parse_json
+
+SMALL = "llama-3.1-8b-instant"
+LARGE = "llama-3.3-70b-versatile"
+COMPOUND = "groq/compound"
+COMPOUND_MINI = "groq/compound-mini"
+
+DEFAULT_COOLDOWN = 20.0
+
+@dataclass
+class TaskPolicy:
+    tiers: List[List[str]]
+    latency_budget: float # seconds
+
+TASKS: Dict[str, TaskPolicy] = {
+    # Small structured outputs: the 8B model is usually enough
+    "routing": TaskPolicy([[SMALL], [LARGE]], latency_budget=1.5),
+    "sentiment": TaskPolicy([[SMALL], [LARGE]], latency_budget=2.0),
+    "summary": TaskPolicy([[SMALL], [LARGE]], latency_budget=3.0),
+    "rebalance": TaskPolicy([[SMALL, "llama3-8b-8192"], [LARGE]], latency_budget=5.0),
+    # Long-form or search-backed output: start with the stronger models
+    "recommendations": TaskPolicy([[LARGE, SMALL]], latency_budget=10.0),
+    "profile": TaskPolicy([[LARGE, SMALL]], latency_budget=10.0),
+    "answer": TaskPolicy([[COMPOUND, COMPOUND_MINI], [LARGE]], latency_budget=15.0),
+    "news": TaskPolicy([[COMPOUND, COMPOUND_MINI], [LARGE]], latency_budget=15.0),
+}
+
+TRANSIENT_ERRORS = (APIConnectionError, APITimeoutError, InternalServerError)
+
+def _retry_after(error: Exception) -> float:
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after")) if response is not None else DEFAULT_COOLDOWN
+    except (TypeError, ValueError):
+        return DEFAULT_COOLDOWN
+
+# Output validators for complete(validate=...)
+def json_object_with(*keys: str) -> Callable[[str], bool]:
+    def validate(text: str) -> bool:
+        data = parse_json(text)
+        return isinstance(data, dict) and all(data.get(k) is not None for k in keys)
+    return validate
+
+def json_list(text: str) -> bool:
+    data = parse_json(text)
+    return isinstance(data, list) and len(data) > 0
+
+def min_length(chars: int) -> Callable[[str], bool]:
+    return lambda text: bool(text) and len(text.strip()) >= chars
+
+class ModelCascade:
+    def __init__(self, tasks: Dict[str, TaskPolicy] = TASKS):
+        self.tasks = tasks
+        self._cooldown_until: Dict[str, float] = {}
+        self.escalations: Dict[str, int] = {}
+
+    def _cool(self, model: str, error: Exception):
+        self._cooldown_until[model] = time.monotonic() + _retry_after(error)
+        print(f"🔀 {model} rate limited, failing over")
+
+    def _order(self, tier: List[str], budget: float) -> List[str]:
+        now = time.monotonic()
+        def rank(model):
+            cooling = self._cooldown_until.get(model, 0) > now
+            slow = llm.latency.get(model, 0) > budget
+            return (cooling, slow) # sorted() is stable, so tier order breaks ties
+        return sorted(tier, key=rank)
+
+    def plan(self, task: str) -> List[List[str]]:
+        """Tiers for task, alternates ordered by availability and latency"""
+        policy = self.tasks[task]
+        return [self._order(tier, policy.latency_budget) for tier in policy.tiers]
+
+    async def complete(self, task: str, messages: List[dict], validate: Optional[Callable[[str], bool]] = None, **params) -> str:
+        """Completion for task from the cheapest model whose output validates.
+
+        If no output validates, the last one is returned; if every model
+        failed, the last error is raised.
+        """
+        tiers = self.plan(task)
+        remaining = sum(len(tier) for tier in tiers)
+        last_text: Optional[str] = None
+        last_error: Optional[Exception] = None
+
+        for tier in tiers:
+            for model in tier:
+                remaining -= 1
+                try:
+                    # With alternates left, fail over instead of backing off
+                    text = await llm.complete(messages, model, max_retries=0 if remaining else None, **params)
+                except RateLimitError as e:
+                    self._cool(model, e)
+                    last_error = e
+                    continue
+                except TRANSIENT_ERRORS as e:
+                    last_error = e
+                    continue
+
+                if validate is None or validate(text):
+                    return text
+                last_text = text
+                self.escalations[task] = self.escalations.get(task, 0) + 1
+                print(f"⬆️ {task}: {model} output failed validation, escalating")
+                remaining -= len(tier) - tier.index(model) - 1
+                break # Next tier
+
+        if last_text is not None:
+            return last_text
+        raise last_error or RuntimeError(f"No model available for {task}")
+
+    async def stream(self, task: str, messages: List[dict], **params) -> AsyncIterator[str]:
+        """Stream task's completion, failing over to the next model if one
+        can't be opened; once text has been yielded errors propagate"""
+        models = [model for tier in self.plan(task) for model in tier]
+        last_error: Optional[Exception] = None
+
+        for i, model in enumerate(models):
+            started = False
+            try:
+                async for delta in llm.stream(messages, model, max_retries=0 if i < len(models) - 1 else None, **params):
+                    started = True
+                    yield delta
+                return
+            except RateLimitError as e:
+                if started:
+                    raise
+                self._cool(model, e)
+                last_error = e
+            except TRANSIENT_ERRORS as e:
+                if started:
+                    raise
+                last_error = e
+        raise last_error or RuntimeError(f"No model available for {task}")
+
+cascade = ModelCascade()
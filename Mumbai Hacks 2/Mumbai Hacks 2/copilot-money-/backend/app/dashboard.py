@@ -0,0 +1,170 @@
+"""Market dashboard built in the background and served as a snapshot.
+
+The dashboard is the same for every user, so instead of fetching the index
+and sector ETFs and asking the LLM for a sentiment score on every request,
+a background task rebuilds it every DASHBOARD_REFRESH_SECONDS. Each build
+becomes a new versioned snapshot with a content ETag; requests just read the
+current one. If a build fails, the previous snapshot keeps being served;
+if there is none yet, requests don't retry the build themselves but wait
+for the next scheduled refresh.
+"""
+import os
+import json
+import asyncio
+import hashlib
+from datetime import datetime, timedelta
+from typing import Optional
+import yfinance as yf
+import pandas as pd
+from starlette.concurrency import run_in_threadpool
+from app.cascade import cascade, json_object_with
+from app.jsonstream import parse_json
+
+REFRESH_SECONDS = float(os.getenv("DASHBOARD_REFRESH_SECONDS", "300"))
+
+INDICES = {
+    "S&P 500": "SPY",
+    "NASDAQ": "QQQ",
+    "Dow Jones": "DIA",
+    "Bitcoin": "BTC-USD"
+}
+SECTORS = {
+    "Tech": "XLK",
+    "Finance": "XLF",
+    "Healthcare": "XLV",
+    "Energy": "XLE",
+    "Consumer": "XLY"
+}
+MOVERS = ["AAPL", "MSFT", "NVDA", "TSLA", "AMZN", "GOOGL", "META"]
+
+SENTIMENT_PROMPT = """Based on recent global financial news (inflation, interest rates, tech earnings), give a market sentiment score from 0 (Extreme Fear) to 100 (Extreme Greed) and a 1 sentence explanation.
+Output JSON only: {"score": <integer 0-100>, "text": "<explanation>"}"""
+
+NEUTRAL_SENTIMENT = {"score": 50, "text": "Market is neutral awaiting further data."}
+
+def _daily_changes(tickers):
+    """{ticker: (last close, % change vs previous close)} in one batched download"""
+    data = yf.download(tickers, period="5d", progress=False, auto_adjust=True)
+    if data is None or data.empty:
+        return {}
+    closes = data["Close"] if isinstance(data.columns, pd.MultiIndex) else data[["Close"]].rename(columns={"Close": tickers[0]})
+    changes = {}
+    for ticker in tickers:
+        if ticker not in closes:
+            continue
+        series = closes[ticker].dropna()
+        if len(series) >= 2:
+            current, prev = float(series.iloc[-1]), float(series.iloc[-2])
+            changes[ticker] = (current, (current - prev) / prev * 100)
+    return changes
+
+class DashboardSnapshot:
+    def __init__(self, version: int, data: dict):
+        self.version = version
+        self.data = data
+        self.generated_at = datetime.utcnow()
+        body = json.dumps(data, sort_keys=True, separators=(",", ":"))
+        self.etag = '"' + hashlib.sha1(body.encode()).hexdigest()[:20] + '"'
+
+class DashboardRefresher:
+    def __init__(self, interval: float = REFRESH_SECONDS):
+        self.interval = interval
+        self.snapshot: Optional[DashboardSnapshot] = None
+        self.failed_at: Optional[datetime] = None # Last failed build
+        self._task: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            print("✅ Dashboard refresher started")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.interval)
+
+    def backing_off(self) -> bool:
+        """Whether a build failed since the last scheduled refresh started"""
+        return self.failed_at is not None and datetime.utcnow() - self.failed_at < timedelta(seconds=self.interval)
+
+    async def current(self) -> Optional[DashboardSnapshot]:
+        """The latest snapshot, building the first one if none exists yet
+        (unless a build just failed: None until the next refresh)"""
+        if self.snapshot is None and not self.backing_off():
+            await self.refresh(only_if_missing=True)
+        return self.snapshot
+
+    async def refresh(self, only_if_missing: bool = False):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if only_if_missing and (self.snapshot is not None or self.backing_off()):
+                return # Built (or failed) by whoever held the lock before us
+            try:
+                data = await self._build()
+            except Exception as e:
+                print(f"⚠️ Dashboard refresh failed: {e}")
+                self.failed_at = datetime.utcnow()
+                return
+            self.failed_at = None
+            snapshot = DashboardSnapshot(self.snapshot.version + 1 if self.snapshot else 1, data)
+            if self.snapshot and snapshot.etag == self.snapshot.etag:
+                # Nothing changed: keep the version (and clients' cached copies) valid
+                self.snapshot.generated_at = snapshot.generated_at
+                return
+            self.snapshot = snapshot
+
+    async def _build(self) -> dict:
+        tickers = list(INDICES.values()) + list(SECTORS.values()) + MOVERS
+        quotes, sentiment = await asyncio.gather(
+            run_in_threadpool(_daily_changes, tickers),
+            self._sentiment(),
+        )
+
+        indices = [
+            {"name": name, "price": round(quotes[t][0], 2), "change": round(quotes[t][1], 2)}
+            for name, t in INDICES.items() if t in quotes
+        ]
+        sectors = [
+            {"name": name, "change": round(quotes[t][1], 2)}
+            for name, t in SECTORS.items() if t in quotes
+        ]
+        movers = sorted((t for t in MOVERS if t in quotes), key=lambda t: abs(quotes[t][1]), reverse=True)[:3]
+        return {
+            "indices": indices,
+            "sectors": sectors,
+            "sentiment": sentiment,
+            "top_movers": [{"symbol": t, "change": round(quotes[t][1], 2)} for t in movers],
+        }
+
+    async def _sentiment(self) -> dict:
+        previous = self.snapshot.data["sentiment"] if self.snapshot else NEUTRAL_SENTIMENT
+        try:
+            text = await cascade.complete(
+                "sentiment",
+                messages=[{"role": "user", "content": SENTIMENT_PROMPT}],
+                validate=json_object_with("score"),
+                max_tokens=100,
+            )
+        except Exception as e:
+            print(f"⚠️ Dashboard sentiment failed: {e}")
+            return previous
+
+        parsed = parse_json(text, default={})
+        score = parsed.get("score") if isinstance(parsed, dict) else None
+        if not isinstance(score, (int, float)) or not 0 <= score <= 100:
+            # Unparseable score: keep the last known one rather than guessing
+            return previous
+        return {"score": int(score), "text": parsed.get("text") or text}
+
+dashboard = DashboardRefresher()
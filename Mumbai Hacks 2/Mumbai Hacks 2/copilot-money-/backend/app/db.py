@@ -1,4 +1,5 @@
 from sqlmodel import SQLModel, create_engine, Session
+from sqlalchemy import inspect, text
 import os
 from dotenv import load_dotenv
 
@@ -39,13 +40,52 @@ engine = create_engine(
     max_overflow=10  # Max connections beyond pool_size
 )
 
-from app.models import ChatSession, ChatMessage, Preference
-from app.trading_models import Portfolio, Holding, Transaction, AutoTradeRule
+from app.models import ChatSession, ChatMessage, Preference, NewsArticle, RetentionPolicy, CodecDictionary
+from app.trading_models import Portfolio, Holding, Transaction, AutoTradeRule, Order, OrderFill, DailyBar, ProfileSummary, Fundamentals
 
 async def init_db():
     # For simple apps, synchronous table creation is fine
     print("Creating tables:", SQLModel.metadata.tables.keys())
     SQLModel.metadata.create_all(engine)
+    add_missing_columns()
+    from app.preference_cache import dedupe_preferences
+    dedupe_preferences(engine)
+    create_missing_indexes()
+    # Imported here because app.news_store imports this module
+    from app.news_store import create_fts_index
+    create_fts_index(engine)
+    from app.message_codec import codec
+    codec.load(engine)
+
+def add_missing_columns():
+    # create_all never alters existing tables; add new columns that carry a
+    # server default so older databases pick them up without a migration
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or column.server_default is None:
+                    continue
+                default = column.server_default.arg
+                default = getattr(default, "text", default)
+                col_type = column.type.compile(dialect=engine.dialect)
+                not_null = "" if column.nullable else " NOT NULL"
+                print(f"Adding column {table.name}.{column.name}")
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}{not_null} DEFAULT {default}"))
+
+def create_missing_indexes():
+    # create_all only builds indexes for tables it creates, so indexes added
+    # to existing models have to be created explicitly on older databases
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(bind=engine, checkfirst=True)
+            except Exception as e:
+                # e.g. a unique index over rows that already have duplicates
+                print(f"⚠️ Could not create index {index.name}: {e}")
 
 def get_session():
     with Session(engine) as session:
@@ -1,10 +1,11 @@
 import time
 import threading
 import yfinance as yf
-from sqlmodel import Session, select
+from sqlmodel import Session, select, update
 from app.db import engine as db_engine
-from app.trading_models import AutoTradeRule, Portfolio, Holding, Transaction, Portfolio
-from datetime import datetime
+from app.trading_models import AutoTradeRule, Portfolio
+from app.execution import OrderRejected, run_with_retry, load_holdings, apply_order, prune_holdings
+from app.orderbook import order_books
 
 class TradingEngine:
     def __init__(self):
@@ -28,13 +29,49 @@ class TradingEngine:
         while self.running:
             try:
                 with Session(db_engine) as session:
-                    self._check_rules(session)
+                    # New orders placed through any API worker join the book
+                    order_books.sync(session)
+                    prices = {}
+                    self._check_rules(session, prices)
+                    self._match_orders(session, prices)
             except Exception as e:
                 print(f"❌ Error in trading engine loop: {e}")
             
             time.sleep(10) # Check every 10 seconds
 
-    def _check_rules(self, session: Session):
+    def _fetch_price(self, symbol: str, prices: dict):
+        """Quote for symbol, fetched at most once per engine tick"""
+        if symbol in prices:
+            return prices[symbol]
+
+        quote_symbol = "AAPL" if symbol == "APPL" else symbol
+        ticker = yf.Ticker(quote_symbol)
+        price = None
+        try:
+            price = ticker.fast_info.last_price
+        except:
+            try:
+                hist = ticker.history(period="1d")
+                if not hist.empty:
+                    price = hist['Close'].iloc[-1]
+                else:
+                    print(f"⚠️ No price data for {quote_symbol}")
+            except Exception as e:
+                print(f"⚠️ Failed to fetch price for {quote_symbol}: {e}")
+
+        prices[symbol] = price
+        return price
+
+    def _match_orders(self, session: Session, prices: dict):
+        for symbol in order_books.symbols():
+            try:
+                price = self._fetch_price(symbol, prices)
+                if price:
+                    order_books.on_quote(session, symbol, price)
+            except Exception as e:
+                print(f"⚠️ Error matching orders for {symbol}: {e}")
+
+    def _check_rules(self, session: Session, prices: dict):
         rules = session.exec(select(AutoTradeRule).where(AutoTradeRule.active == True)).all()
         if not rules:
             return
@@ -43,26 +80,7 @@ class TradingEngine:
         
         for rule in rules:
             try:
-                # Fetch price
-                symbol = rule.symbol
-                if symbol == "APPL":
-                    symbol = "AAPL"
-                
-                ticker = yf.Ticker(symbol)
-                try:
-                    price = ticker.fast_info.last_price
-                except:
-                    try:
-                        hist = ticker.history(period="1d")
-                        if not hist.empty:
-                            price = hist['Close'].iloc[-1]
-                        else:
-                            print(f"⚠️ No price data for {symbol}")
-                            continue
-                    except Exception as e:
-                        print(f"⚠️ Failed to fetch price for {symbol}: {e}")
-                        continue
-
+                price = self._fetch_price(rule.symbol, prices)
                 if not price:
                     continue
                 
@@ -87,63 +105,37 @@ class TradingEngine:
                 print(f"⚠️ Error processing rule {rule.id}: {e}")
 
     def _execute_trade(self, session: Session, rule: AutoTradeRule, price: float):
-        # Get portfolio
-        portfolio = session.exec(select(Portfolio).where(Portfolio.user_id == rule.user_id)).first()
-        if not portfolio:
-            # Create if not exists (though usually should exist)
-            portfolio = Portfolio(user_id=rule.user_id)
-            session.add(portfolio)
-            session.commit()
-            session.refresh(portfolio)
-            
-        cost = price * rule.quantity
-        
-        if rule.action == "BUY":
-            if portfolio.balance >= cost:
-                portfolio.balance -= cost
-                
-                # Update holding
-                holding = session.exec(select(Holding).where(Holding.portfolio_id == portfolio.id, Holding.symbol == rule.symbol)).first()
-                if holding:
-                    total_cost = (holding.quantity * holding.average_price) + cost
-                    total_qty = holding.quantity + rule.quantity
-                    holding.average_price = total_cost / total_qty
-                    holding.quantity = total_qty
-                else:
-                    holding = Holding(portfolio_id=portfolio.id, symbol=rule.symbol, quantity=rule.quantity, average_price=price)
-                    session.add(holding)
-                
-                self._record_transaction(session, portfolio.id, rule, price)
-                rule.active = False # Deactivate after execution
-                session.add(rule)
-                session.add(portfolio)
-                session.commit()
-                print(f"✅ Auto-Trade Executed: BUY {rule.symbol}")
-                
-        elif rule.action == "SELL":
-            holding = session.exec(select(Holding).where(Holding.portfolio_id == portfolio.id, Holding.symbol == rule.symbol)).first()
-            if holding and holding.quantity >= rule.quantity:
-                portfolio.balance += cost
-                holding.quantity -= rule.quantity
-                if holding.quantity == 0:
-                    session.delete(holding)
-                
-                self._record_transaction(session, portfolio.id, rule, price)
-                rule.active = False
-                session.add(rule)
+        rule_id, user_id = rule.id, rule.user_id
+        symbol, action, quantity = rule.symbol, rule.action, rule.quantity
+
+        def work():
+            # Claim the rule first so another engine process can't fire it too
+            claimed = session.execute(
+                update(AutoTradeRule)
+                .where(AutoTradeRule.id == rule_id, AutoTradeRule.active == True)
+                .values(active=False) # Deactivate after execution
+            )
+            if claimed.rowcount == 0:
+                return False
+
+            # Get portfolio
+            portfolio = session.exec(select(Portfolio).where(Portfolio.user_id == user_id)).first()
+            if not portfolio:
+                # Create if not exists (though usually should exist)
+                portfolio = Portfolio(user_id=user_id)
                 session.add(portfolio)
-                session.commit()
-                print(f"✅ Auto-Trade Executed: SELL {rule.symbol}")
-
-    def _record_transaction(self, session: Session, portfolio_id: int, rule: AutoTradeRule, price: float):
-        txn = Transaction(
-            portfolio_id=portfolio_id,
-            symbol=rule.symbol,
-            type=rule.action,
-            quantity=rule.quantity,
-            price=price,
-            timestamp=datetime.utcnow()
-        )
-        session.add(txn)
+                session.flush()
+
+            holdings = load_holdings(session, portfolio, [symbol])
+            apply_order(session, portfolio, holdings, symbol, action, quantity, price)
+            prune_holdings(session, holdings)
+            return True
+
+        try:
+            if run_with_retry(session, work):
+                print(f"✅ Auto-Trade Executed: {action} {symbol}")
+        except OrderRejected as e:
+            # Rule stays active until the portfolio can cover it
+            print(f"⏸️ Auto-Trade skipped for {symbol}: {e}")
 
 trading_engine = TradingEngine()
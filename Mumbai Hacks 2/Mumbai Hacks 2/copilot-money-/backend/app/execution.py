@@ -0,0 +1,119 @@
+"""Order execution shared by the paper-trading API and the trading engine.
+
+Portfolio and Holding rows carry a version column, so every UPDATE is
+conditional on the row being unchanged since it was read. A unit of work that
+loses a race to another worker is rolled back and re-run against fresh state,
+which makes it safe to run several API workers and engine processes at once.
+"""
+import time
+import random
+from typing import Callable, List, Optional
+from sqlmodel import Session, select
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm.exc import StaleDataError
+from app.trading_models import Portfolio, Holding, Transaction
+
+MAX_ATTEMPTS = 8
+
+class OrderRejected(Exception):
+    pass
+
+class ConcurrentUpdateError(Exception):
+    pass
+
+def run_with_retry(db: Session, work: Callable, attempts: int = MAX_ATTEMPTS):
+    """Run work() and commit, retrying when another writer got there first.
+
+    A rollback expires everything in the session, so work() must re-read any
+    rows it depends on rather than closing over ones loaded earlier.
+    """
+    for attempt in range(attempts):
+        try:
+            result = work()
+            db.commit()
+            return result
+        except (StaleDataError, IntegrityError) as e:
+            # Lost update (version mismatch) or duplicate holding insert
+            db.rollback()
+            if attempt == attempts - 1:
+                raise ConcurrentUpdateError("Portfolio is busy, please retry") from e
+            time.sleep(random.uniform(0, 0.005 * 2 ** attempt))
+        except OperationalError as e:
+            # SQLite refuses a second writer until the busy timeout runs out
+            db.rollback()
+            if "database is locked" not in str(e):
+                raise
+            if attempt == attempts - 1:
+                raise ConcurrentUpdateError("Portfolio is busy, please retry") from e
+            time.sleep(random.uniform(0, 0.005 * 2 ** attempt))
+        except Exception:
+            db.rollback()
+            raise
+
+def load_holdings(db: Session, portfolio: Portfolio, symbols: Optional[List[str]] = None) -> dict:
+    q = select(Holding).where(Holding.portfolio_id == portfolio.id)
+    if symbols is not None:
+        q = q.where(Holding.symbol.in_(symbols))
+    return {h.symbol: h for h in db.exec(q).all()}
+
+def apply_order(db: Session, portfolio: Portfolio, holdings: dict, symbol: str, side: str, quantity: int, price: float) -> Transaction:
+    """Apply a filled order to the in-session portfolio and holdings.
+
+    Nothing is committed here, so callers can apply several orders and commit
+    once. Raises OrderRejected if the order can't be filled.
+    """
+    if quantity <= 0:
+        raise OrderRejected("Quantity must be positive")
+    cost = price * quantity
+    holding = holdings.get(symbol)
+
+    if side == "BUY":
+        if portfolio.balance < cost:
+            raise OrderRejected("Insufficient funds")
+
+        portfolio.balance -= cost
+
+        # Update or create holding
+        if holding:
+            # Avg price calculation
+            total_cost = (holding.quantity * holding.average_price) + cost
+            total_qty = holding.quantity + quantity
+            holding.average_price = total_cost / total_qty
+            holding.quantity = total_qty
+        else:
+            holding = Holding(portfolio_id=portfolio.id, symbol=symbol, quantity=quantity, average_price=price)
+            holdings[symbol] = holding
+        db.add(holding)
+
+    elif side == "SELL":
+        if not holding or holding.quantity < quantity:
+            raise OrderRejected("Insufficient holdings")
+
+        portfolio.balance += cost
+        holding.quantity -= quantity
+        db.add(holding)
+
+    else:
+        raise OrderRejected(f"Unknown order type {side}")
+
+    # Record transaction
+    txn = Transaction(
+        portfolio_id=portfolio.id,
+        symbol=symbol,
+        type=side,
+        quantity=quantity,
+        price=price
+    )
+    db.add(txn)
+    db.add(portfolio)
+    return txn
+
+def prune_holdings(db: Session, holdings: dict):
+    """Drop holdings that were sold down to zero"""
+    for symbol, holding in list(holdings.items()):
+        if holding.quantity == 0:
+            if holding in db.new:
+                db.expunge(holding)
+            else:
+                db.delete(holding)
+            del holdings[symbol]
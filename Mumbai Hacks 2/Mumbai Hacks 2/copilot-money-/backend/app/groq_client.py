@@ -1,23 +1,24 @@
 import os
-from groq import Groq
 from dotenv import load_dotenv
+from app.llm import llm, LLM_BACKEND
 load_dotenv()
 
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-if not GROQ_API_KEY:
+if not GROQ_API_KEY and LLM_BACKEND != "standin":
     raise RuntimeError("Please set GROQ_API_KEY in environment variables (.env)")
 
-client = Groq(api_key=GROQ_API_KEY)
-
-def ask_groq(prompt: str, model: str = "llama-3.1-8b-instant", temperature: float = 0.2, max_tokens: int = 512):
-    messages = [
+def _messages(prompt: str):
+    return [
         {"role": "system", "content": "You are an expert trading assistant. Return concise JSON when requested."},
         {"role": "user", "content": prompt},
     ]
 
-    response = client.chat.completions.create(
+async def ask_groq(prompt: str, model: str = "llama-3.1-8b-instant", temperature: float = 0.2, max_tokens: int = 512):
+    messages = _messages(prompt)
+
+    response = await llm.chat(
+        messages,
         model=model,
-        messages=messages,
         temperature=temperature,
         max_tokens=max_tokens,
     )
@@ -25,3 +26,8 @@ def ask_groq(prompt: str, model: str = "llama-3.1-8b-instant", temperature: floa
     result = response.choices[0].message.content
     executed = getattr(response.choices[0].message, "executed_tools", None)
     return {"content": result, "executed_tools": executed}
+
+async def stream_groq(prompt: str, model: str = "llama-3.1-8b-instant", temperature: float = 0.2, max_tokens: int = 512):
+    """ask_groq, yielding the reply as it is generated"""
+    async for delta in llm.stream(_messages(prompt), model=model, temperature=temperature, max_tokens=max_tokens):
+        yield delta
@@ -0,0 +1,230 @@
+"""Local fast-path router for /trades queries.
+
+Decides which UI components ("chart", "news", "answer") a query needs and
+which symbol it is about without an LLM round trip. Keyword/regex rules cover
+the common phrasings; a small naive Bayes model per component, trained on the
+decisions the LLM router made (logged to INTENT_LOG_PATH), covers the rest.
+When neither is confident enough the caller falls back to the LLM, and that
+decision is logged and learned from.
+"""
+import os
+import re
+import json
+import math
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+LOG_PATH = os.getenv("INTENT_LOG_PATH", "./intent_log.jsonl")
+CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_CONFIDENCE", "0.85"))
+MIN_TRAINING_SAMPLES = 50
+MAX_LOG_SAMPLES = 20000
+COMPONENTS = ("chart", "news", "answer")
+
+# Company names and aliases users type instead of tickers
+KNOWN_SYMBOLS: Dict[str, Tuple[str, str]] = {
+    "apple": ("AAPL", "Apple"), "aapl": ("AAPL", "Apple"), "appl": ("AAPL", "Apple"),
+    "microsoft": ("MSFT", "Microsoft"), "msft": ("MSFT", "Microsoft"),
+    "google": ("GOOGL", "Google"), "alphabet": ("GOOGL", "Alphabet"), "googl": ("GOOGL", "Google"),
+    "amazon": ("AMZN", "Amazon"), "amzn": ("AMZN", "Amazon"),
+    "tesla": ("TSLA", "Tesla"), "tsla": ("TSLA", "Tesla"),
+    "nvidia": ("NVDA", "Nvidia"), "nvda": ("NVDA", "Nvidia"),
+    "meta": ("META", "Meta"), "facebook": ("META", "Meta"),
+    "netflix": ("NFLX", "Netflix"), "nflx": ("NFLX", "Netflix"),
+    "amd": ("AMD", "AMD"), "intel": ("INTC", "Intel"),
+    "jpmorgan": ("JPM", "JPMorgan"), "visa": ("V", "Visa"), "walmart": ("WMT", "Walmart"),
+    "disney": ("DIS", "Disney"), "coca-cola": ("KO", "Coca-Cola"), "pepsi": ("PEP", "PepsiCo"),
+    "boeing": ("BA", "Boeing"), "uber": ("UBER", "Uber"), "paypal": ("PYPL", "PayPal"),
+    "spy": ("SPY", "S&P 500"), "s&p": ("SPY", "S&P 500"), "nasdaq": ("QQQ", "Nasdaq"),
+    "bitcoin": ("BTC-USD", "Bitcoin"), "btc": ("BTC-USD", "Bitcoin"),
+    "ethereum": ("ETH-USD", "Ethereum"), "eth": ("ETH-USD", "Ethereum"),
+    "solana": ("SOL-USD", "Solana"), "dogecoin": ("DOGE-USD", "Dogecoin"),
+    "reliance": ("RELIANCE.NS", "Reliance"), "tcs": ("TCS.NS", "TCS"), "infosys": ("INFY", "Infosys"),
+    "hdfc": ("HDFCBANK.NS", "HDFC Bank"), "nifty": ("^NSEI", "Nifty 50"), "sensex": ("^BSESN", "Sensex"),
+    "gold": ("GC=F", "Gold"), "oil": ("CL=F", "Crude Oil"), "eurusd": ("EURUSD=X", "EUR/USD"),
+}
+
+# Upper-case words that are not tickers
+NOT_TICKERS = {
+    "I", "A", "AM", "PM", "CEO", "CFO", "IPO", "ETF", "ETFS", "USA", "US", "UK", "EU", "GDP", "CPI",
+    "AI", "EPS", "PE", "FAQ", "OK", "ROI", "ESG", "FED", "SEC", "USD", "INR", "EUR", "THE", "AND",
+    "WHAT", "IS", "IT", "TO", "OF", "ON", "IN", "ME", "MY", "DO", "BUY", "SELL", "HOLD", "NEWS",
+}
+
+_TICKER = re.compile(r"(?<![\w$])\$?([A-Z]{1,5}(?:[.-][A-Z]{1,4}|=[XF])?)(?![\w])")
+_WORD = re.compile(r"[a-z0-9&\-/']+")
+
+RULES = {
+    "chart": re.compile(r"\b(chart|graph|price|prices|trading at|quote|candles?|performance|performing|how is .* doing|ticker)\b"),
+    "news": re.compile(r"\b(news|headlines?|latest|updates?|happening|happened|announce\w*|earnings|events?|today)\b"),
+    "answer": re.compile(r"^(what|why|how|explain|should|is|are|can|does|do|which|when|compare|tell me)\b|\?|\b(explain|meaning|definition|difference|vs|versus|outlook|analysis|analy[sz]e|worth|invest)\b"),
+}
+ONLY_CHART = re.compile(r"^(show|open|display|plot)?\s*(me)?\s*(the)?\s*(\S+\s+)?(chart|graph|price chart)\b")
+ONLY_NEWS = re.compile(r"^(show me |get |any )?(the )?(latest )?(news|headlines)( about| on| for)?\b")
+
+def extract_symbol(query: str) -> Tuple[Optional[str], Optional[str]]:
+    """(symbol, display name) mentioned in the query, or (None, None)"""
+    lowered = query.lower()
+    for word in _WORD.findall(lowered):
+        if word in KNOWN_SYMBOLS:
+            return KNOWN_SYMBOLS[word]
+    for match in _TICKER.finditer(query):
+        token = match.group(1)
+        explicit = match.group(0).startswith("$")
+        if explicit or (len(token) >= 2 and token not in NOT_TICKERS):
+            return token, token
+    return None, None
+
+def _features(query: str, symbol: Optional[str]) -> List[str]:
+    lowered = query.lower()
+    words = _WORD.findall(lowered)
+    # Symbols are abstracted away so the model generalizes across tickers
+    words = ["__sym__" if w in KNOWN_SYMBOLS or (symbol and w == symbol.lower()) else w for w in words]
+    features = set(words)
+    features.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    features.add("__has_symbol__" if symbol else "__no_symbol__")
+    if "?" in query:
+        features.add("__question__")
+    features.add(f"__len_{min(len(words), 6)}__")
+    return sorted(features)
+
+class NaiveBayes:
+    """Bernoulli-style naive Bayes, one binary classifier per component.
+
+    Counts are updated in place, so learning a new example is O(features).
+    """
+
+    def __init__(self):
+        self.samples = 0
+        self.positive = defaultdict(int)
+        self.counts = {c: (defaultdict(int), defaultdict(int)) for c in COMPONENTS}
+        self.vocabulary = set()
+
+    def learn(self, features: List[str], components: List[str]):
+        self.samples += 1
+        self.vocabulary.update(features)
+        for c in COMPONENTS:
+            label = c in components
+            if label:
+                self.positive[c] += 1
+            table = self.counts[c][1 if label else 0]
+            for f in features:
+                table[f] += 1
+
+    def predict(self, features: List[str]) -> Dict[str, float]:
+        """Probability that each component is wanted"""
+        probs = {}
+        for c in COMPONENTS:
+            pos = self.positive[c]
+            neg = self.samples - pos
+            log_odds = math.log((pos + 1) / (neg + 1))
+            no, yes = self.counts[c]
+            for f in features:
+                if f not in self.vocabulary:
+                    continue # Never seen in training: no evidence either way
+                log_odds += math.log((yes.get(f, 0) + 1) / (pos + 2)) - math.log((no.get(f, 0) + 1) / (neg + 2))
+            probs[c] = 1 / (1 + math.exp(-max(-30.0, min(30.0, log_odds))))
+        return probs
+
+class IntentRouter:
+    def __init__(self, log_path: str = LOG_PATH, threshold: float = CONFIDENCE_THRESHOLD):
+        self.log_path = log_path
+        self.threshold = threshold
+        self.model = NaiveBayes()
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._pending: List[str] = [] # Log lines not yet written
+        self._write_lock = threading.Lock()
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if not os.path.exists(self.log_path):
+            return
+        try:
+            with open(self.log_path) as f:
+                lines = f.readlines()[-MAX_LOG_SAMPLES:]
+        except OSError as e:
+            print(f"⚠️ Could not read intent log: {e}")
+            return
+        for line in lines:
+            try:
+                entry = json.loads(line)
+                symbol, _ = extract_symbol(entry["query"])
+                self.model.learn(_features(entry["query"], symbol), entry["components"])
+            except (ValueError, KeyError, TypeError):
+                continue
+        print(f"🧭 Intent model trained on {self.model.samples} logged decisions")
+
+    def _rules(self, query: str, symbol: Optional[str]) -> Optional[Tuple[List[str], float]]:
+        lowered = query.lower().strip()
+        if ONLY_CHART.match(lowered) and symbol:
+            return ["chart"], 0.95
+        if ONLY_NEWS.match(lowered):
+            return ["news"], 0.95
+        hits = [c for c in COMPONENTS if RULES[c].search(lowered)]
+        words = _WORD.findall(lowered)
+        if symbol and not hits and len(words) <= 3:
+            # A bare company or ticker: show everything about it
+            return ["chart", "news", "answer"], 0.95
+        if not symbol and hits == ["answer"]:
+            return ["answer"], 0.9
+        if "market" in words and "news" in hits and "chart" not in hits:
+            return ["news", "answer"], 0.9
+        return None
+
+    def route(self, query: str) -> Optional[dict]:
+        """Routing decision, or None when the LLM router should decide"""
+        symbol, name = extract_symbol(query)
+        with self._lock:
+            self._load()
+            decision = self._rules(query, symbol)
+            if decision is None and self.model.samples >= MIN_TRAINING_SAMPLES:
+                features = _features(query, symbol)
+                # Priors alone aren't enough; some word of the query must be known
+                if any(f in self.model.vocabulary for f in features if not f.startswith("__")):
+                    probs = self.model.predict(features)
+                    components = [c for c in COMPONENTS if probs[c] >= 0.5]
+                    # Every per-component call has to be confident, not just the average
+                    confidence = min(max(p, 1 - p) for p in probs.values())
+                    decision = (components, confidence) if components else None
+
+        if decision is None:
+            return None
+        components, confidence = decision
+        if confidence < self.threshold or ("chart" in components and not symbol):
+            return None
+        return {
+            "components": components,
+            "symbol": symbol,
+            "topic": name or query,
+            "route": "fast",
+            "confidence": round(confidence, 3),
+        }
+
+    def record(self, query: str, decision: dict):
+        """Learn from a decision made by the LLM router and queue it for the
+        log; flush() (blocking, so run it in a thread) writes the queue"""
+        components = [c for c in decision.get("components") or [] if c in COMPONENTS]
+        if not components:
+            return
+        symbol, _ = extract_symbol(query)
+        with self._lock:
+            self._load()
+            self.model.learn(_features(query, symbol), components)
+            self._pending.append(json.dumps({"query": query, "components": components, "symbol": decision.get("symbol")}) + "\n")
+
+    def flush(self):
+        with self._write_lock:
+            with self._lock:
+                lines, self._pending = self._pending, []
+            if not lines:
+                return
+            try:
+                with open(self.log_path, "a") as f:
+                    f.writelines(lines)
+            except OSError as e:
+                print(f"⚠️ Could not write intent log: {e}")
+
+intent_router = IntentRouter()
@@ -0,0 +1,214 @@
+"""Incremental, tolerant JSON extraction for LLM output.
+
+JSONStreamParser consumes text chunks as they arrive and builds the first
+JSON object or array in them, skipping any prose or ``` fences around it. It
+returns elements of watched arrays (e.g. each "news_items" entry) as soon as
+they close, so callers can act on them before the completion finishes.
+
+Common model mistakes are repaired rather than rejected: trailing or missing
+commas, single-quoted strings, unquoted keys, Python literals (True/None),
+raw newlines in strings, and output cut off mid-value (close() closes
+whatever is still open). Parsing is a single pass over each chunk.
+"""
+import re
+import json
+from typing import Any, Iterable, List, Optional, Tuple
+
+_LITERALS = {
+    "true": True, "false": False, "null": None,
+    "True": True, "False": False, "None": None,
+    "NaN": None, "Infinity": None, "-Infinity": None,
+}
+_NUMBER = re.compile(r"-?\d+(\.\d+)?([eE][+-]?\d+)?$")
+_BARE = re.compile(r"[^\s,:\[\]{}\"']+")
+_ESCAPES = {'"': '"', "'": "'", "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+class _Frame:
+    __slots__ = ("value", "path", "key", "expect_key")
+
+    def __init__(self, value, path: Tuple[str, ...]):
+        self.value = value
+        self.path = path
+        self.key: Optional[str] = None
+        self.expect_key = isinstance(value, dict)
+
+class JSONStreamParser:
+    def __init__(self, items_at: Iterable = ()):
+        # Paths are key tuples from the root; a plain string is one key and
+        # () watches the root array itself
+        self.items_at = {(p,) if isinstance(p, str) else tuple(p) for p in items_at}
+        self.root: Any = None
+        self.started = False
+        self.done = False
+        self._stack: List[_Frame] = []
+        self._string: Optional[List[str]] = None
+        self._quote = '"'
+        self._escape = ""
+        self._bare = ""
+        self._emitted: List[Tuple[Tuple[str, ...], Any]] = []
+
+    def feed(self, chunk: str) -> List[Tuple[Tuple[str, ...], Any]]:
+        """Consume chunk; returns (path, element) for watched array elements
+        completed by it"""
+        i, n = 0, len(chunk)
+        while i < n and not self.done:
+            if self._string is not None:
+                i = self._read_string(chunk, i)
+                continue
+            if self._bare:
+                m = _BARE.match(chunk, i)
+                if m:
+                    self._bare += m.group()
+                    i = m.end()
+                    if i == n:
+                        break
+                self._finish_bare()
+                continue
+
+            c = chunk[i]
+            if not self.started:
+                # Skip prose and code fences until the JSON starts
+                j = min((k for k in (chunk.find("{", i), chunk.find("[", i)) if k >= 0), default=-1)
+                if j < 0:
+                    break
+                self.started = True
+                i = j
+                continue
+
+            if c in "{[":
+                container = {} if c == "{" else []
+                self._push(container)
+            elif c in "}]":
+                self._pop()
+            elif c in "\"'":
+                self._string = []
+                self._quote = c
+            elif not c.isspace() and c not in ",:":
+                # Separators carry no information once values are tracked,
+                # which is what makes missing or extra commas harmless
+                self._bare = c
+            i += 1
+
+        emitted, self._emitted = self._emitted, []
+        return emitted
+
+    def close(self) -> Any:
+        """Finish parsing, closing anything the output left open; returns the
+        root value (None if no JSON was found)"""
+        if not self.done:
+            if self._string is not None:
+                text = "".join(self._string)
+                self._string = None
+                self._value(text)
+            if self._bare:
+                self._finish_bare()
+            while self._stack:
+                self._pop()
+        return self.root
+
+    def _read_string(self, chunk: str, i: int) -> int:
+        parts = self._string
+        n = len(chunk)
+        while i < n:
+            if self._escape:
+                self._escape += chunk[i]
+                i += 1
+                code = self._escape[1:]
+                if code[0] == "u":
+                    if len(code) < 5:
+                        continue
+                    try:
+                        parts.append(chr(int(code[1:], 16)))
+                    except ValueError:
+                        parts.append(code[1:])
+                else:
+                    parts.append(_ESCAPES.get(code, code))
+                self._escape = ""
+                continue
+            # Copy the run up to the next quote or backslash in one slice
+            q = chunk.find(self._quote, i)
+            b = chunk.find("\\", i)
+            stop = min(k for k in (q, b, n) if k >= 0)
+            parts.append(chunk[i:stop])
+            i = stop
+            if i == n:
+                break
+            if chunk[i] == "\\":
+                self._escape = "\\"
+                i += 1
+            else:
+                self._string = None
+                self._value("".join(parts))
+                return i + 1
+        return i
+
+    def _finish_bare(self):
+        token, self._bare = self._bare, ""
+        frame = self._stack[-1] if self._stack else None
+        if frame is not None and isinstance(frame.value, dict) and frame.expect_key:
+            self._value(token) # Unquoted key
+        elif token in _LITERALS:
+            self._value(_LITERALS[token])
+        elif _NUMBER.match(token):
+            self._value(json.loads(token))
+        else:
+            self._value(token)
+
+    def _push(self, container):
+        if not self._stack:
+            self.root = container
+            self._stack.append(_Frame(container, ()))
+            return
+        parent = self._stack[-1]
+        path = parent.path + ((parent.key or ""),) if isinstance(parent.value, dict) else parent.path
+        self._attach(container)
+        self._stack.append(_Frame(container, path))
+
+    def _pop(self):
+        if not self._stack:
+            return
+        frame = self._stack.pop()
+        if not self._stack:
+            self.done = True
+            return
+        self._maybe_emit(frame.value)
+
+    def _value(self, value):
+        frame = self._stack[-1] if self._stack else None
+        if frame is None:
+            return
+        if isinstance(frame.value, dict) and frame.expect_key:
+            frame.key = str(value)
+            frame.expect_key = False
+            return
+        self._attach(value)
+        self._maybe_emit(value)
+
+    def _attach(self, value):
+        frame = self._stack[-1]
+        if isinstance(frame.value, list):
+            frame.value.append(value)
+            return
+        if frame.key is not None:
+            frame.value[frame.key] = value
+        frame.key = None
+        frame.expect_key = True
+
+    def _maybe_emit(self, value):
+        frame = self._stack[-1]
+        if isinstance(frame.value, list) and frame.path in self.items_at:
+            self._emitted.append((frame.path, value))
+
+def parse_json(text: Optional[str], default: Any = None) -> Any:
+    """The first JSON object or array in text, repaired; default if none"""
+    if not text:
+        return default
+    try:
+        # Well-formed output is the common case; the C parser is much faster
+        return json.loads(text)
+    except ValueError:
+        pass
+    parser = JSONStreamParser()
+    parser.feed(text)
+    result = parser.close()
+    return default if result is None else result
@@ -0,0 +1,226 @@
+"""Shared async gateway for every LLM call in the backend.
+
+One pooled AsyncGroq client is reused across requests. Calls are bounded by a
+global and a per-model semaphore, paced by per-model token buckets sized to
+the provider's requests/min and tokens/min limits, and retried with jittered
+exponential backoff on 429s and transient server errors.
+"""
+import os
+import time
+import random
+import asyncio
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import httpx
+from dotenv import load_dotenv
+from groq import AsyncGroq, RateLimitError, APIConnectionError, APITimeoutError, InternalServerError
+from app.llm_cache import response_cache, cache_key
+
+load_dotenv()
+
+# (requests per minute, tokens per minute) per model, from the Groq limits page
+MODEL_LIMITS: Dict[str, Tuple[int, int]] = {
+    "llama-3.3-70b-versatile": (30, 12000),
+    "llama-3.1-8b-instant": (30, 6000),
+    "llama3-8b-8192": (30, 6000),
+    "groq/compound": (30, 70000),
+    "groq/compound-mini": (30, 70000),
+}
+DEFAULT_LIMITS = (30, 6000)
+# Multiplies the limits above, e.g. for load tests against the stand-in
+RATE_LIMIT_SCALE = float(os.getenv("LLM_RATE_LIMIT_SCALE", "1"))
+
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+PER_MODEL_CONCURRENCY = int(os.getenv("LLM_PER_MODEL_CONCURRENCY", "4"))
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 20.0
+LATENCY_ALPHA = 0.2
+# "groq", or "standin" to answer from app.llm_standin in-process (offline load tests)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "groq")
+STANDIN_URL = "http://llm-standin"
+
+class TokenBucket:
+    """Refills continuously at rate_per_min; acquire() waits for capacity"""
+
+    def __init__(self, rate_per_min: float):
+        self.capacity = float(rate_per_min)
+        self.tokens = float(rate_per_min)
+        self.rate = rate_per_min / 60.0
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1.0):
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= amount
+
+    def drain(self):
+        # The provider says we're over the limit; stop spending until refill
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+
+def _estimate_tokens(messages: List[dict], max_tokens: Optional[int]) -> int:
+    prompt_chars = sum(len(m.get("content") or "") for m in messages)
+    return prompt_chars // 4 + (max_tokens or 512)
+
+def _retry_delay(attempt: int, error: Exception) -> float:
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return float(retry_after) + random.uniform(0, 0.25)
+        except ValueError:
+            pass
+    # Full jitter exponential backoff
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+class LLMGateway:
+    def __init__(self):
+        self._client: Optional[AsyncGroq] = None
+        self._global: Optional[asyncio.Semaphore] = None
+        self._model_sems: Dict[str, asyncio.Semaphore] = {}
+        self._request_buckets: Dict[str, TokenBucket] = {}
+        self._token_buckets: Dict[str, TokenBucket] = {}
+        # EWMA of successful call latency (seconds) per model
+        self.latency: Dict[str, float] = {}
+
+    @property
+    def client(self) -> AsyncGroq:
+        if self._client is None:
+            # GROQ_BASE_URL (read by the SDK) can point at a stand-in server instead
+            base_url, transport = None, None
+            if LLM_BACKEND == "standin":
+                from app.llm_standin import standin_app
+                base_url, transport = STANDIN_URL, httpx.ASGITransport(app=standin_app)
+                print("🧪 LLM calls answered by the in-process stand-in")
+            self._client = AsyncGroq(
+                api_key=os.getenv("GROQ_API_KEY") or LLM_BACKEND,
+                base_url=base_url,
+                max_retries=0, # Retries are handled here, with the limiter
+                http_client=httpx.AsyncClient(
+                    transport=transport,
+                    limits=httpx.Limits(max_connections=MAX_CONCURRENCY, max_keepalive_connections=MAX_CONCURRENCY),
+                    timeout=httpx.Timeout(60.0, connect=5.0),
+                ),
+            )
+        return self._client
+
+    def _observe(self, model: str, seconds: float):
+        previous = self.latency.get(model)
+        self.latency[model] = seconds if previous is None else previous + LATENCY_ALPHA * (seconds - previous)
+
+    def _limits_for(self, model: str):
+        if self._global is None:
+            self._global = asyncio.Semaphore(MAX_CONCURRENCY)
+        if model not in self._model_sems:
+            rpm, tpm = MODEL_LIMITS.get(model, DEFAULT_LIMITS)
+            self._model_sems[model] = asyncio.Semaphore(PER_MODEL_CONCURRENCY)
+            self._request_buckets[model] = TokenBucket(rpm * RATE_LIMIT_SCALE)
+            self._token_buckets[model] = TokenBucket(tpm * RATE_LIMIT_SCALE)
+        return self._model_sems[model], self._request_buckets[model], self._token_buckets[model]
+
+    async def chat(self, messages: List[dict], model: str, temperature: Optional[float] = None, max_tokens: Optional[int] = None, max_retries: Optional[int] = None, **kwargs):
+        """chat.completions.create through the limiter; returns the raw completion.
+
+        max_retries overrides LLM_MAX_RETRIES, e.g. 0 when the caller has
+        another model to fail over to.
+        """
+        model_sem, requests, tokens = self._limits_for(model)
+        params = {k: v for k, v in (("temperature", temperature), ("max_tokens", max_tokens)) if v is not None}
+        params.update(kwargs)
+        retries = MAX_RETRIES if max_retries is None else max_retries
+
+        for attempt in range(retries + 1):
+            try:
+                # Wait for this model's limits before taking a global slot, so
+                # a burst on one rate-limited model can't starve the others
+                async with model_sem:
+                    await requests.acquire(1)
+                    await tokens.acquire(_estimate_tokens(messages, max_tokens))
+                    async with self._global:
+                        started_at = time.monotonic()
+                        completion = await self.client.chat.completions.create(model=model, messages=messages, **params)
+                        self._observe(model, time.monotonic() - started_at)
+                        return completion
+            except RateLimitError as e:
+                requests.drain()
+                error = e
+            except (APIConnectionError, APITimeoutError, InternalServerError) as e:
+                error = e
+            if attempt == retries:
+                raise error
+            delay = _retry_delay(attempt, error)
+            print(f"⏳ LLM {model} retry {attempt + 1}/{retries} in {delay:.1f}s: {type(error).__name__}")
+            # Back off outside the semaphores so other calls keep flowing
+            await asyncio.sleep(delay)
+
+    async def stream(self, messages: List[dict], model: str, temperature: Optional[float] = None, max_tokens: Optional[int] = None, max_retries: Optional[int] = None, **kwargs) -> AsyncIterator[str]:
+        """Yield content deltas as the provider streams them.
+
+        Opening the stream goes through the same limiter and retries as
+        chat(); once tokens have been yielded an error is raised to the
+        caller instead of retried, since the text can't be taken back.
+        """
+        model_sem, requests, tokens = self._limits_for(model)
+        params = {k: v for k, v in (("temperature", temperature), ("max_tokens", max_tokens)) if v is not None}
+        params.update(kwargs)
+        retries = MAX_RETRIES if max_retries is None else max_retries
+        started = False
+
+        for attempt in range(retries + 1):
+            try:
+                async with model_sem:
+                    await requests.acquire(1)
+                    await tokens.acquire(_estimate_tokens(messages, max_tokens))
+                    async with self._global:
+                        started_at = time.monotonic()
+                        response = await self.client.chat.completions.create(model=model, messages=messages, stream=True, **params)
+                        # Time to completion as chat() measures it, less the time
+                        # the caller spends between deltas
+                        waited, resumed_at = 0.0, started_at
+                        async for chunk in response:
+                            delta = chunk.choices[0].delta.content if chunk.choices else None
+                            if delta:
+                                started = True
+                                waited += time.monotonic() - resumed_at
+                                yield delta
+                                resumed_at = time.monotonic()
+                        self._observe(model, waited + time.monotonic() - resumed_at)
+                        return
+            except RateLimitError as e:
+                requests.drain()
+                error = e
+            except (APIConnectionError, APITimeoutError, InternalServerError) as e:
+                error = e
+            if started or attempt == retries:
+                raise error
+            delay = _retry_delay(attempt, error)
+            print(f"⏳ LLM {model} stream retry {attempt + 1}/{retries} in {delay:.1f}s: {type(error).__name__}")
+            await asyncio.sleep(delay)
+
+    async def complete(self, messages: List[dict], model: str, temperature: Optional[float] = None, max_tokens: Optional[int] = None, cache_ttl: Optional[float] = None, max_retries: Optional[int] = None, **kwargs) -> str:
+        """Completion text. With cache_ttl (seconds) an identical call within
+        the TTL is answered from app.llm_cache without touching the provider."""
+        key = None
+        if cache_ttl and not kwargs:
+            key = cache_key(messages, model, temperature, max_tokens)
+            cached = await response_cache.get(key)
+            if cached is not None:
+                return cached
+
+        completion = await self.chat(messages, model, temperature=temperature, max_tokens=max_tokens, max_retries=max_retries, **kwargs)
+        content = completion.choices[0].message.content
+        if key and content:
+            await response_cache.set(key, content, cache_ttl)
+        return content
+
+llm = LLMGateway()
@@ -0,0 +1,131 @@
+"""Response cache for LLM completions.
+
+Entries are keyed on the normalized prompt, model, temperature and
+max_tokens, and expire after a per-call-site TTL. Hot entries live in an
+in-memory LRU; everything is also written to a local SQLite file so the cache
+survives restarts and is shared by workers on the same host. get() and
+set() are async and run the SQLite tier in the threadpool.
+"""
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from starlette.concurrency import run_in_threadpool
+
+CACHE_PATH = os.getenv("LLM_CACHE_PATH", "./llm_cache.db")
+MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "2048"))
+DISK_ENTRIES = int(os.getenv("LLM_CACHE_DISK_ENTRIES", "50000"))
+
+# (expires_at, response)
+Entry = Tuple[float, str]
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize(text: str) -> str:
+    return _WHITESPACE.sub(" ", text or "").strip().casefold()
+
+def cache_key(messages: List[dict], model: str, temperature: Optional[float], max_tokens: Optional[int]) -> str:
+    payload = json.dumps({
+        "messages": [[m.get("role"), normalize(m.get("content"))] for m in messages],
+        "model": model,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+    }, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class ResponseCache:
+    def __init__(self, path: str = CACHE_PATH, memory_entries: int = MEMORY_ENTRIES, disk_entries: int = DISK_ENTRIES):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self._memory: "OrderedDict[str, Entry]" = OrderedDict()
+        self._lock = threading.Lock() # Guards the in-memory LRU
+        self._db_lock = threading.Lock() # Guards the SQLite connection
+        self._db: Optional[sqlite3.Connection] = None
+        self._writes = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_expires ON llm_cache (expires_at)")
+        return self._db
+
+    def _from_memory(self, key: str, now: float) -> Optional[str]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            if entry[0] > now:
+                self._memory.move_to_end(key)
+                return entry[1]
+            del self._memory[key]
+            return None
+
+    def _from_disk(self, key: str, now: float) -> Optional[str]:
+        with self._db_lock:
+            try:
+                row = self._conn().execute(
+                    "SELECT value, expires_at FROM llm_cache WHERE key = ? AND expires_at > ?", (key, now)
+                ).fetchone()
+            except sqlite3.Error as e:
+                print(f"⚠️ LLM cache read failed: {e}")
+                return None
+        if row is None:
+            return None
+        with self._lock:
+            self._remember(key, row[1], row[0])
+        return row[0]
+
+    def _store(self, key: str, value: str, expires_at: float, now: float):
+        with self._db_lock:
+            try:
+                conn = self._conn()
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, expires_at, created_at) VALUES (?, ?, ?, ?)",
+                    (key, value, expires_at, now),
+                )
+                self._writes += 1
+                if self._writes % 500 == 0:
+                    self._prune(conn, now)
+            except sqlite3.Error as e:
+                print(f"⚠️ LLM cache write failed: {e}")
+
+    async def get(self, key: str) -> Optional[str]:
+        """Only the in-memory check runs on the event loop"""
+        now = time.time()
+        value = self._from_memory(key, now)
+        return value if value is not None else await run_in_threadpool(self._from_disk, key, now)
+
+    async def set(self, key: str, value: str, ttl: float):
+        now = time.time()
+        with self._lock:
+            self._remember(key, now + ttl, value)
+        await run_in_threadpool(self._store, key, value, now + ttl, now)
+
+    def _remember(self, key: str, expires_at: float, value: str):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _prune(self, conn: sqlite3.Connection, now: float):
+        conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+        # Keep the disk store bounded, dropping the oldest entries first
+        conn.execute(
+            "DELETE FROM llm_cache WHERE key IN ("
+            "SELECT key FROM llm_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.disk_entries,),
+        )
+
+response_cache = ResponseCache()
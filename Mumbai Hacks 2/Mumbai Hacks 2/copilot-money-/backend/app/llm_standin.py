@@ -0,0 +1,276 @@
+"""Offline stand-in for the Groq chat completions API, for load testing.
+
+Speaks the OpenAI-compatible /openai/v1/chat/completions protocol (plain and
+SSE streaming) and answers each prompt family the backend sends (routing,
+answers, news, summaries, recommendations, profiles, ...) with templated
+output of the right shape, so the request pipeline can be driven without
+spending quota. Latency is drawn from a lognormal distribution, tokens are
+streamed at a fixed rate, and a share of requests can be answered with 429.
+
+Every random draw comes from a generator seeded with STANDIN_SEED, the model,
+the prompt and how many times that prompt has been seen, so a run with the
+same requests gets the same latencies, 429s and outputs whatever order the
+requests interleave in.
+
+Select it with LLM_BACKEND=standin (in-process, no socket; a stream arrives
+in one piece when it completes) or run it as a server and point the client
+at it, which also gives real time-to-first-token:
+
+    python -m app.llm_standin --port 8090
+    GROQ_BASE_URL=http://127.0.0.1:8090 uvicorn main:app
+"""
+import os
+import json
+import time
+import uuid
+import random
+import asyncio
+import hashlib
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from app.intent import extract_symbol, RULES
+
+SEED = int(os.getenv("STANDIN_SEED", "0"))
+LATENCY_MS = float(os.getenv("STANDIN_LATENCY_MS", "300")) # median time to first token
+LATENCY_SIGMA = float(os.getenv("STANDIN_LATENCY_SIGMA", "0.5")) # lognormal spread; 0.5 puts p99 at ~3.2x the median
+TOKENS_PER_SEC = float(os.getenv("STANDIN_TOKENS_PER_SEC", "250"))
+RATE_LIMIT_RATE = float(os.getenv("STANDIN_429_RATE", "0"))
+RETRY_AFTER = float(os.getenv("STANDIN_RETRY_AFTER", "1"))
+
+# Relative speed of the models the backend uses
+MODEL_LATENCY_SCALE = {
+    "llama-3.1-8b-instant": 0.5,
+    "llama3-8b-8192": 0.5,
+    "llama-3.3-70b-versatile": 1.0,
+    "groq/compound-mini": 2.0,
+    "groq/compound": 3.0,
+}
+
+def _seeded(model: str, prompt: str, nth: int) -> random.Random:
+    digest = hashlib.sha256(f"{SEED}\x00{model}\x00{nth}\x00{prompt}".encode()).digest()
+    return random.Random(int.from_bytes(digest[:8], "big"))
+
+def _user_text(messages: List[dict]) -> str:
+    return next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+
+def _topic(messages: List[dict]) -> Tuple[str, str]:
+    text = _user_text(messages)
+    symbol, name = extract_symbol(text)
+    return symbol or "SPY", name or "the market"
+
+SOURCES = ["Reuters", "Bloomberg", "CNBC", "MarketWatch", "Financial Times", "Economic Times"]
+HEADLINES = [
+    "{name} shares rise after strong quarterly earnings",
+    "Analysts upgrade {name} on robust demand outlook",
+    "{name} faces regulatory probe over pricing",
+    "{name} announces new product launch and partnership",
+    "Investors weigh {name} outlook amid rate uncertainty",
+    "{name} stock slips as supply concerns weigh",
+]
+PICKS = [("AAPL", "Apple", "Stock"), ("MSFT", "Microsoft", "Stock"), ("NVDA", "Nvidia", "Stock"),
+         ("VOO", "Vanguard S&P 500 ETF", "ETF"), ("JNJ", "Johnson & Johnson", "Stock"), ("BTC-USD", "Bitcoin", "Crypto")]
+
+def _news_items(rng: random.Random, name: str, count: int) -> List[dict]:
+    items = []
+    for i, template in enumerate(rng.sample(HEADLINES, count)):
+        title = template.format(name=name)
+        items.append({
+            "title": title,
+            "summary": f"{title}. Traders are watching how the move affects near-term guidance.",
+            "source": rng.choice(SOURCES),
+            "url": f"https://news.example.com/{name.lower().replace(' ', '-')}/{i + 1}",
+            "date": "Nov 23, 2025",
+            "sentiment": rng.choice(["Positive", "Negative", "Neutral"]),
+        })
+    return items
+
+def _routing(rng, messages):
+    text = _user_text(messages)
+    symbol, name = extract_symbol(text)
+    lowered = text.lower()
+    components = [c for c in ("chart", "news", "answer") if RULES[c].search(lowered)] or ["answer"]
+    if symbol and components == ["answer"]:
+        components = ["chart", "news", "answer"]
+    return json.dumps({"components": components, "symbol": symbol, "topic": name or text[:40]})
+
+def _answer_stream(rng, messages):
+    _, name = _topic(messages)
+    body = " ".join([
+        f"**{name}** has been trading in a range recently.",
+        "Earnings, guidance and the rate outlook are the main drivers to watch.",
+        "Consider position sizing and diversification before acting on any single view.",
+    ] * rng.randint(1, 3))
+    return body + '\n---SUGGESTIONS---\n["What are the risks?", "How does it compare to peers?", "Is it a good long-term hold?"]'
+
+def _news(rng, messages):
+    _, name = _topic(messages)
+    return json.dumps({
+        "main_insight": f"{name} is in focus after a busy news cycle with mixed signals for investors.",
+        "news_items": _news_items(rng, name, 5),
+        "recommendations": [],
+    })
+
+def _ticker_news(rng, messages):
+    prompt = _user_text(messages)
+    ticker = prompt.split("'")[1] if prompt.count("'") >= 2 else "AAPL"
+    return json.dumps([{
+        "title": item["title"], "source": item["source"], "timestamp": "2025-11-23T10:00:00Z",
+        "summary": item["summary"], "sentiment": item["sentiment"].lower(),
+        "impact": rng.choice(["high", "medium", "low"]), "url": item["url"],
+    } for item in _news_items(rng, ticker, 6)])
+
+def _company_summary(rng, messages):
+    return ("The company designs, manufactures and sells products and services across several segments worldwide. "
+            "It generates most of its revenue from its core business and is expanding into adjacent markets.")
+
+def _explanation(rng, messages):
+    return ("These picks score well on the factors your answers weight most. "
+            "Their volatility stays within what your risk tolerance allows, and they are spread across your chosen sectors.")
+
+def _recommendations(rng, messages):
+    picks = rng.sample(PICKS, rng.randint(3, 5))
+    return "```json\n" + json.dumps({
+        "summary": "These picks balance growth potential with your stated risk tolerance. They fit the sectors and amount you selected.",
+        "recommendations": [{
+            "symbol": symbol, "name": name, "reason": f"{name} has solid fundamentals and analyst support.",
+            "match_reason": "Matches your risk tolerance and sector preferences", "risk_level": rng.choice(["Low", "Medium", "High"]),
+            "type": kind, "source": rng.choice(SOURCES),
+            "buy_price": f"${rng.randint(50, 400)}.00", "sell_price": f"${rng.randint(401, 600)}.00",
+        } for symbol, name, kind in picks],
+    }, indent=2) + "\n```"
+
+def _profile(rng, messages):
+    paragraph = ("Based on your recent trading activity, you have been consistently active with moderate position sizes, "
+                 "favouring large-cap technology names. Your buys tend to cluster after pullbacks, which suggests a patient swing-trading style.")
+    return "\n\n".join([paragraph] * 3)
+
+def _sentiment(rng, messages):
+    return json.dumps({"score": rng.randint(30, 70), "text": "Markets are balancing cooling inflation against rate uncertainty."})
+
+def _rebalance(rng, messages):
+    return json.dumps([
+        {"action": "Reduce Tech exposure", "from": "TCS", "to": "HDFCBANK", "rationale": "Tech is over-weight relative to the index.", "impact": "Lower risk"},
+        {"action": "Add index exposure", "from": "Cash", "to": "NIFTYBEES", "rationale": "Idle cash drags on returns.", "impact": "+1.5% expected return"},
+        {"action": "Trim winners", "from": "INFY", "to": "Cash", "rationale": "Lock in part of recent gains.", "impact": "Lower volatility"},
+    ])
+
+def _chat(rng, messages):
+    symbol, _ = extract_symbol(_user_text(messages).split('User message: "', 1)[-1].split('"', 1)[0])
+    metadata = {"news": {"ticker": symbol}, "chart": {"ticker": symbol}} if symbol else {"news": None, "chart": None}
+    return "Happy to help. Here is a quick take on your question, keeping risk and time horizon in mind.\n---METADATA---\n" + json.dumps(metadata)
+
+# (needle in the prompt, responder); the first match wins
+FAMILIES: List[Tuple[str, Callable[[random.Random, List[dict]], str]]] = [
+    ("financial query router", _routing),
+    ("financial news summarizer", _news),
+    ("---SUGGESTIONS---", _answer_stream),
+    ("Summarize this company description", _company_summary),
+    ("Search Results", _recommendations),
+    ("why these picks fit", _explanation),
+    ("trading psychology", _profile),
+    ("market sentiment score", _sentiment),
+    ("rebalancing suggestions", _rebalance),
+    ("---METADATA---", _chat),
+    ("most recent news articles", _ticker_news),
+]
+
+def respond(messages: List[dict], rng: random.Random) -> str:
+    prompt = "\n".join(m.get("content") or "" for m in messages)
+    for needle, responder in FAMILIES:
+        if needle in prompt:
+            return responder(rng, messages)
+    return "OK"
+
+def _chunks(text: str, size: int = 16) -> List[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+class StandIn:
+    def __init__(self):
+        self.seen: Dict[Tuple[str, str], int] = defaultdict(int)
+        self.stats: Dict[str, int] = defaultdict(int)
+
+    def draw(self, model: str, messages: List[dict]) -> Tuple[random.Random, float, bool]:
+        """(generator, time to first token, whether to answer 429)"""
+        prompt = json.dumps(messages, sort_keys=True)
+        key = (model, hashlib.sha1(prompt.encode()).hexdigest())
+        nth = self.seen[key]
+        self.seen[key] += 1
+        rng = _seeded(model, prompt, nth)
+        latency = LATENCY_MS / 1000 * MODEL_LATENCY_SCALE.get(model, 1.0) * rng.lognormvariate(0, LATENCY_SIGMA)
+        return rng, latency, rng.random() < RATE_LIMIT_RATE
+
+standin = StandIn()
+standin_app = FastAPI(title="LLM stand-in")
+
+def _usage(messages: List[dict], text: str) -> dict:
+    prompt_tokens = sum(len(m.get("content") or "") for m in messages) // 4
+    completion_tokens = len(text) // 4
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+@standin_app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "")
+    messages = body.get("messages") or []
+    rng, latency, limited = standin.draw(model, messages)
+
+    if limited:
+        standin.stats["429"] += 1
+        return JSONResponse(
+            status_code=429,
+            headers={"retry-after": str(RETRY_AFTER)},
+            content={"error": {"message": f"Rate limit reached for model `{model}` (stand-in)", "type": "requests", "code": "rate_limit_exceeded"}},
+        )
+
+    text = respond(messages, rng)
+    max_tokens = body.get("max_tokens")
+    if max_tokens:
+        text = text[:max_tokens * 4]
+    standin.stats["ok"] += 1
+    completion_id = f"chatcmpl-{uuid.UUID(int=rng.getrandbits(128))}"
+    created = int(time.time())
+    await asyncio.sleep(latency)
+
+    if not body.get("stream"):
+        # Non-streamed calls still pay for generating every token
+        await asyncio.sleep(len(text) / 4 / TOKENS_PER_SEC)
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": _usage(messages, text),
+        }
+
+    async def events():
+        def chunk(delta: dict, finish_reason: Optional[str] = None) -> str:
+            return "data: " + json.dumps({
+                "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }) + "\n\n"
+
+        yield chunk({"role": "assistant", "content": ""})
+        for piece in _chunks(text):
+            await asyncio.sleep(len(piece) / 4 / TOKENS_PER_SEC)
+            yield chunk({"content": piece})
+        yield chunk({}, "stop")
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@standin_app.get("/stats")
+def stats():
+    return dict(standin.stats)
+
+if __name__ == "__main__":
+    import argparse
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Offline Groq-compatible LLM stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    args = parser.parse_args()
+    uvicorn.run(standin_app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,159 @@
+"""Offline stand-in for the market data and search sources, for load testing.
+
+The companion of app.llm_standin: install() swaps yfinance's download and
+Ticker and the DuckDuckGo client for versions that answer from synthetic
+data, so the request pipeline (news ingestion, price snapshots, bars,
+fundamentals, chart data, web search) runs without network and a load test
+measures the backend rather than DNS timeouts. Bars are a random walk
+seeded by the symbol, so every run sees the same prices.
+
+load_test.py installs it for in-process runs with LLM_BACKEND=standin.
+"""
+import random
+import hashlib
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Union
+import numpy as np
+import pandas as pd
+from app.llm_standin import SOURCES, HEADLINES
+
+PERIOD_DAYS = {"1d": 1, "5d": 7, "1mo": 31, "3mo": 92, "6mo": 183, "1y": 366, "2y": 731, "5y": 1827, "max": 3650}
+
+def _seed(*parts) -> int:
+    return int.from_bytes(hashlib.sha256("\x00".join(map(str, parts)).encode()).digest()[:8], "big")
+
+def bars(symbol: str, start: date, end: date) -> pd.DataFrame:
+    """Business-day OHLCV for symbol; the same dates always get the same prices"""
+    epoch = date(2015, 1, 1)
+    days = pd.bdate_range(epoch, end - timedelta(days=1))
+    rng = np.random.default_rng(_seed("bars", symbol) % 2**32)
+    base = 20 + _seed("price", symbol) % 480
+    returns = rng.normal(0.0003, 0.018, len(days))
+    close = base * np.exp(np.cumsum(returns))
+    spread = np.abs(rng.normal(0, 0.01, len(days)))
+    frame = pd.DataFrame({
+        "Open": close * (1 - spread / 2),
+        "High": close * (1 + spread),
+        "Low": close * (1 - spread),
+        "Close": close,
+        "Volume": rng.integers(100_000, 10_000_000, len(days)).astype(float),
+    }, index=days)
+    return frame[frame.index >= pd.Timestamp(start)]
+
+def _range(period: Optional[str], start: Optional[str], end: Optional[str]):
+    end_date = date.fromisoformat(end) if end else date.today() + timedelta(days=1)
+    if start:
+        return date.fromisoformat(start), end_date
+    return end_date - timedelta(days=PERIOD_DAYS.get(period or "1mo", 31)), end_date
+
+def download(tickers: Union[str, List[str]], period: Optional[str] = None, start: Optional[str] = None, end: Optional[str] = None, **kwargs) -> pd.DataFrame:
+    """yf.download: a list gets (field, ticker) columns, a single string plain ones"""
+    first, last = _range(period, start, end)
+    if isinstance(tickers, str) and " " not in tickers:
+        return bars(tickers, first, last)
+    symbols = tickers.split() if isinstance(tickers, str) else list(tickers)
+    frames = {s: bars(s, first, last) for s in symbols}
+    data = pd.concat(frames, axis=1) # (ticker, field)
+    return data.swaplevel(axis=1).sort_index(axis=1)
+
+class _FastInfo:
+    def __init__(self, symbol: str):
+        self.last_price = float(bars(symbol, date.today() - timedelta(days=10), date.today() + timedelta(days=1))["Close"].iloc[-1])
+
+class Ticker:
+    def __init__(self, symbol: str):
+        self.ticker = symbol
+
+    @property
+    def fast_info(self) -> _FastInfo:
+        return _FastInfo(self.ticker)
+
+    def history(self, period: str = "1mo", **kwargs) -> pd.DataFrame:
+        return download(self.ticker, period=period)
+
+    @property
+    def info(self) -> dict:
+        rng = random.Random(_seed("info", self.ticker))
+        price = self.fast_info.last_price
+        return {
+            "symbol": self.ticker,
+            "shortName": self.ticker,
+            "longName": f"{self.ticker} Holdings",
+            "quoteType": "EQUITY",
+            "currency": "USD",
+            "sector": rng.choice(["Technology", "Healthcare", "Financial Services", "Energy", "Consumer Cyclical"]),
+            "industry": "Diversified",
+            "marketCap": rng.randint(2, 3000) * 10**9,
+            "trailingPE": round(rng.uniform(8, 60), 2),
+            "trailingAnnualDividendYield": round(rng.uniform(0, 0.04), 4),
+            "returnOnEquity": round(rng.uniform(-0.1, 0.4), 4),
+            "profitMargins": round(rng.uniform(-0.05, 0.35), 4),
+            "debtToEquity": round(rng.uniform(0, 200), 2),
+            "revenueGrowth": round(rng.uniform(-0.1, 0.3), 4),
+            "earningsGrowth": round(rng.uniform(-0.2, 0.4), 4),
+            "targetMeanPrice": round(price * rng.uniform(0.85, 1.3), 2),
+            "longBusinessSummary": (f"{self.ticker} designs, manufactures and sells products and services across several "
+                                    "segments worldwide, and is expanding into adjacent markets."),
+        }
+
+    @property
+    def financials(self) -> pd.DataFrame:
+        """Annual income statement: one column per fiscal year end"""
+        rng = random.Random(_seed("financials", self.ticker))
+        revenue = rng.randint(5, 400) * 10**9
+        years = [pd.Timestamp(date.today().year - i, 12, 31) for i in range(1, 5)]
+        figures = {}
+        for year in years:
+            figures[year] = {"Total Revenue": float(revenue), "Net Income": float(revenue * rng.uniform(0.05, 0.25))}
+            revenue /= 1 + rng.uniform(-0.05, 0.2)
+        return pd.DataFrame(figures)
+
+    @property
+    def news(self) -> List[dict]:
+        now = datetime.utcnow().replace(microsecond=0)
+        return [{
+            "content": {
+                "title": item["title"],
+                "summary": item["body"],
+                "pubDate": (now - timedelta(hours=i)).isoformat() + "Z",
+                "canonicalUrl": {"url": item["url"]},
+                "provider": {"displayName": item["source"]},
+            },
+        } for i, item in enumerate(_articles(self.ticker, 8))]
+
+def _articles(topic: str, count: int) -> List[dict]:
+    # A new batch every hour, like a live feed
+    hour = datetime.utcnow().strftime("%Y%m%d%H")
+    rng = random.Random(_seed("news", topic, hour))
+    slug = "".join(c if c.isalnum() else "-" for c in topic.lower())
+    return [{
+        "title": template.format(name=topic),
+        "body": f"Traders are watching how the latest {topic} news affects near-term guidance.",
+        "source": rng.choice(SOURCES),
+        "url": f"https://news.example.com/{slug}/{hour}/{i}",
+        "date": (datetime.utcnow() - timedelta(hours=i)).isoformat(),
+    } for i, template in enumerate(rng.sample(HEADLINES, min(count, len(HEADLINES))))]
+
+class DDGS:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def news(self, keywords: str, max_results: int = 10) -> List[dict]:
+        return _articles(keywords.replace(" stock news", ""), max_results)
+
+    def text(self, query: str, max_results: int = 10) -> List[dict]:
+        return [{"title": a["title"], "body": a["body"], "href": a["url"]} for a in _articles(query, max_results)]
+
+def install():
+    """Route every market data and search call through the stand-in"""
+    import yfinance
+    import app.news_store
+    import app.recommendations
+    yfinance.download = download
+    yfinance.Ticker = Ticker
+    app.news_store.DDGS = DDGS
+    app.recommendations.DDGS = DDGS
+    print("🧪 Market data and search answered by the offline stand-in")
@@ -0,0 +1,195 @@
+"""Compressed storage for chat message content.
+
+Assistant messages are JSON payloads that repeat the same keys and
+boilerplate in every row. With MESSAGE_CODEC=1, ChatMessage.content values
+of MIN_LENGTH characters or more are stored deflated with a shared preset
+dictionary, as "zd:<dictionary id>:<base64>"; dictionary 0 means plain zlib.
+The column type decodes on every read, so callers always see the original
+text, and rows written before the codec was enabled (or after it's turned
+off) read back unchanged.
+
+Dictionaries are trained from stored transcripts and kept in the
+codec_dictionary table so every process can decode every row:
+
+    python -m app.message_codec train        # new dictionary from recent assistant messages
+    python -m app.message_codec recompress   # rewrite stored rows with the latest one
+
+bench_codec.py reports the savings and decode cost.
+"""
+import os
+import re
+import sys
+import zlib
+import base64
+import threading
+from collections import Counter
+from typing import Dict, List, Optional
+from sqlalchemy.types import TypeDecorator
+from sqlmodel import AutoString
+
+ENABLED = os.getenv("MESSAGE_CODEC", "0") == "1"
+MIN_LENGTH = 200 # Shorter content is stored as is
+MARKER = "zd:"
+LEVEL = 6
+DICTIONARY_SIZE = 32 * 1024 # zlib only uses the last 32 KB of a dictionary
+
+# JSON-ish tokens: quoted strings (with a following colon for keys),
+# punctuation runs, whitespace and bare words/numbers
+TOKEN = re.compile(r'"(?:[^"\\]|\\.){0,48}"\s*:?\s*|[\[\]{},]+\s*|\s+|[^"\[\]{},\s]{1,24}')
+NGRAMS = (1, 2, 3, 4, 6, 8)
+
+def train_dictionary(samples: List[str], size: int = DICTIONARY_SIZE) -> bytes:
+    """Preset dictionary of the fragments that save the most bytes across samples.
+
+    Candidates are runs of 1-8 tokens; each scores (number of samples it
+    appears in) x (its length). zlib reaches the end of the dictionary most
+    cheaply, so the best fragments go last.
+    """
+    seen = Counter()
+    for text in samples:
+        tokens = TOKEN.findall(text)
+        fragments = set()
+        for n in NGRAMS:
+            for i in range(len(tokens) - n + 1):
+                fragment = "".join(tokens[i:i + n])
+                if 4 <= len(fragment) <= 256:
+                    fragments.add(fragment)
+        seen.update(fragments)
+
+    min_count = 2 if len(samples) > 1 else 1
+    ranked = sorted((f for f, c in seen.items() if c >= min_count), key=lambda f: (seen[f] * len(f), f), reverse=True)
+    chosen: List[str] = []
+    total = 0
+    for fragment in ranked:
+        length = len(fragment.encode())
+        if total + length > size or any(fragment in c for c in chosen):
+            continue
+        chosen.append(fragment)
+        total += length
+        if total >= size - 4:
+            break
+    return "".join(reversed(chosen)).encode()
+
+class MessageCodec:
+    def __init__(self, enabled: bool = ENABLED):
+        self.enabled = enabled
+        self.dictionaries: Dict[int, bytes] = {}
+        self.current = 0 # Dictionary new rows are written with
+        self._lock = threading.Lock()
+
+    def load(self, bind):
+        """Load every stored dictionary; the newest becomes current"""
+        from sqlmodel import Session, select
+        from app.models import CodecDictionary
+        with Session(bind) as db:
+            rows = db.exec(select(CodecDictionary).order_by(CodecDictionary.id)).all()
+        with self._lock:
+            for row in rows:
+                self.dictionaries[row.id] = row.data
+            if rows:
+                self.current = rows[-1].id
+
+    def _dictionary(self, dictionary_id: int) -> Optional[bytes]:
+        if dictionary_id == 0:
+            return None
+        if dictionary_id not in self.dictionaries:
+            # Trained by another process since we loaded
+            from app.db import engine
+            self.load(engine)
+        return self.dictionaries[dictionary_id]
+
+    def compress(self, text: str, dictionary_id: Optional[int] = None) -> str:
+        dictionary_id = self.current if dictionary_id is None else dictionary_id
+        zdict = self._dictionary(dictionary_id)
+        compressor = zlib.compressobj(LEVEL, zdict=zdict) if zdict else zlib.compressobj(LEVEL)
+        packed = compressor.compress(text.encode()) + compressor.flush()
+        return f"{MARKER}{dictionary_id}:{base64.b64encode(packed).decode()}"
+
+    def encode(self, text: str) -> str:
+        # Text that happens to start with the marker is always encoded, so
+        # decode never mistakes plain text for a compressed value
+        if text.startswith(MARKER):
+            return self.compress(text)
+        if not self.enabled or len(text) < MIN_LENGTH:
+            return text
+        packed = self.compress(text)
+        return packed if len(packed) < len(text) else text
+
+    def decode(self, value: str) -> str:
+        if not value.startswith(MARKER):
+            return value
+        try:
+            head, _, body = value[len(MARKER):].partition(":")
+            zdict = self._dictionary(int(head))
+            decompressor = zlib.decompressobj(zdict=zdict) if zdict else zlib.decompressobj()
+            return (decompressor.decompress(base64.b64decode(body)) + decompressor.flush()).decode()
+        except Exception as e:
+            print(f"⚠️ Could not decode message content: {e}")
+            return value
+
+codec = MessageCodec()
+
+class CompressedText(TypeDecorator):
+    """String column stored through the message codec"""
+    impl = AutoString
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return codec.encode(value) if value is not None else None
+
+    def process_result_value(self, value, dialect):
+        return codec.decode(value) if value is not None else None
+
+def train(sample_size: int = 2000) -> Optional[int]:
+    """Train a dictionary from the most recent assistant messages and store it"""
+    from sqlmodel import Session, select, desc
+    from app.db import engine
+    from app.models import ChatMessage, CodecDictionary
+    with Session(engine) as db:
+        samples = db.exec(
+            select(ChatMessage.content).where(ChatMessage.role == "assistant").order_by(desc(ChatMessage.id)).limit(sample_size)
+        ).all()
+        if not samples:
+            print("No assistant messages to train on")
+            return None
+        row = CodecDictionary(data=train_dictionary(samples), samples=len(samples))
+        db.add(row)
+        db.commit()
+        db.refresh(row)
+    codec.load(engine)
+    print(f"📚 Trained dictionary {row.id} ({len(row.data)} bytes) from {len(samples)} messages")
+    return row.id
+
+def recompress(batch: int = 500):
+    """Rewrite stored messages with the current dictionary, batch rows per transaction"""
+    from sqlalchemy import bindparam, update
+    from sqlmodel import Session, select
+    from app.db import engine
+    from app.models import ChatMessage
+    codec.load(engine)
+    codec.enabled = True
+    last_id, rewritten = 0, 0
+    with Session(engine) as db:
+        while True:
+            rows = db.exec(
+                select(ChatMessage.id, ChatMessage.content).where(ChatMessage.id > last_id).order_by(ChatMessage.id).limit(batch)
+            ).all()
+            if not rows:
+                break
+            db.connection().execute(
+                update(ChatMessage.__table__).where(ChatMessage.__table__.c.id == bindparam("row_id")),
+                [{"row_id": row_id, "content": content} for row_id, content in rows],
+            )
+            db.commit()
+            last_id = rows[-1][0]
+            rewritten += len(rows)
+    print(f"🗜️ Rewrote {rewritten} messages with dictionary {codec.current}")
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "train":
+        train(int(sys.argv[2]) if len(sys.argv) > 2 else 2000)
+    elif command == "recompress":
+        recompress()
+    else:
+        print(__doc__)
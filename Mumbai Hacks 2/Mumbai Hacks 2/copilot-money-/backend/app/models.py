@@ -1,9 +1,14 @@
 from sqlmodel import SQLModel, Field
+from sqlalchemy import Index
 from typing import Optional
 from datetime import datetime
+from app.message_codec import CompressedText
 
 class ChatSession(SQLModel, table=True):
     __tablename__ = "chat_sessions_new"
+    __table_args__ = (
+        Index("ix_chat_sessions_user_updated", "user_id", "updated_at"),
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
     session_id: str = Field(index=True)
     user_id: str = Field(index=True)
@@ -13,15 +18,57 @@ class ChatSession(SQLModel, table=True):
 
 class ChatMessage(SQLModel, table=True):
     __tablename__ = "chat_messages_new"
+    __table_args__ = (
+        Index("ix_chat_messages_session_created", "session_id", "created_at"),
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
     session_id: str = Field(index=True)
     role: str  # "user" or "assistant"
-    content: str # JSON string or plain text
+    content: str = Field(sa_type=CompressedText) # JSON string or plain text, compressed at rest (see app.message_codec)
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 class Preference(SQLModel, table=True):
+    __table_args__ = (
+        Index("ux_preference_session_key", "session_id", "key", unique=True),
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
     session_id: str
     key: str
     value: str
     updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class CodecDictionary(SQLModel, table=True):
+    """Preset zlib dictionary for message content; rows are never changed or
+    deleted, since stored messages name the dictionary they were written with"""
+    __tablename__ = "codec_dictionary"
+    id: Optional[int] = Field(default=None, primary_key=True)
+    data: bytes
+    samples: int = 0 # Messages it was trained on
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class RetentionPolicy(SQLModel, table=True):
+    """Per-user override of the chat retention defaults (see app.retention)"""
+    __tablename__ = "retention_policy"
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: str = Field(unique=True)
+    retain_days: Optional[int] = None # None keeps sessions forever
+    archive: bool = True # Archive expired sessions before deleting them
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class NewsArticle(SQLModel, table=True):
+    """Article ingested by app.news_store; deduplicated by URL and title hash"""
+    __tablename__ = "news_article"
+    __table_args__ = (
+        Index("ix_news_article_symbol_published", "symbol", "published_at"),
+    )
+    id: Optional[int] = Field(default=None, primary_key=True)
+    url: str = Field(unique=True)
+    content_hash: str = Field(unique=True)
+    symbol: Optional[str] = None # None for general market news
+    title: str
+    summary: Optional[str] = None
+    source: Optional[str] = None
+    thumbnail: Optional[str] = None
+    sentiment_score: float = 0.0
+    published_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+    fetched_at: datetime = Field(default_factory=datetime.utcnow)
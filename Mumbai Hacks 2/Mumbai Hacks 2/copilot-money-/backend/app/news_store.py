@@ -0,0 +1,365 @@
+"""Local news store, filled in the background and searched with SQLite FTS5.
+
+Instead of a live search (or an LLM "finding" articles) on every request,
+NewsIngester pulls articles for a watchlist (the dashboard's movers, every
+held symbol and symbols users recently asked about) from Yahoo Finance and
+DuckDuckGo news every NEWS_REFRESH_SECONDS. Articles are deduplicated by
+normalized URL and by a hash of the normalized title (syndicated copies of
+one story), scored by app.sentiment once at ingest, and indexed by an FTS5
+table over titles and summaries, so endpoints answer from the store in
+milliseconds. On Postgres search falls back to ILIKE.
+"""
+import os
+import re
+import asyncio
+import hashlib
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import yfinance as yf
+from ddgs import DDGS
+from sqlalchemy import text, delete
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select, func
+from starlette.concurrency import run_in_threadpool
+from app.db import engine
+from app.models import NewsArticle
+from app.trading_models import Holding
+from app.intent import KNOWN_SYMBOLS
+from app.sentiment import score_texts, label
+
+REFRESH_SECONDS = float(os.getenv("NEWS_REFRESH_SECONDS", "600"))
+FETCH_TIMEOUT = float(os.getenv("NEWS_FETCH_TIMEOUT", "8"))
+RETENTION_DAYS = int(os.getenv("NEWS_RETENTION_DAYS", "30"))
+MAX_AGE_DAYS = 14 # Older articles aren't served
+MAX_TRACKED = 200
+WATCHLIST = ["SPY", "QQQ", "AAPL", "MSFT", "NVDA", "TSLA", "AMZN", "GOOGL", "META"]
+MARKET = "__market__" # Watchlist key for general market news
+
+_WORD = re.compile(r"[a-z0-9]+")
+_TRACKING_PARAMS = re.compile(r"^(utm_|guccounter|guce_|ncid|cmpid|ref$|src$|fbclid|gclid)")
+_STOPWORDS = {"the", "a", "an", "of", "on", "in", "for", "and", "or", "to", "about", "news", "latest", "stock", "stocks", "me", "show", "what", "is"}
+_NAMES = {symbol: name for symbol, name in KNOWN_SYMBOLS.values()}
+
+def normalize_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query) if not _TRACKING_PARAMS.match(k.lower())])
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower() or "https", parts.netloc.lower().removeprefix("www."), path, query, ""))
+
+def content_hash(title: str) -> str:
+    return hashlib.sha1(" ".join(_WORD.findall(title.lower())).encode()).hexdigest()
+
+def _parse_time(value) -> Optional[datetime]:
+    if isinstance(value, (int, float)):
+        return datetime.utcfromtimestamp(value)
+    if isinstance(value, str) and value:
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+            return parsed.replace(tzinfo=None) if parsed.tzinfo is None else datetime.utcfromtimestamp(parsed.timestamp())
+        except ValueError:
+            return None
+    return None
+
+def _from_yahoo(item: dict, symbol: Optional[str]) -> Optional[dict]:
+    # Newer yfinance nests the article under "content"
+    content = item.get("content") or item
+    url = (content.get("canonicalUrl") or {}).get("url") or content.get("link")
+    provider = content.get("provider") or {}
+    thumbnail = content.get("thumbnail") or {}
+    resolutions = thumbnail.get("resolutions") or [{}]
+    return {
+        "url": url,
+        "title": content.get("title"),
+        "summary": content.get("summary") or content.get("description"),
+        "source": provider.get("displayName") or content.get("publisher"),
+        "thumbnail": thumbnail.get("originalUrl") or resolutions[0].get("url"),
+        "published_at": _parse_time(content.get("pubDate") or content.get("providerPublishTime")),
+        "symbol": symbol,
+    }
+
+def _from_ddgs(item: dict, symbol: Optional[str]) -> Optional[dict]:
+    return {
+        "url": item.get("url"),
+        "title": item.get("title"),
+        "summary": item.get("body"),
+        "source": item.get("source"),
+        "thumbnail": item.get("image"),
+        "published_at": _parse_time(item.get("date")),
+        "symbol": symbol,
+    }
+
+def fetch_articles(symbol: Optional[str], max_results: int = 10) -> List[dict]:
+    """Articles about symbol (None: the market in general) from the live
+    sources; blocking, run it in a thread"""
+    articles = []
+    if symbol:
+        try:
+            articles += [_from_yahoo(n, symbol) for n in (yf.Ticker(symbol).news or [])[:max_results]]
+        except Exception as e:
+            print(f"⚠️ Yahoo news failed for {symbol}: {e}")
+    if len(articles) < max_results // 2:
+        keywords = f"{_NAMES.get(symbol, symbol)} stock news" if symbol else "stock market news"
+        try:
+            with DDGS() as ddgs:
+                articles += [_from_ddgs(r, symbol) for r in ddgs.news(keywords, max_results=max_results)]
+        except Exception as e:
+            print(f"⚠️ DuckDuckGo news failed for {keywords!r}: {e}")
+    return [a for a in articles if a and a.get("url") and a.get("title")]
+
+def store_articles(session: Session, articles: List[dict]) -> int:
+    """Insert articles not already stored (by URL or title hash); returns how many were added"""
+    fresh, urls, hashes = [], set(), set()
+    for article in articles:
+        url, digest = normalize_url(article["url"]), content_hash(article["title"])
+        if url in urls or digest in hashes:
+            continue
+        urls.add(url)
+        hashes.add(digest)
+        fresh.append({**article, "url": url, "content_hash": digest})
+    if not fresh:
+        return 0
+
+    existing = session.exec(
+        select(NewsArticle.url, NewsArticle.content_hash)
+        .where(NewsArticle.url.in_(urls) | NewsArticle.content_hash.in_(hashes))
+    ).all()
+    seen_urls = {u for u, _ in existing}
+    seen_hashes = {h for _, h in existing}
+    fresh = [a for a in fresh if a["url"] not in seen_urls and a["content_hash"] not in seen_hashes]
+    if not fresh:
+        return 0
+
+    scores = score_texts(f"{a['title']}. {a.get('summary') or ''}" for a in fresh)
+    rows = [NewsArticle(
+        **{k: v for k, v in a.items() if k != "published_at"},
+        published_at=a.get("published_at") or datetime.utcnow(),
+        sentiment_score=round(float(score), 4),
+    ) for a, score in zip(fresh, scores)]
+    try:
+        session.add_all(rows)
+        session.commit()
+    except IntegrityError:
+        # Another worker stored some of these since the check; keep the rest
+        session.rollback()
+        added = 0
+        for row in rows:
+            try:
+                with session.begin_nested():
+                    session.add(NewsArticle.model_validate(row.model_dump(exclude={"id"})))
+                added += 1
+            except IntegrityError:
+                pass
+        session.commit()
+        return added
+    return len(rows)
+
+def create_fts_index(bind):
+    """FTS5 index over news titles and summaries, kept in sync by triggers"""
+    if bind.dialect.name != "sqlite":
+        return
+    with bind.begin() as conn:
+        exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'news_fts'")).first()
+        if exists:
+            return
+        try:
+            conn.execute(text(
+                "CREATE VIRTUAL TABLE news_fts USING fts5(title, summary, "
+                "content='news_article', content_rowid='id', tokenize='porter unicode61')"
+            ))
+        except Exception as e:
+            print(f"⚠️ FTS5 unavailable, news search will use LIKE: {e}")
+            return
+        conn.execute(text(
+            "CREATE TRIGGER news_fts_ai AFTER INSERT ON news_article BEGIN "
+            "INSERT INTO news_fts(rowid, title, summary) VALUES (new.id, new.title, new.summary); END"
+        ))
+        conn.execute(text(
+            "CREATE TRIGGER news_fts_ad AFTER DELETE ON news_article BEGIN "
+            "INSERT INTO news_fts(news_fts, rowid, title, summary) VALUES ('delete', old.id, old.title, old.summary); END"
+        ))
+        conn.execute(text(
+            "CREATE TRIGGER news_fts_au AFTER UPDATE ON news_article BEGIN "
+            "INSERT INTO news_fts(news_fts, rowid, title, summary) VALUES ('delete', old.id, old.title, old.summary); "
+            "INSERT INTO news_fts(rowid, title, summary) VALUES (new.id, new.title, new.summary); END"
+        ))
+        conn.execute(text("INSERT INTO news_fts(news_fts) VALUES ('rebuild')"))
+    print("✅ News search index created")
+
+def _has_fts(session: Session) -> bool:
+    if session.get_bind().dialect.name != "sqlite":
+        return False
+    return session.exec(text("SELECT 1 FROM sqlite_master WHERE name = 'news_fts'")).first() is not None
+
+def _terms(query: str) -> List[str]:
+    return [t for t in _WORD.findall(query.lower()) if t not in _STOPWORDS and len(t) > 1][:8]
+
+def search_articles(session: Session, symbol: Optional[str] = None, query: Optional[str] = None, limit: int = 10) -> List[NewsArticle]:
+    """Recent articles about symbol, then full-text matches for query (or the
+    symbol's company name), newest / best first"""
+    cutoff = datetime.utcnow() - timedelta(days=MAX_AGE_DAYS)
+    articles: List[NewsArticle] = []
+    if symbol:
+        articles = list(session.exec(
+            select(NewsArticle)
+            .where(NewsArticle.symbol == symbol, NewsArticle.published_at >= cutoff)
+            .order_by(NewsArticle.published_at.desc())
+            .limit(limit)
+        ).all())
+
+    terms = _terms(query or _NAMES.get(symbol, "") or "")
+    if len(articles) >= limit or not terms:
+        return articles
+    found = {a.id for a in articles}
+    if _has_fts(session):
+        match = " OR ".join(f'"{t}"' for t in terms)
+        ids = [row[0] for row in session.exec(
+            text("SELECT rowid FROM news_fts WHERE news_fts MATCH :match ORDER BY bm25(news_fts) LIMIT :limit"),
+            params={"match": match, "limit": limit * 4},
+        ).all()]
+        ranked = {id_: i for i, id_ in enumerate(ids)}
+        matches = session.exec(
+            select(NewsArticle).where(NewsArticle.id.in_(ids), NewsArticle.published_at >= cutoff)
+        ).all() if ids else []
+        matches = sorted(matches, key=lambda a: ranked[a.id])
+    else:
+        condition = None
+        for t in terms:
+            like = NewsArticle.title.ilike(f"%{t}%") | NewsArticle.summary.ilike(f"%{t}%")
+            condition = like if condition is None else condition | like
+        matches = session.exec(
+            select(NewsArticle).where(condition, NewsArticle.published_at >= cutoff)
+            .order_by(NewsArticle.published_at.desc()).limit(limit * 4)
+        ).all()
+    articles += [a for a in matches if a.id not in found][:limit - len(articles)]
+    return articles
+
+async def find_articles(symbol: Optional[str] = None, query: Optional[str] = None, limit: int = 10) -> List[NewsArticle]:
+    """search_articles in a session of its own, off the event loop"""
+    def search():
+        with Session(engine) as session:
+            return search_articles(session, symbol=symbol, query=query, limit=limit)
+    return await run_in_threadpool(search)
+
+def to_item(article: NewsArticle) -> dict:
+    """Article in the shape of the LLM-generated news items"""
+    return {
+        "title": article.title,
+        "summary": article.summary,
+        "source": article.source,
+        "url": article.url,
+        "date": article.published_at.strftime("%b %d, %Y"),
+        "published_at": article.published_at.isoformat() + "Z",
+        "thumbnail": article.thumbnail,
+        "sentiment": label(article.sentiment_score),
+        "sentiment_score": article.sentiment_score,
+    }
+
+class NewsIngester:
+    def __init__(self, interval: float = REFRESH_SECONDS):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self._fetched_at: Dict[str, datetime] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._tracked: Dict[str, datetime] = {}
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            print("✅ News ingester started")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def track(self, symbol: str):
+        """Keep symbol on the watchlist (most recently asked-about MAX_TRACKED)"""
+        self._tracked[symbol] = datetime.utcnow()
+        if len(self._tracked) > MAX_TRACKED:
+            del self._tracked[min(self._tracked, key=self._tracked.get)]
+
+    def watchlist(self) -> Set[str]:
+        with Session(engine) as session:
+            held = set(session.exec(select(Holding.symbol).where(Holding.quantity > 0).distinct()).all())
+        return set(WATCHLIST) | held | set(self._tracked)
+
+    async def _run(self):
+        while True:
+            try:
+                symbols = await run_in_threadpool(self.watchlist)
+                for key in [MARKET] + sorted(symbols):
+                    await self.ingest(key)
+                await run_in_threadpool(self.prune)
+            except Exception as e:
+                print(f"⚠️ News ingestion failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def _fresh(self, key: str) -> bool:
+        fetched = self._fetched_at.get(key)
+        return fetched is not None and datetime.utcnow() - fetched < timedelta(seconds=self.interval)
+
+    async def ingest(self, key: str) -> int:
+        """Fetch and store articles for key (a symbol or MARKET) unless fetched
+        within the refresh interval; concurrent calls share one fetch"""
+        if self._fresh(key):
+            return 0
+        if key not in self._inflight:
+            task = asyncio.ensure_future(self._ingest(key))
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            self._inflight[key] = task
+        # Shielded: a caller that stops waiting doesn't cancel the fetch
+        return await asyncio.shield(self._inflight[key])
+
+    async def _ingest(self, key: str) -> int:
+        symbol = None if key == MARKET else key
+        articles = await run_in_threadpool(fetch_articles, symbol)
+        self._fetched_at[key] = datetime.utcnow()
+
+        def save():
+            with Session(engine) as session:
+                return store_articles(session, articles)
+        added = await run_in_threadpool(save)
+        if added:
+            print(f"📰 Stored {added} new articles for {symbol or 'the market'}")
+        return added
+
+    async def ensure(self, symbol: Optional[str], timeout: float = FETCH_TIMEOUT):
+        """Make sure the store has news for symbol before serving it.
+
+        Only a symbol the store has never fetched waits (up to timeout) for
+        the live sources; otherwise this just keeps it on the watchlist.
+        """
+        key = symbol or MARKET
+        if symbol:
+            self.track(symbol)
+        if key in self._fetched_at:
+            return
+        latest = await run_in_threadpool(self.last_fetched, symbol)
+        if latest is not None:
+            self._fetched_at[key] = latest
+            return
+        try:
+            await asyncio.wait_for(self.ingest(key), timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠️ News fetch for {key} still running after {timeout}s")
+
+    def last_fetched(self, symbol: Optional[str]) -> Optional[datetime]:
+        """When articles for symbol (None for market news) were last stored"""
+        with Session(engine) as session:
+            query = select(func.max(NewsArticle.fetched_at))
+            query = query.where(NewsArticle.symbol == symbol) if symbol else query.where(NewsArticle.symbol == None)
+            return session.exec(query).one()
+
+    def prune(self, days: int = RETENTION_DAYS) -> int:
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        with Session(engine) as session:
+            result = session.exec(delete(NewsArticle).where(NewsArticle.published_at < cutoff))
+            session.commit()
+            return result.rowcount
+
+news_ingester = NewsIngester()
@@ -0,0 +1,209 @@
+"""In-memory per-symbol order book for resting limit and stop orders.
+
+Each book keeps one heap per (side, order type), keyed so the heap top is
+always the next order to become marketable, with the order id as the time
+priority tie-break. A quote only inspects heap tops, so matching costs
+O(log n) per fill and O(1) when nothing crosses. Cancels are lazy: the order is
+dropped from the index and its heap entry is skipped when it surfaces.
+
+The database is the source of truth. Orders are recovered from it at startup
+and re-synced incrementally, each fill is applied through app.execution and
+journaled as an OrderFill, and stale in-memory state (an order cancelled or
+filled by another worker) is corrected when the order is re-read at fill time.
+"""
+import heapq
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlmodel import Session, select
+from app.trading_models import Order, OrderFill, Portfolio
+from app.execution import run_with_retry, load_holdings, apply_order, prune_holdings
+
+@dataclass
+class BookOrder:
+    id: int
+    side: str # "BUY" or "SELL"
+    order_type: str # "LIMIT" or "STOP"
+    price: float
+    remaining: int
+
+    def triggers_at(self, quote: float) -> bool:
+        if self.order_type == "LIMIT":
+            return quote <= self.price if self.side == "BUY" else quote >= self.price
+        # Buy stops fire on the way up, sell stops (stop-loss) on the way down
+        return quote >= self.price if self.side == "BUY" else quote <= self.price
+
+def _heap_key(side: str, order_type: str, price: float) -> float:
+    # Highest buy limit and highest sell stop trigger first
+    if (side, order_type) in (("BUY", "LIMIT"), ("SELL", "STOP")):
+        return -price
+    return price
+
+class OrderBook:
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.orders: Dict[int, BookOrder] = {}
+        self._heaps: Dict[Tuple[str, str], list] = {
+            ("BUY", "LIMIT"): [], ("SELL", "LIMIT"): [],
+            ("BUY", "STOP"): [], ("SELL", "STOP"): [],
+        }
+
+    def __len__(self):
+        return len(self.orders)
+
+    def add(self, order: BookOrder):
+        if order.id in self.orders:
+            return
+        self.orders[order.id] = order
+        heap = self._heaps[(order.side, order.order_type)]
+        heapq.heappush(heap, (_heap_key(order.side, order.order_type, order.price), order.id))
+
+    def cancel(self, order_id: int) -> bool:
+        return self.orders.pop(order_id, None) is not None
+
+    def _top(self, heap: list) -> Optional[BookOrder]:
+        # Skip entries for cancelled or already-popped orders
+        while heap:
+            order = self.orders.get(heap[0][1])
+            if order is not None:
+                return order
+            heapq.heappop(heap)
+        return None
+
+    def pop_marketable(self, quote: float) -> List[BookOrder]:
+        """Remove and return every order the quote triggers, in price-time
+        priority within each side"""
+        matched = []
+        for heap in self._heaps.values():
+            order = self._top(heap)
+            while order is not None and order.triggers_at(quote):
+                heapq.heappop(heap)
+                del self.orders[order.id]
+                matched.append(order)
+                order = self._top(heap)
+        return matched
+
+class OrderBookManager:
+    def __init__(self):
+        self.books: Dict[str, OrderBook] = {}
+        self._lock = threading.Lock()
+        self._last_synced_id = 0
+
+    def symbols(self) -> List[str]:
+        with self._lock:
+            return [s for s, book in self.books.items() if len(book)]
+
+    def add(self, order: Order):
+        remaining = order.quantity - order.filled_quantity
+        if not order.active or remaining <= 0:
+            return
+        with self._lock:
+            book = self.books.setdefault(order.symbol, OrderBook(order.symbol))
+            book.add(BookOrder(order.id, order.side, order.order_type, order.price, remaining))
+
+    def cancel(self, symbol: str, order_id: int) -> bool:
+        with self._lock:
+            book = self.books.get(symbol)
+            return bool(book and book.cancel(order_id))
+
+    def sync(self, session: Session):
+        """Load open orders created since the last sync (all of them at
+        startup), including ones placed through other API workers"""
+        orders = session.exec(
+            select(Order)
+            .where(Order.active == True, Order.id > self._last_synced_id)
+            .order_by(Order.id)
+        ).all()
+        for order in orders:
+            self.add(order)
+            self._last_synced_id = max(self._last_synced_id, order.id)
+        if orders:
+            print(f"📥 Order book loaded {len(orders)} open orders")
+
+    def on_quote(self, session: Session, symbol: str, price: float, size: Optional[int] = None) -> int:
+        """Match a quote against the book and execute the fills.
+
+        size caps the shares available to each side at this price; None means
+        the quote can absorb any quantity. Returns the number of shares filled.
+        """
+        with self._lock:
+            book = self.books.get(symbol)
+            matched = book.pop_marketable(price) if book else []
+        if not matched:
+            return 0
+
+        liquidity = {"BUY": size, "SELL": size}
+        total = 0
+        for order in matched:
+            available = liquidity[order.side]
+            want = order.remaining if available is None else min(order.remaining, available)
+            filled, remaining = (0, order.remaining)
+            if want > 0:
+                try:
+                    filled, remaining = fill_order(session, order.id, want, price)
+                except Exception as e:
+                    print(f"⚠️ Error filling order {order.id}: {e}")
+            if available is not None:
+                liquidity[order.side] = available - filled
+            total += filled
+            if remaining > 0:
+                # Partially filled or unfunded: keep its original time priority
+                order.remaining = remaining
+                with self._lock:
+                    self.books[symbol].add(order)
+        return total
+
+def fill_order(session: Session, order_id: int, max_quantity: int, price: float) -> Tuple[int, int]:
+    """Fill up to max_quantity of an order at price in one unit of work.
+
+    The fill is limited by cash (BUY) or shares held (SELL), so an order can be
+    partially filled. Returns (filled, remaining); remaining is 0 once the
+    order is closed, including when another worker closed it first.
+    """
+    def work():
+        order = session.get(Order, order_id)
+        if not order or not order.active:
+            return 0, 0
+        remaining = order.quantity - order.filled_quantity
+
+        portfolio = session.exec(select(Portfolio).where(Portfolio.user_id == order.user_id)).first()
+        if not portfolio:
+            return 0, remaining
+        holdings = load_holdings(session, portfolio, [order.symbol])
+
+        quantity = min(max_quantity, remaining)
+        if order.side == "BUY":
+            quantity = min(quantity, int(portfolio.balance // price))
+        else:
+            holding = holdings.get(order.symbol)
+            quantity = min(quantity, holding.quantity if holding else 0)
+        if quantity <= 0:
+            return 0, remaining
+
+        txn = apply_order(session, portfolio, holdings, order.symbol, order.side, quantity, price)
+        prune_holdings(session, holdings)
+        session.flush()
+
+        session.add(OrderFill(
+            order_id=order.id,
+            transaction_id=txn.id,
+            symbol=order.symbol,
+            side=order.side,
+            quantity=quantity,
+            price=price
+        ))
+        order.filled_quantity += quantity
+        remaining -= quantity
+        order.status = "FILLED" if remaining == 0 else "PARTIAL"
+        order.active = remaining > 0
+        order.updated_at = datetime.utcnow()
+        session.add(order)
+        return quantity, remaining
+
+    filled, remaining = run_with_retry(session, work)
+    if filled:
+        print(f"✅ Order {order_id} filled {filled} @ {price} ({remaining} remaining)")
+    return filled, remaining
+
+order_books = OrderBookManager()
@@ -0,0 +1,95 @@
+"""Write-through cache of per-session preferences.
+
+The interview flow reads a session's preferences on every step. The cache
+keeps the full preference map of the PREFERENCE_CACHE_SIZE most recently used
+sessions: a miss loads the whole map in one query (served by the unique
+(session_id, key) index), and writes are native upserts that update the
+cached map once their transaction has committed.
+
+The cache is per process. With several workers that don't pin a session to
+one of them, set PREFERENCE_CACHE_SIZE=0 so every read goes to the database.
+"""
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, Tuple
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, select, delete, col
+from app.models import Preference
+
+CACHE_SIZE = int(os.getenv("PREFERENCE_CACHE_SIZE", "10000"))
+
+# (session_id, key) -> value
+PreferenceWrites = Dict[Tuple[str, str], str]
+
+def upsert_preferences(db: Session, preferences: PreferenceWrites):
+    """Insert or update preferences in one statement (no commit)"""
+    if not preferences:
+        return
+    dialect = {"sqlite": sqlite, "postgresql": postgresql}[db.get_bind().dialect.name]
+    now = datetime.utcnow()
+    stmt = dialect.insert(Preference)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["session_id", "key"],
+        set_={"value": stmt.excluded.value, "updated_at": stmt.excluded.updated_at},
+    )
+    db.execute(stmt, [{"session_id": s, "key": k, "value": v, "updated_at": now} for (s, k), v in preferences.items()])
+
+def dedupe_preferences(engine):
+    """Keep only the newest row per (session_id, key), so the unique index can
+    be built on databases written before it existed"""
+    newest = select(func.max(Preference.id)).group_by(Preference.session_id, Preference.key)
+    with Session(engine) as db:
+        removed = db.execute(delete(Preference).where(col(Preference.id).not_in(newest))).rowcount
+        db.commit()
+    if removed:
+        print(f"Removed {removed} duplicate preferences")
+
+class PreferenceCache:
+    def __init__(self, size: int = CACHE_SIZE):
+        self.size = size
+        self._maps: "OrderedDict[str, Dict[str, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0 # Committed writes to sessions that weren't cached
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, db: Session, session_id: str) -> Dict[str, str]:
+        """A copy of the session's preferences"""
+        with self._lock:
+            prefs = self._maps.get(session_id)
+            if prefs is not None:
+                self._maps.move_to_end(session_id)
+                self.hits += 1
+                return dict(prefs)
+            self.misses += 1
+            writes = self._writes
+        prefs = dict(db.exec(select(Preference.key, Preference.value).where(Preference.session_id == session_id)).all())
+        with self._lock:
+            # Don't cache a map a concurrent write may have made stale
+            if self.size and writes == self._writes and session_id not in self._maps:
+                self._maps[session_id] = prefs
+                while len(self._maps) > self.size:
+                    self._maps.popitem(last=False)
+        return dict(prefs)
+
+    def committed(self, preferences: PreferenceWrites):
+        """Apply writes that have been committed to the cached maps; sessions
+        that aren't cached are loaded from the database on their next read"""
+        with self._lock:
+            for (session_id, key), value in preferences.items():
+                prefs = self._maps.get(session_id)
+                if prefs is not None:
+                    prefs[key] = value
+                else:
+                    self._writes += 1
+
+    def invalidate(self, session_ids: Iterable[str]):
+        with self._lock:
+            self._writes += 1
+            for session_id in session_ids:
+                self._maps.pop(session_id, None)
+
+preference_cache = PreferenceCache()
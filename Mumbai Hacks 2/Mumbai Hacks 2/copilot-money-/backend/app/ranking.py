@@ -0,0 +1,424 @@
+"""Deterministic local ranking for stock recommendations.
+
+A fixed universe (US, global and emerging-market stocks per interview
+sector, plus broad ETFs and crypto) is scored on fundamentals, from
+ticker.info cached in the Fundamentals table, and on technical factors
+computed from the daily bar store. Each factor is a winsorized
+cross-sectional z-score, and the weights come from the interview answers:
+strategy, risk tolerance, horizon and goal. The profile's sectors, region
+and risk (a volatility cap) decide which symbols are eligible.
+
+Factor matrices are rebuilt only when a new bar or fundamentals refresh
+lands, so ranking a profile is a matrix-vector product. Entry and target
+prices are bounded by each symbol's volatility, the horizon and the analyst
+target, rather than guessed. The LLM is only used, optionally, to word the
+summary.
+"""
+import os
+import math
+import asyncio
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import yfinance as yf
+from sqlmodel import Session, select, func
+from starlette.concurrency import run_in_threadpool
+from app.db import engine
+from app.bars import refresh_bars, load_closes, latest_bar_date
+from app.trading_models import Fundamentals
+from app.cascade import cascade, min_length
+from app.recommendations import personalized_summary
+
+REFRESH_SECONDS = float(os.getenv("RANKING_REFRESH_SECONDS", str(6 * 3600)))
+FUNDAMENTALS_MAX_AGE = timedelta(days=1)
+LOOKBACK = 260
+MIN_BARS = 60
+TRADING_DAYS = 252
+
+# symbol: (sector, region, type); sectors are the interview's option values
+UNIVERSE: Dict[str, Tuple[str, str, str]] = {
+    "AAPL": ("tech", "us", "Stock"), "MSFT": ("tech", "us", "Stock"), "NVDA": ("tech", "us", "Stock"),
+    "GOOGL": ("tech", "us", "Stock"), "META": ("tech", "us", "Stock"), "AVGO": ("tech", "us", "Stock"),
+    "ADBE": ("tech", "us", "Stock"), "CRM": ("tech", "us", "Stock"), "AMD": ("tech", "us", "Stock"),
+    "ORCL": ("tech", "us", "Stock"), "XLK": ("tech", "us", "ETF"),
+    "JPM": ("finance", "us", "Stock"), "BAC": ("finance", "us", "Stock"), "V": ("finance", "us", "Stock"),
+    "MA": ("finance", "us", "Stock"), "GS": ("finance", "us", "Stock"), "BRK-B": ("finance", "us", "Stock"),
+    "BLK": ("finance", "us", "Stock"), "XLF": ("finance", "us", "ETF"),
+    "JNJ": ("healthcare", "us", "Stock"), "UNH": ("healthcare", "us", "Stock"), "LLY": ("healthcare", "us", "Stock"),
+    "PFE": ("healthcare", "us", "Stock"), "ABBV": ("healthcare", "us", "Stock"), "MRK": ("healthcare", "us", "Stock"),
+    "TMO": ("healthcare", "us", "Stock"), "XLV": ("healthcare", "us", "ETF"),
+    "XOM": ("energy", "us", "Stock"), "CVX": ("energy", "us", "Stock"), "COP": ("energy", "us", "Stock"),
+    "NEE": ("energy", "us", "Stock"), "ENPH": ("energy", "us", "Stock"), "XLE": ("energy", "us", "ETF"),
+    "ICLN": ("energy", "global", "ETF"),
+    "AMZN": ("consumer", "us", "Stock"), "TSLA": ("consumer", "us", "Stock"), "WMT": ("consumer", "us", "Stock"),
+    "KO": ("consumer", "us", "Stock"), "PEP": ("consumer", "us", "Stock"), "PG": ("consumer", "us", "Stock"),
+    "MCD": ("consumer", "us", "Stock"), "COST": ("consumer", "us", "Stock"), "XLY": ("consumer", "us", "ETF"),
+    "PLD": ("real_estate", "us", "Stock"), "AMT": ("real_estate", "us", "Stock"), "O": ("real_estate", "us", "Stock"),
+    "SPG": ("real_estate", "us", "Stock"), "VNQ": ("real_estate", "us", "ETF"),
+    "ASML": ("tech", "global", "Stock"), "TSM": ("tech", "global", "Stock"), "SAP": ("tech", "global", "Stock"),
+    "NVO": ("healthcare", "global", "Stock"), "AZN": ("healthcare", "global", "Stock"),
+    "HSBC": ("finance", "global", "Stock"), "SHEL": ("energy", "global", "Stock"), "TM": ("consumer", "global", "Stock"),
+    "INFY": ("tech", "emerging", "Stock"), "TCS.NS": ("tech", "emerging", "Stock"),
+    "HDB": ("finance", "emerging", "Stock"), "IBN": ("finance", "emerging", "Stock"),
+    "RELIANCE.NS": ("energy", "emerging", "Stock"), "PBR": ("energy", "emerging", "Stock"),
+    "BABA": ("consumer", "emerging", "Stock"), "PDD": ("consumer", "emerging", "Stock"),
+    "SPY": ("broad", "us", "ETF"), "VOO": ("broad", "us", "ETF"), "QQQ": ("broad", "us", "ETF"),
+    "VT": ("broad", "global", "ETF"), "EEM": ("broad", "emerging", "ETF"), "INDA": ("broad", "emerging", "ETF"),
+    "BTC-USD": ("crypto", "global", "Crypto"), "ETH-USD": ("crypto", "global", "Crypto"),
+}
+REGIONS = {"us": {"us"}, "global": {"us", "global", "emerging"}, "emerging": {"emerging", "global"}}
+
+FACTORS = ["value", "quality", "growth", "dividend", "momentum", "trend", "low_vol", "size", "upside"]
+
+# Factor weights per interview answer; a profile's weights are the sum
+BASE_WEIGHTS = {"quality": 1.0, "momentum": 0.5, "value": 0.5, "low_vol": 0.5}
+STRATEGY_WEIGHTS = {
+    "value": {"value": 2.0, "quality": 1.0},
+    "growth": {"growth": 2.0, "momentum": 0.5, "upside": 0.5},
+    "dividend": {"dividend": 2.0, "quality": 1.0, "low_vol": 0.5},
+    "momentum": {"momentum": 2.0, "trend": 1.5},
+}
+RISK_WEIGHTS = {
+    "low": {"low_vol": 2.0, "size": 1.0, "quality": 0.5},
+    "medium": {"low_vol": 0.5},
+    "high": {"low_vol": -0.5, "growth": 0.5, "momentum": 0.5},
+}
+HORIZON_WEIGHTS = {
+    "short": {"momentum": 1.0, "trend": 1.0},
+    "medium": {},
+    "long": {"value": 0.5, "quality": 0.5, "growth": 0.5},
+}
+GOAL_WEIGHTS = {
+    "growth": {"growth": 1.0},
+    "balanced": {"quality": 0.5, "dividend": 0.5},
+    "income": {"dividend": 2.0},
+    "preservation": {"low_vol": 2.0, "size": 1.0},
+}
+VOLATILITY_CAP = {"low": 0.30, "medium": 0.55, "high": None} # annualized
+HORIZON_YEARS = {"short": 0.5, "medium": 1.0, "long": 2.0}
+
+FACTOR_REASONS = {
+    "value": lambda r: f"attractive valuation (P/E {r['pe']:.1f})" if r["pe"] else "attractive valuation",
+    "quality": lambda r: f"high profitability (ROE {r['roe']:.0%})" if r["roe"] and r["roe"] > 0.1 else "solid margins and balance sheet",
+    "growth": lambda r: f"revenue growing {r['revenue_growth']:.0%} a year" if r["revenue_growth"] is not None else "strong growth",
+    "dividend": lambda r: f"{r['dividend_yield']:.1%} dividend yield" if r["dividend_yield"] else "steady income",
+    "momentum": lambda r: f"{r['momentum_6m']:+.0%} over the last 6 months",
+    "trend": lambda r: f"trading {r['trend']:+.0%} versus its 200-day average",
+    "low_vol": lambda r: f"low volatility ({r['volatility']:.0%} a year)",
+    "size": lambda r: "large, established company",
+    "upside": lambda r: f"{r['upside']:+.0%} to the analyst target" if r["upside"] is not None else "analyst upside",
+}
+
+def _zscore(values: np.ndarray) -> np.ndarray:
+    """Cross-sectional z-score clipped to +-3; missing values score 0 (neutral)"""
+    finite = np.isfinite(values)
+    if finite.sum() < 2:
+        return np.zeros_like(values)
+    mean, std = values[finite].mean(), values[finite].std()
+    z = np.where(finite, (values - mean) / std if std > 0 else 0.0, 0.0)
+    return np.clip(z, -3, 3)
+
+def _composite(parts: np.ndarray) -> np.ndarray:
+    """Mean of each column's z-score over the columns a row has, so no
+    component dominates by scale; NaN for rows with none of them (ETFs, crypto)"""
+    finite = np.isfinite(parts)
+    z = np.column_stack([_zscore(parts[:, j]) for j in range(parts.shape[1])])
+    counts = finite.sum(axis=1)
+    return np.divide(z.sum(axis=1), counts, out=np.full(len(parts), np.nan), where=counts > 0)
+
+def _num(value) -> float:
+    return float(value) if isinstance(value, (int, float)) and math.isfinite(value) else np.nan
+
+@dataclass
+class FactorSnapshot:
+    symbols: List[str]
+    z: np.ndarray # (symbols, factors)
+    raw: List[dict] # per-symbol figures for reasons and prices
+    as_of: Optional[str]
+
+def build_snapshot(session: Session) -> Optional[FactorSnapshot]:
+    closes = load_closes(session, list(UNIVERSE), LOOKBACK)
+    fundamentals = {f.symbol: f for f in session.exec(select(Fundamentals)).all()}
+
+    symbols, rows, raw = [], [], []
+    quality, growth = [], [] # Components, combined once the cross-section is known
+    for symbol in UNIVERSE:
+        if symbol not in closes or closes[symbol].count() < MIN_BARS:
+            continue # No price history yet
+        # Per-symbol calendar: crypto trades on weekends, stocks don't
+        series = closes[symbol].dropna().to_numpy(dtype=float)[-LOOKBACK:]
+        returns = np.diff(series) / series[:-1]
+        price = series[-1]
+        volatility = float(returns[-63:].std(ddof=1) * np.sqrt(TRADING_DAYS))
+        # Momentum skips the most recent month (short-term reversal)
+        momentum_6m = series[-22] / series[max(0, len(series) - 126)] - 1
+        momentum_12m = series[-22] / series[0] - 1
+        trend = price / series[-200:].mean() - 1
+
+        f = fundamentals.get(symbol)
+        pe = _num(f.trailing_pe) if f else np.nan
+        target = _num(f.target_mean_price) if f else np.nan
+        figures = {
+            "price": price,
+            "volatility": volatility,
+            "momentum_6m": momentum_6m,
+            "trend": trend,
+            "pe": pe if pe > 0 else None,
+            "roe": f.return_on_equity if f else None,
+            "revenue_growth": f.revenue_growth if f else None,
+            "dividend_yield": f.dividend_yield if f else None,
+            "upside": target / price - 1 if np.isfinite(target) else None,
+            "target": target if np.isfinite(target) else None,
+            "name": f.name if f and f.name else symbol,
+            "currency": f.currency if f and f.currency else "USD",
+        }
+        quality.append([_num(f.return_on_equity), _num(f.profit_margin), -_num(f.debt_to_equity)] if f else [np.nan] * 3)
+        growth.append([_num(f.revenue_growth), _num(f.earnings_growth)] if f else [np.nan] * 2)
+        rows.append([
+            1 / pe if pe > 0 else np.nan, # earnings yield
+            np.nan, # quality
+            np.nan, # growth
+            _num(f.dividend_yield) if f else np.nan,
+            (momentum_6m + momentum_12m) / 2,
+            trend,
+            -volatility,
+            math.log(f.market_cap) if f and f.market_cap else np.nan,
+            np.clip(figures["upside"], -0.5, 1.0) if figures["upside"] is not None else np.nan,
+        ])
+        symbols.append(symbol)
+        raw.append(figures)
+
+    if not symbols:
+        return None
+    matrix = np.array(rows, dtype=float)
+    matrix[:, FACTORS.index("quality")] = _composite(np.array(quality, dtype=float))
+    matrix[:, FACTORS.index("growth")] = _composite(np.array(growth, dtype=float))
+    z = np.column_stack([_zscore(matrix[:, j]) for j in range(len(FACTORS))])
+    as_of = latest_bar_date(session, symbols)
+    return FactorSnapshot(symbols, z, raw, as_of.isoformat() if as_of else None)
+
+_snapshot: Optional[Tuple[tuple, Optional[FactorSnapshot]]] = None
+_lock = threading.Lock()
+
+def current_snapshot(session: Session) -> Optional[FactorSnapshot]:
+    """Factor snapshot, rebuilt only when a bar or fundamentals refresh lands"""
+    global _snapshot
+    key = (
+        latest_bar_date(session, list(UNIVERSE)),
+        session.exec(select(func.max(Fundamentals.updated_at))).one(),
+        session.exec(select(func.count(Fundamentals.id))).one(),
+    )
+    with _lock:
+        if _snapshot and _snapshot[0] == key:
+            return _snapshot[1]
+    snapshot = build_snapshot(session)
+    with _lock:
+        _snapshot = (key, snapshot)
+    return snapshot
+
+def profile_weights(profile: dict) -> np.ndarray:
+    weights = dict(BASE_WEIGHTS)
+    for table, answer in ((STRATEGY_WEIGHTS, profile["strategy"]), (RISK_WEIGHTS, profile["risk_tolerance"]),
+                          (HORIZON_WEIGHTS, profile["horizon"]), (GOAL_WEIGHTS, profile["goal"])):
+        for factor, weight in table.get(answer, {}).items():
+            weights[factor] = weights.get(factor, 0.0) + weight
+    return np.array([weights.get(f, 0.0) for f in FACTORS])
+
+def _eligible(snapshot: FactorSnapshot, profile: dict, strict: bool) -> np.ndarray:
+    cap = VOLATILITY_CAP.get(profile["risk_tolerance"])
+    regions = REGIONS.get(profile["region"], REGIONS["global"])
+    sectors = set(profile["sectors"])
+    if profile["risk_tolerance"] == "low" or profile["goal"] == "preservation":
+        sectors.add("broad")
+    if profile["risk_tolerance"] == "high" and profile["goal"] == "growth":
+        sectors.add("crypto")
+    mask = []
+    for symbol, figures in zip(snapshot.symbols, snapshot.raw):
+        sector, region, _ = UNIVERSE[symbol]
+        ok = cap is None or figures["volatility"] <= cap
+        if strict:
+            ok = ok and sector in sectors and region in regions
+        else:
+            # Too few matches: keep the sectors, relax the region
+            ok = ok and (sector in sectors or sector == "broad")
+        mask.append(ok)
+    return np.array(mask)
+
+def _price(value: float, currency: str) -> str:
+    return f"${value:,.2f}" if currency == "USD" else f"{value:,.2f} {currency}"
+
+def _recommendation(symbol: str, figures: dict, contributions: np.ndarray, profile: dict, score: float) -> dict:
+    sector, _, kind = UNIVERSE[symbol]
+    top = [FACTORS[i] for i in np.argsort(contributions)[::-1][:2] if contributions[i] > 0]
+    reason = "; ".join(FACTOR_REASONS[f](figures) for f in top) or "balanced factor profile"
+
+    price, vol = figures["price"], figures["volatility"]
+    years = HORIZON_YEARS.get(profile["horizon"], 1.0)
+    # Entry a quarter of a monthly move below the last close; target one
+    # horizon-scaled standard deviation above, capped at the analyst target
+    buy = price * (1 - 0.25 * vol * math.sqrt(21 / TRADING_DAYS))
+    sell = price * (1 + vol * math.sqrt(years))
+    if figures["target"] and figures["target"] > buy * 1.05:
+        sell = min(sell, figures["target"])
+    sell = max(sell, buy * 1.05)
+
+    risk_level = "Low" if vol < 0.25 else "Medium" if vol < 0.45 else "High"
+    return {
+        "symbol": symbol,
+        "name": figures["name"],
+        "reason": reason[0].upper() + reason[1:] + ".",
+        "match_reason": f"Fits your {profile['risk_tolerance']} risk tolerance and {profile['strategy']} strategy",
+        "risk_level": risk_level,
+        "type": kind,
+        "source": "Local factor model",
+        "buy_price": _price(buy, figures["currency"]),
+        "sell_price": _price(sell, figures["currency"]),
+        "score": round(float(score), 3),
+        "sector": sector,
+    }
+
+def rank(session: Session, profile: dict, top_n: int = 5) -> Optional[dict]:
+    """Top picks for a normalized profile (see app.recommendations), or None
+    when the universe has too little data to rank yet"""
+    snapshot = current_snapshot(session)
+    if snapshot is None:
+        return None
+    weights = profile_weights(profile)
+    contributions = snapshot.z * weights
+    scores = contributions.sum(axis=1)
+
+    # Profile matches first; when too few, top up with the relaxed filter
+    strict = _eligible(snapshot, profile, strict=True)
+    relaxed = _eligible(snapshot, profile, strict=False) & ~strict
+    if strict.sum() + relaxed.sum() < min(3, top_n):
+        return None
+    order = [i for mask in (strict, relaxed) for i in np.argsort(-scores) if mask[i]]
+
+    # Spread picks across the chosen sectors
+    per_sector = max(2, math.ceil(top_n / max(1, len(profile["sectors"]))))
+    picks, counts = [], {}
+    for i in order:
+        if len(picks) == top_n:
+            break
+        sector = UNIVERSE[snapshot.symbols[i]][0]
+        if counts.get(sector, 0) >= per_sector:
+            continue
+        counts[sector] = counts.get(sector, 0) + 1
+        picks.append(_recommendation(snapshot.symbols[i], snapshot.raw[i], contributions[i], profile, scores[i]))
+    return {
+        "recommendations": picks,
+        "engine": "local",
+        "as_of": snapshot.as_of,
+        "weights": {f: float(w) for f, w in zip(FACTORS, weights) if w},
+    }
+
+def local_recommendations(profile: dict, top_n: int = 5) -> Optional[dict]:
+    """Ranked picks with the template summary (blocking: run in a threadpool)"""
+    with Session(engine) as session:
+        result = rank(session, profile, top_n)
+    if result:
+        result["summary"] = personalized_summary(profile)
+    return result
+
+EXPLAIN_PROMPT = """In 3 short sentences, explain to a {experience} investor why these picks fit their profile ({goal} goal, {risk} risk tolerance, {horizon} horizon, {strategy} strategy). Use only the facts given.
+{picks}"""
+
+async def explain(profile: dict, result: dict) -> Optional[str]:
+    """Optional LLM wording of the ranking; None if the call fails"""
+    picks = "\n".join(f"- {r['symbol']} ({r['name']}): {r['reason']} Risk {r['risk_level']}." for r in result["recommendations"])
+    prompt = EXPLAIN_PROMPT.format(
+        experience=profile["experience"], goal=profile["goal"], risk=profile["risk_tolerance"],
+        horizon=profile["horizon"], strategy=profile["strategy"], picks=picks,
+    )
+    try:
+        return await cascade.complete(
+            "summary",
+            messages=[{"role": "user", "content": prompt}],
+            validate=min_length(40),
+            max_tokens=200,
+            temperature=0.3,
+            cache_ttl=24 * 3600,
+        )
+    except Exception as e:
+        print(f"⚠️ Recommendation explanation failed: {e}")
+        return None
+
+def _fetch_fundamentals(symbol: str) -> Optional[dict]:
+    try:
+        info = yf.Ticker(symbol).info or {}
+    except Exception as e:
+        print(f"⚠️ Fundamentals failed for {symbol}: {e}")
+        return None
+    # Newer yfinance reports dividendYield in percent; the trailing field is a fraction
+    dividend = info.get("trailingAnnualDividendYield") or info.get("yield")
+    if dividend is None and info.get("dividendYield") is not None:
+        dividend = info["dividendYield"] / 100
+    return {
+        "name": info.get("shortName") or info.get("longName"),
+        "quote_type": info.get("quoteType"),
+        "currency": info.get("currency"),
+        "market_cap": info.get("marketCap") or info.get("totalAssets"),
+        "trailing_pe": info.get("trailingPE"),
+        "dividend_yield": dividend,
+        "return_on_equity": info.get("returnOnEquity"),
+        "profit_margin": info.get("profitMargins"),
+        "debt_to_equity": info.get("debtToEquity"),
+        "revenue_growth": info.get("revenueGrowth"),
+        "earnings_growth": info.get("earningsGrowth"),
+        "target_mean_price": info.get("targetMeanPrice"),
+    }
+
+def refresh_universe():
+    """Incremental bar download for the universe and fundamentals older than a day (blocking)"""
+    with Session(engine) as session:
+        refresh_bars(session, list(UNIVERSE))
+        stored = {f.symbol: f for f in session.exec(select(Fundamentals)).all()}
+        cutoff = datetime.utcnow() - FUNDAMENTALS_MAX_AGE
+        updated = 0
+        for symbol in UNIVERSE:
+            row = stored.get(symbol)
+            if row and row.updated_at > cutoff:
+                continue
+            fields = _fetch_fundamentals(symbol)
+            if fields is None:
+                continue
+            row = row or Fundamentals(symbol=symbol)
+            for name, value in fields.items():
+                setattr(row, name, value)
+            row.updated_at = datetime.utcnow()
+            session.add(row)
+            session.commit()
+            updated += 1
+        if updated:
+            print(f"📊 Refreshed fundamentals for {updated} symbols")
+
+class UniverseRefresher:
+    def __init__(self, interval: float = REFRESH_SECONDS):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            print("✅ Ranking universe refresher started")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await run_in_threadpool(refresh_universe)
+            except Exception as e:
+                print(f"⚠️ Ranking universe refresh failed: {e}")
+            await asyncio.sleep(self.interval)
+
+universe_refresher = UniverseRefresher()
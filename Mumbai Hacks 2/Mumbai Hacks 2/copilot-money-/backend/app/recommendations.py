@@ -0,0 +1,328 @@
+"""Recommendations precomputed per interview-profile bucket.
+
+The interview answers come from a small set of options, and the picks
+mostly depend on four of them: goal, risk tolerance, sector and region
+(4 x 3 x 6 x 3 = 216 buckets). This is the fallback for when the local
+ranking (app.ranking) has no data yet: a background task generates picks
+(web/news search plus one LLM completion each) for the buckets users asked
+for while it couldn't serve them, refreshes those daily, and stores them in
+the shared response cache with a daily TTL. Once the local ranking has a
+snapshot the task stays idle. A finished interview is then a cache lookup:
+the picks of the profile's sectors are merged and the personalized summary
+is filled in from a template, without an LLM call.
+"""
+import os
+import json
+import time
+import asyncio
+import itertools
+from collections import OrderedDict
+from typing import Iterator, List, Optional, Set, Tuple
+from ddgs import DDGS
+from sqlmodel import Session
+from starlette.concurrency import run_in_threadpool
+from app.db import engine
+from app.cascade import cascade, json_object_with
+from app.jsonstream import parse_json
+from app.llm_cache import response_cache
+from app.news_store import find_articles
+from app.routers.preferences import QUESTIONS
+
+CACHE_TTL = 24 * 3600
+# Buckets older than this are regenerated, so they're refreshed before expiring
+REFRESH_AGE = 20 * 3600
+SWEEP_SECONDS = 3600
+PRECOMPUTE = os.getenv("RECOMMENDATION_PRECOMPUTE", "1") == "1"
+MAX_PICKS = 5
+MIN_SEARCH_RESULTS = 3
+CACHE_PREFIX = "recommendations:v1:"
+
+_QUESTIONS = {q["id"]: q for q in QUESTIONS}
+# Interview question id -> keys the answer may arrive under (the interview
+# stores question ids; the recommendations form sends camelCase names)
+PROFILE_KEYS = {
+    "goal": ("goal", "investmentGoal"),
+    "risk_tolerance": ("risk_tolerance", "riskTolerance"),
+    "horizon": ("horizon",),
+    "amount": ("amount",),
+    "sectors": ("sectors", "preferredSectors"),
+    "region": ("region", "regionalFocus"),
+    "strategy": ("strategy",),
+    "experience": ("experience",),
+}
+DEFAULTS = {
+    "goal": "growth", "risk_tolerance": "medium", "horizon": "medium", "amount": "medium",
+    "sectors": ["tech"], "region": "us", "strategy": "growth", "experience": "beginner",
+}
+
+Bucket = Tuple[str, str, str, str] # (goal, risk_tolerance, sector, region)
+
+def _option(question_id: str, raw) -> Optional[str]:
+    """Option value for an answer given as a value or (part of) a label"""
+    text = str(raw).strip().lower()
+    options = _QUESTIONS[question_id]["options"]
+    for option in options:
+        if text in (option["value"], option["label"].lower()):
+            return option["value"]
+    for option in options:
+        label = option["label"].lower()
+        if text and (label.startswith(text) or option["value"] in text.replace(",", " ").split()):
+            return option["value"]
+    return None
+
+def _answers(raw) -> List:
+    if isinstance(raw, (list, tuple)):
+        return list(raw)
+    parsed = parse_json(raw) if isinstance(raw, str) and raw.strip().startswith("[") else None
+    return parsed if isinstance(parsed, list) else str(raw).split(",")
+
+def normalize_profile(profile: dict) -> dict:
+    """Profile with every field as an interview option value (sectors as a sorted list)"""
+    normalized = {}
+    for question_id, keys in PROFILE_KEYS.items():
+        raw = next((profile[k] for k in keys if profile.get(k) not in (None, "", [])), None)
+        if raw is None:
+            normalized[question_id] = DEFAULTS[question_id]
+        elif question_id == "sectors":
+            values = {_option("sectors", s) for s in _answers(raw)} - {None}
+            normalized[question_id] = sorted(values) or DEFAULTS["sectors"]
+        else:
+            normalized[question_id] = _option(question_id, raw) or DEFAULTS[question_id]
+    return normalized
+
+def buckets_for(profile: dict) -> List[Bucket]:
+    return [(profile["goal"], profile["risk_tolerance"], sector, profile["region"]) for sector in profile["sectors"]]
+
+def _key(bucket: Bucket) -> str:
+    return CACHE_PREFIX + ":".join(bucket)
+
+def _label(question_id: str, value: str) -> str:
+    return next((o["label"] for o in _QUESTIONS[question_id]["options"] if o["value"] == value), value)
+
+RECOMMENDATION_PROMPT = """You are a senior financial analyst. 
+Analyze the provided Search Results to identify the best stock/asset recommendations that match the User Profile.
+
+User Profile:
+- Goal: {goal}
+- Risk: {risk}
+- Sectors: {sectors}
+- Investment Amount: {amount}
+- Experience Level: {experience}
+
+Search Results:
+{context}
+
+Task:
+1. Write a "summary": A personalized 2-sentence explanation of WHY these picks were chosen for this specific profile.
+2. Extract 3 to 5 distinct recommendations.
+3. Determine a "buy_price" (entry point) and "sell_price" (target) based on the analysis.
+
+CRITICAL: 
+- You MUST provide a valid Ticker Symbol for each recommendation (e.g., AAPL, BTC-USD). Infer from context if needed.
+- You MUST explain WHY it fits the profile in "match_reason".
+- "buy_price" and "sell_price" should be specific numbers or ranges (e.g. "$150.00" or "$145-150").
+
+Output JSON ONLY inside a code block like this:
+```json
+{{
+    "summary": "Personalized explanation text...",
+    "recommendations": [
+        {{
+            "symbol": "TICKER",
+            "name": "Company Name",
+            "reason": "General reason for buying...",
+            "match_reason": "Specific link to user profile (e.g. 'Matches your High Risk tolerance')",
+            "risk_level": "Low/Medium/High",
+            "type": "Stock/Crypto/ETF",
+            "source": "Source Name",
+            "buy_price": "$100.00",
+            "sell_price": "$120.00"
+        }}
+    ]
+}}
+```
+"""
+async def search_context(query: str, web_query: str) -> str:
+    """Search results for the prompt: the local news store, then the web if it has too little"""
+    articles = await find_articles(query=query, limit=8)
+    results = [f"Title: {a.title}\nSnippet: {a.summary or ''}\nSource: {a.url}" for a in articles]
+    if len(results) < MIN_SEARCH_RESULTS:
+        def web_search():
+            with DDGS() as ddgs:
+                return list(ddgs.text(web_query, max_results=5))
+        try:
+            for r in await run_in_threadpool(web_search):
+                results.append(f"Title: {r['title']}\nSnippet: {r['body']}\nSource: {r['href']}")
+        except Exception as e:
+            print(f"Search failed: {e}")
+    return "\n\n".join(results)
+
+async def generate_recommendations(goal: str, risk: str, sectors: str, region: str, amount: str, experience: str) -> Optional[dict]:
+    """Search plus one LLM completion; the parsed {"summary", "recommendations"} or None"""
+    web_query = f"Best {risk} risk {goal} stocks {sectors} {region} for {amount} investment {experience} trader analyst picks price targets"
+    print(f"Searching: {web_query}")
+    context = await search_context(f"{sectors} {goal} {region} stocks", web_query)
+
+    formatted_prompt = RECOMMENDATION_PROMPT.format(
+        goal=goal,
+        risk=risk,
+        sectors=sectors,
+        amount=amount,
+        experience=experience,
+        context=context
+    )
+    response_text = await cascade.complete(
+        "recommendations",
+        messages=[
+            {"role": "system", "content": formatted_prompt},
+            {"role": "user", "content": "Generate recommendations from search results."}
+        ],
+        validate=json_object_with("recommendations"),
+        max_tokens=1024,
+        temperature=0.5
+    )
+    # Extract JSON (code fences and surrounding prose are skipped)
+    data = parse_json(response_text)
+    if isinstance(data, dict) and isinstance(data.get("recommendations"), list) and data["recommendations"]:
+        return data
+    print(f"JSON Parse/Validation Error: invalid recommendations format or empty list in text: {response_text}")
+    return None
+
+def _short(question_id: str, value: str) -> str:
+    return _label(question_id, value).split(" (")[0]
+
+def personalized_summary(profile: dict) -> str:
+    sectors = ", ".join(_label("sectors", s) for s in profile["sectors"])
+    risk = _label("risk_tolerance", profile["risk_tolerance"]).split("(")[-1].rstrip(")").lower()
+    return (
+        f"Chosen for your {_short('goal', profile['goal']).lower()} goal and {risk}, "
+        f"with a focus on {sectors} ({_short('region', profile['region'])}). "
+        f"Planned horizon: {_short('horizon', profile['horizon']).lower()}; amount: {_short('amount', profile['amount'])}. "
+        f"As a {_short('experience', profile['experience']).lower()} investor, consider building positions gradually."
+    )
+
+def local_ranking_ready() -> bool:
+    """Whether app.ranking can rank profiles from local data (blocking)"""
+    # Imported here because app.ranking imports this module
+    from app.ranking import current_snapshot
+    try:
+        with Session(engine) as session:
+            return current_snapshot(session) is not None
+    except Exception as e:
+        print(f"⚠️ Local ranking check failed: {e}")
+        return False
+
+class RecommendationCache:
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._wanted: "OrderedDict[Bucket, None]" = OrderedDict()
+        self._requested: Set[Bucket] = set() # Refreshed by the sweep
+        self._wake: Optional[asyncio.Event] = None
+        self.generated = 0
+
+    async def get(self, bucket: Bucket) -> Optional[dict]:
+        cached = await response_cache.get(_key(bucket))
+        return json.loads(cached) if cached else None
+
+    async def lookup(self, profile: dict) -> Optional[dict]:
+        """Recommendations for a normalized profile if every one of its
+        buckets is cached, else None (and the missing buckets are queued)"""
+        buckets = buckets_for(profile)
+        entries = list(zip(buckets, await asyncio.gather(*(self.get(bucket) for bucket in buckets))))
+        missing = [bucket for bucket, entry in entries if entry is None]
+        if missing:
+            for bucket in missing:
+                self.want(bucket)
+            return None
+
+        # Round-robin over the sectors' picks so each sector is represented
+        picks, seen = [], set()
+        for rec in itertools.chain.from_iterable(itertools.zip_longest(*(e["recommendations"] for _, e in entries))):
+            symbol = rec.get("symbol") if isinstance(rec, dict) else None
+            if symbol and symbol not in seen:
+                seen.add(symbol)
+                picks.append(rec)
+        return {
+            "summary": personalized_summary(profile),
+            "recommendations": picks[:MAX_PICKS],
+            "cached": True,
+            "generated_at": min(e["generated_at"] for _, e in entries),
+        }
+
+    def want(self, bucket: Bucket):
+        """Generate bucket ahead of the daily sweep, and keep it fresh"""
+        self._wanted[bucket] = None
+        self._requested.add(bucket)
+        if self._wake:
+            self._wake.set()
+
+    async def compute(self, bucket: Bucket) -> bool:
+        goal, risk, sector, region = bucket
+        data = await generate_recommendations(
+            goal=_label("goal", goal),
+            risk=_label("risk_tolerance", risk),
+            sectors=_label("sectors", sector),
+            region=_label("region", region),
+            amount="any amount",
+            experience="any level",
+        )
+        if data is None:
+            return False
+        entry = {"generated_at": time.time(), "recommendations": data["recommendations"]}
+        await response_cache.set(_key(bucket), json.dumps(entry), CACHE_TTL)
+        self.generated += 1
+        return True
+
+    async def _stale(self, bucket: Bucket) -> bool:
+        entry = await self.get(bucket)
+        return entry is None or time.time() - entry["generated_at"] > REFRESH_AGE
+
+    def start(self):
+        if PRECOMPUTE and self._task is None:
+            self._task = asyncio.create_task(self._run())
+            print("✅ Recommendation precompute started")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _next(self, sweep: Iterator[Bucket]) -> Optional[Bucket]:
+        while self._wanted:
+            bucket, _ = self._wanted.popitem(last=False)
+            if await self._stale(bucket):
+                return bucket
+        for bucket in sweep:
+            if await self._stale(bucket):
+                return bucket
+        return None
+
+    async def _run(self):
+        self._wake = asyncio.Event()
+        sweep: Iterator[Bucket] = iter(())
+        while True:
+            bucket = None
+            if await run_in_threadpool(local_ranking_ready):
+                self._wanted.clear() # Served by the local ranking now
+            else:
+                bucket = await self._next(sweep)
+            if bucket is None:
+                # Nothing to do: sleep until a miss or the next sweep
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), SWEEP_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                sweep = iter(sorted(self._requested))
+                continue
+            try:
+                await self.compute(bucket)
+            except Exception as e:
+                print(f"⚠️ Recommendation precompute failed for {bucket}: {e}")
+                await asyncio.sleep(5)
+
+recommendation_cache = RecommendationCache()
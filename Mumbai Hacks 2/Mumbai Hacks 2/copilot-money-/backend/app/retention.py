@@ -0,0 +1,165 @@
+"""Retention and archival of chat sessions.
+
+Sessions inactive for longer than their owner's retention period leave the
+live tables: by default they are first written to gzip-compressed JSONL
+segment files in RETENTION_ARCHIVE_DIR (one line per session with its
+messages and preferences), then deleted. The period and whether to archive
+are set per user in RetentionPolicy; users without one get RETENTION_DAYS
+and RETENTION_ARCHIVE.
+
+Everything is set-based and bounded: sessions are taken SESSION_BATCH at a
+time and messages deleted at most MESSAGE_BATCH rows per transaction, so the
+job never holds the write lock for long. A segment is fsynced before its
+sessions are deleted; a crash in between archives them again on the next run.
+"""
+import os
+import gzip
+import json
+import time
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from sqlmodel import Session, select, delete, col
+from starlette.concurrency import run_in_threadpool
+from app.db import engine
+from app.models import ChatSession, ChatMessage, Preference, RetentionPolicy
+from app.preference_cache import preference_cache
+
+DEFAULT_DAYS = int(os.getenv("RETENTION_DAYS", "180")) or None # 0 keeps everything
+DEFAULT_ARCHIVE = os.getenv("RETENTION_ARCHIVE", "1") == "1"
+ARCHIVE_DIR = os.getenv("RETENTION_ARCHIVE_DIR", "./chat_archive")
+INTERVAL_SECONDS = float(os.getenv("RETENTION_INTERVAL_SECONDS", "3600"))
+SESSION_BATCH = 200
+MESSAGE_BATCH = 1000
+BATCH_PAUSE = 0.05 # Between transactions, so request writes get the lock
+
+def purge_sessions(db: Session, session_ids: List[str]):
+    """Delete sessions with their messages and preferences, MESSAGE_BATCH
+    messages per transaction (commits)"""
+    if not session_ids:
+        return
+    while True:
+        batch = select(ChatMessage.id).where(col(ChatMessage.session_id).in_(session_ids)).limit(MESSAGE_BATCH)
+        deleted = db.execute(delete(ChatMessage).where(col(ChatMessage.id).in_(batch))).rowcount
+        db.commit()
+        if deleted < MESSAGE_BATCH:
+            break
+        time.sleep(BATCH_PAUSE)
+    db.execute(delete(Preference).where(col(Preference.session_id).in_(session_ids)))
+    db.execute(delete(ChatSession).where(col(ChatSession.session_id).in_(session_ids)))
+    db.commit()
+    preference_cache.invalidate(session_ids)
+
+def _records(db: Session, sessions: list) -> Iterator[dict]:
+    """Archive records (session, messages in order, preferences), one session
+    in memory at a time"""
+    for s in sessions:
+        messages = db.exec(
+            select(ChatMessage.id, ChatMessage.role, ChatMessage.content, ChatMessage.created_at)
+            .where(ChatMessage.session_id == s.session_id)
+            .order_by(ChatMessage.created_at, ChatMessage.id)
+        ).all()
+        prefs = db.exec(select(Preference.key, Preference.value).where(Preference.session_id == s.session_id)).all()
+        yield {
+            "session_id": s.session_id,
+            "user_id": s.user_id,
+            "title": s.title,
+            "created_at": s.created_at.isoformat(),
+            "updated_at": s.updated_at.isoformat(),
+            "messages": [{"id": i, "role": role, "content": content, "created_at": at.isoformat()} for i, role, content, at in messages],
+            "preferences": dict(prefs),
+        }
+
+def write_segment(records: Iterable[dict], directory: str = ARCHIVE_DIR) -> int:
+    """Write records to a new gzip JSONL segment; returns how many"""
+    os.makedirs(directory, exist_ok=True)
+    name = f"sessions-{datetime.utcnow():%Y%m%dT%H%M%S%f}.jsonl.gz"
+    path = os.path.join(directory, name)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb") as f:
+            count = 0
+            for record in records:
+                f.write(json.dumps(record, separators=(",", ":")).encode() + b"\n")
+                count += 1
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp, path) # Readers never see a partial segment
+    return count
+
+def read_segment(path: str):
+    """Records of an archive segment"""
+    with gzip.open(path, "rt") as f:
+        for line in f:
+            yield json.loads(line)
+
+def policies(db: Session) -> Dict[str, Tuple[Optional[int], bool]]:
+    return {p.user_id: (p.retain_days, p.archive) for p in db.exec(select(RetentionPolicy)).all()}
+
+def policy_for(db: Session, user_id: str) -> Tuple[Optional[int], bool]:
+    policy = db.exec(select(RetentionPolicy).where(RetentionPolicy.user_id == user_id)).first()
+    return (policy.retain_days, policy.archive) if policy else (DEFAULT_DAYS, DEFAULT_ARCHIVE)
+
+def _expire(db: Session, query, archive: bool, stats: Dict[str, int]):
+    """Archive (optionally) and delete the sessions query selects, in batches"""
+    while True:
+        sessions = db.exec(query.order_by(ChatSession.updated_at).limit(SESSION_BATCH)).all()
+        if not sessions:
+            return
+        ids = [s.session_id for s in sessions]
+        if archive:
+            stats["archived"] += write_segment(_records(db, sessions))
+            stats["segments"] += 1
+        purge_sessions(db, ids)
+        stats["sessions"] += len(ids)
+        if len(sessions) < SESSION_BATCH:
+            return
+        time.sleep(BATCH_PAUSE)
+
+def run_retention(now: Optional[datetime] = None) -> Dict[str, int]:
+    """One pass over every user's policy (blocking)"""
+    now = now or datetime.utcnow()
+    stats = {"sessions": 0, "archived": 0, "segments": 0}
+    with Session(engine) as db:
+        custom = policies(db)
+        for user_id, (days, archive) in custom.items():
+            if days:
+                query = select(ChatSession).where(ChatSession.user_id == user_id, ChatSession.updated_at < now - timedelta(days=days))
+                _expire(db, query, archive, stats)
+        if DEFAULT_DAYS:
+            query = select(ChatSession).where(ChatSession.updated_at < now - timedelta(days=DEFAULT_DAYS))
+            if custom:
+                query = query.where(col(ChatSession.user_id).not_in(list(custom)))
+            _expire(db, query, DEFAULT_ARCHIVE, stats)
+    if stats["sessions"]:
+        print(f"🗄️ Retention: removed {stats['sessions']} sessions, archived {stats['archived']} in {stats['segments']} segments")
+    return stats
+
+class RetentionJob:
+    def __init__(self, interval: float = INTERVAL_SECONDS):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            print("✅ Retention job started")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await run_in_threadpool(run_retention)
+            except Exception as e:
+                print(f"⚠️ Retention run failed: {e}")
+            await asyncio.sleep(self.interval)
+
+retention_job = RetentionJob()
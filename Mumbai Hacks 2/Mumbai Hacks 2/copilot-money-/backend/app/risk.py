@@ -0,0 +1,121 @@
+"""Portfolio risk analytics over the stored daily bars.
+
+Everything is computed with NumPy on the cached returns matrix from
+app.bars. Results are memoized per (portfolio id, portfolio version, latest
+bar date, parameters): the version changes with every trade and the bar date
+with every new session, so a repeat call in between is a dictionary lookup.
+"""
+import threading
+from collections import OrderedDict
+from statistics import NormalDist
+from typing import Dict, List
+import numpy as np
+from sqlmodel import Session, select
+from app.trading_models import Portfolio, Holding
+from app.bars import refresh_bars, returns_matrix, latest_bar_date, load_closes
+
+BENCHMARKS = {"SPY": "SPY", "NIFTY": "^NSEI"}
+TRADING_DAYS = 252
+MEMO_SIZE = 256
+MIN_HISTORY = 0.8 # share of lookback a symbol needs to be included
+
+_memo: "OrderedDict[tuple, dict]" = OrderedDict()
+_lock = threading.Lock()
+
+def _beta(portfolio_returns: np.ndarray, benchmark_returns: np.ndarray):
+    var = benchmark_returns.var(ddof=1)
+    if var == 0:
+        return None
+    return round(float(np.cov(portfolio_returns, benchmark_returns, ddof=1)[0, 1] / var), 4)
+
+def compute_risk(symbols: List[str], values: np.ndarray, returns: np.ndarray, benchmark_returns: Dict[str, np.ndarray], confidence: float) -> dict:
+    """Risk figures for position values (one per column of returns)"""
+    exposure = float(values.sum())
+    weights = values / exposure
+    portfolio_returns = returns @ weights
+
+    mu = portfolio_returns.mean()
+    sigma = portfolio_returns.std(ddof=1)
+    z = NormalDist().inv_cdf(1 - confidence)
+    historical_var = -np.percentile(portfolio_returns, (1 - confidence) * 100)
+    parametric_var = -(mu + z * sigma)
+
+    asset_vol = returns.std(axis=0, ddof=1) * np.sqrt(TRADING_DAYS)
+    corr = np.corrcoef(returns, rowvar=False) if len(symbols) > 1 else np.ones((1, 1))
+
+    return {
+        "exposure": round(exposure, 2),
+        "observations": int(returns.shape[0]),
+        "confidence": confidence,
+        "var": {
+            "historical": round(float(historical_var * exposure), 2),
+            "historical_pct": round(float(historical_var * 100), 4),
+            "parametric": round(float(parametric_var * exposure), 2),
+            "parametric_pct": round(float(parametric_var * 100), 4),
+        },
+        "volatility": {
+            "daily": round(float(sigma), 6),
+            "annualized": round(float(sigma * np.sqrt(TRADING_DAYS)), 6),
+            "by_holding": {s: round(float(v), 6) for s, v in zip(symbols, asset_vol)},
+        },
+        "beta": {name: _beta(portfolio_returns, bench) for name, bench in benchmark_returns.items()},
+        "weights": {s: round(float(w), 6) for s, w in zip(symbols, weights)},
+        "correlation": {
+            "symbols": symbols,
+            "matrix": np.round(np.nan_to_num(corr), 4).tolist(),
+        },
+    }
+
+def portfolio_risk(session: Session, user_id: str, lookback: int = TRADING_DAYS, confidence: float = 0.95) -> dict:
+    portfolio = session.exec(select(Portfolio).where(Portfolio.user_id == user_id)).first()
+    if not portfolio:
+        return {"success": False, "error": "No portfolio found for this user"}
+    holdings = {h.symbol: h.quantity for h in session.exec(select(Holding).where(Holding.portfolio_id == portfolio.id)).all()}
+    if not holdings:
+        return {"success": False, "error": "Portfolio has no holdings"}
+
+    universe = sorted(set(holdings) | set(BENCHMARKS.values()))
+    refresh_bars(session, universe)
+    bar_date = latest_bar_date(session, universe)
+
+    key = (portfolio.id, portfolio.version, bar_date, lookback, confidence)
+    with _lock:
+        if key in _memo:
+            _memo.move_to_end(key)
+            return _memo[key]
+
+    # A recent listing would otherwise trim every column to its short history;
+    # such holdings are reported in missing_history instead
+    counts = load_closes(session, universe, lookback).count()
+    eligible = [s for s in universe if counts.get(s, 0) >= lookback * MIN_HISTORY]
+    columns, matrix = returns_matrix(session, eligible, lookback, as_of=bar_date)
+    held = [s for s in columns if s in holdings]
+    if not held or matrix.shape[0] < 2:
+        return {"success": False, "error": "Not enough price history for these holdings"}
+
+    index = {s: i for i, s in enumerate(columns)}
+    cols = [index[s] for s in held]
+    # Value positions at the last stored close so the result only depends on the key
+    last_close = _last_closes(session, held)
+    values = np.array([holdings[s] * last_close.get(s, 0.0) for s in held])
+    if values.sum() <= 0:
+        return {"success": False, "error": "Holdings have no market value"}
+
+    benchmarks = {name: matrix[:, index[sym]] for name, sym in BENCHMARKS.items() if sym in index}
+    data = compute_risk(held, values, matrix[:, cols], benchmarks, confidence)
+    data.update(
+        as_of=bar_date.isoformat() if bar_date else None,
+        cash=round(portfolio.balance, 2),
+        missing_history=sorted(set(holdings) - set(held)),
+    )
+    result = {"success": True, "data": data}
+
+    with _lock:
+        _memo[key] = result
+        while len(_memo) > MEMO_SIZE:
+            _memo.popitem(last=False)
+    return result
+
+def _last_closes(session: Session, symbols: List[str]) -> Dict[str, float]:
+    closes = load_closes(session, symbols, lookback=10)
+    return {s: float(v) for s, v in closes.ffill().iloc[-1].items()} if not closes.empty else {}
@@ -1,13 +1,15 @@
 from fastapi import APIRouter, HTTPException
 from fastapi import Depends
+from fastapi.responses import StreamingResponse
 from app.schemas import CreateSessionReq, CreateSessionResp, ChatMessageReq, ChatMessageResp
-from app.models import ChatSession, Preference
+from app.models import ChatSession, ChatMessage, Preference
 from app.db import engine
 from sqlmodel import Session, select
 import uuid
-from app.groq_client import ask_groq
-from app.utils import extract_ticker_from_text
-from datetime import datetime
+from typing import Optional
+from app.jsonstream import parse_json
+from app.groq_client import ask_groq, stream_groq
+from app.utils import extract_ticker_from_text, sse_event, MarkerSplitter, SSE_HEADERS
 
 router = APIRouter()
 
@@ -22,45 +24,94 @@ def create_session(req: CreateSessionReq):
         db.commit()
     return {"session_id": session_id}
 
-@router.post("/sessions/{session_id}/messages", response_model=ChatMessageResp)
-def send_message(session_id: str, req: ChatMessageReq):
-    # Basic session validation
+METADATA_MARKER = "---METADATA---"
+
+def build_prompt(content: str) -> str:
+    return f"""
+You are an expert trading assistant. User message: "{content}"
+Return a helpful human-readable reply. Additionally, if the user's message references a stock ticker or requests news/chart, include metadata JSON with keys:
+- news: {{ "ticker": "AAPL" }} or null
+- chart: {{ "ticker": "AAPL" }} or null
+
+Return a JSON object (only) for the metadata after your assistant text, separated with a line like: {METADATA_MARKER} followed by JSON.
+"""
+
+def parse_metadata(raw: Optional[str], user_content: str) -> dict:
+    """Metadata block from the model, or a ticker guessed from the user message"""
+    if raw is not None:
+        parsed = parse_json(raw, default={})
+        return parsed if isinstance(parsed, dict) else {}
+    # fallback: attempt to detect ticker via simple extraction
+    t = extract_ticker_from_text(user_content)
+    if t:
+        return {"news": {"ticker": t}, "chart": {"ticker": t}}
+    return {}
+
+def require_session(session_id: str):
     with Session(engine) as db:
         q = select(ChatSession).where(ChatSession.session_id == session_id)
         res = db.exec(q).first()
         if not res:
             raise HTTPException(status_code=404, detail="Session not found")
 
-    # Build prompt for Groq
-    prompt = f"""
-You are an expert trading assistant. User message: "{req.content}"
-Return a helpful human-readable reply. Additionally, if the user's message references a stock ticker or requests news/chart, include metadata JSON with keys:
-- news: {{ "ticker": "AAPL" }} or null
-- chart: {{ "ticker": "AAPL" }} or null
+def save_exchange(session_id: str, user_content: str, assistant_text: str) -> int:
+    """Persist the user message and the reply; returns the reply's id"""
+    with Session(engine) as db:
+        db.add(ChatMessage(session_id=session_id, role="user", content=user_content))
+        reply = ChatMessage(session_id=session_id, role="assistant", content=assistant_text)
+        db.add(reply)
+        db.commit()
+        db.refresh(reply)
+        return reply.id
 
-Return a JSON object (only) for the metadata after your assistant text, separated with a line like: ---METADATA--- followed by JSON.
-"""
-    resp = ask_groq(prompt)
+@router.post("/sessions/{session_id}/messages", response_model=ChatMessageResp)
+async def send_message(session_id: str, req: ChatMessageReq):
+    # Basic session validation
+    require_session(session_id)
+
+    resp = await ask_groq(build_prompt(req.content))
     content = resp["content"]
 
     # Try to split assistant text and metadata block
     assistant_text = content
-    metadata = {}
-    if '---METADATA---' in content:
-        parts = content.split('---METADATA---', 1)
+    raw_metadata = None
+    if METADATA_MARKER in content:
+        parts = content.split(METADATA_MARKER, 1)
         assistant_text = parts[0].strip()
+        raw_metadata = parts[1]
+    metadata = parse_metadata(raw_metadata, req.content)
+
+    reply_id = save_exchange(session_id, req.content, assistant_text)
+    return {"id": reply_id, "content": assistant_text, "metadata": metadata}
+
+@router.post("/sessions/{session_id}/messages/stream")
+async def stream_message(session_id: str, req: ChatMessageReq):
+    """SSE variant of send_message: "token" events as the reply is generated,
+    then "metadata" and "done". The exchange is persisted once complete."""
+    require_session(session_id)
+
+    async def events():
+        splitter = MarkerSplitter(METADATA_MARKER)
+        parts = []
         try:
-            import json
-            metadata = json.loads(parts[1].strip())
-        except Exception:
-            metadata = {}
-    else:
-        # fallback: attempt to detect ticker via simple extraction
-        t = extract_ticker_from_text(req.content)
-        if t:
-            metadata = {"news": {"ticker": t}, "chart": {"ticker": t}}
-        else:
-            metadata = {}
-
-    # return a small id (timestamp)
-    return {"id": int(datetime.utcnow().timestamp()), "content": assistant_text, "metadata": metadata}
+            async for delta in stream_groq(build_prompt(req.content)):
+                visible = splitter.feed(delta)
+                if visible:
+                    parts.append(visible)
+                    yield sse_event("token", {"text": visible})
+            rest = splitter.flush()
+            if rest:
+                parts.append(rest)
+                yield sse_event("token", {"text": rest})
+        except Exception as e:
+            yield sse_event("error", {"error": str(e)})
+            return
+
+        assistant_text = "".join(parts).strip()
+        metadata = parse_metadata(splitter.tail if splitter.found else None, req.content)
+        yield sse_event("metadata", metadata)
+
+        reply_id = save_exchange(session_id, req.content, assistant_text)
+        yield sse_event("done", {"id": reply_id, "content": assistant_text, "metadata": metadata})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
@@ -1,11 +1,33 @@
 from fastapi import APIRouter, HTTPException
 from app.groq_client import ask_groq
-import json
+from app.jsonstream import parse_json
+from app.sentiment import annotate_news, label
+from app.news_store import news_ingester, find_articles
 
 router = APIRouter()
 
+def _impact(score: float) -> str:
+    strength = abs(score)
+    return "high" if strength >= 0.6 else "medium" if strength >= 0.3 else "low"
+
 @router.get("/ticker/{ticker}")
-def news_for_ticker(ticker: str):
+async def news_for_ticker(ticker: str):
+    ticker = ticker.upper()
+    await news_ingester.ensure(ticker)
+    articles = await find_articles(symbol=ticker, limit=6)
+    if articles:
+        return [{
+            "title": a.title,
+            "source": a.source,
+            "timestamp": a.published_at.isoformat() + "Z",
+            "summary": a.summary,
+            "sentiment": label(a.sentiment_score).lower(),
+            "sentiment_score": a.sentiment_score,
+            "impact": _impact(a.sentiment_score),
+            "url": a.url,
+        } for a in articles]
+
+    # Nothing stored or fetchable: ask the LLM as before
     # Build prompt: ask Groq to search web and return JSON array of news items
     prompt = f"""
 Find the 6 most recent news articles about the stock ticker '{ticker}' (include Indian markets + international news that affects that company). For each article return a JSON object with keys:
@@ -19,21 +41,14 @@ Find the 6 most recent news articles about the stock ticker '{ticker}' (include
 
 Return a JSON array only. Do not add commentary.
 """
-    resp = ask_groq(prompt)
+    resp = await ask_groq(prompt)
     text = resp["content"]
 
-    # try to parse JSON from assistant
-    try:
-        parsed = json.loads(text)
+    # parse the JSON array from the assistant, ignoring any text around it
+    parsed = parse_json(text)
+    if isinstance(parsed, list):
+        # Reproducible labels from the local scorer; the model's is kept as llm_sentiment
+        annotate_news(parsed, lowercase=True)
         return parsed
-    except Exception:
-        # try to extract JSON in text
-        import re
-        m = re.search(r"(\[.*\])", text, re.S)
-        if m:
-            try:
-                return json.loads(m.group(1))
-            except Exception:
-                pass
     # fallback: return minimal message
     raise HTTPException(500, detail="Unable to parse news results from LLM")
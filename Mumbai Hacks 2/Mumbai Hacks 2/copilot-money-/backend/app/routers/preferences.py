@@ -1,10 +1,9 @@
 from fastapi import APIRouter, HTTPException
 from app.schemas import PreferenceQuestion, SavePreferencesReq
 from app.db import engine
-from app.models import Preference
-from sqlmodel import Session, select
+from app.preference_cache import preference_cache, upsert_preferences
+from sqlmodel import Session
 from typing import List
-from datetime import datetime
 
 router = APIRouter()
 
@@ -109,30 +108,19 @@ def save_preferences(payload: dict):
     session_id = payload.get("session_id")
     if not session_id:
         raise HTTPException(400, "session_id required")
+    # Save each key/value as a Preference
+    prefs = {(session_id, k): str(v) for k, v in payload.items() if k != "session_id"}
     with Session(engine) as db:
-        # Save each key/value as a Preference
-        for k, v in payload.items():
-            if k == "session_id":
-                continue
-            q = select(Preference).where(Preference.session_id == session_id, Preference.key == k)
-            existing = db.exec(q).first()
-            if existing:
-                existing.value = str(v)
-                existing.updated_at = datetime.utcnow()
-                db.add(existing)
-            else:
-                p = Preference(session_id=session_id, key=k, value=str(v))
-                db.add(p)
+        upsert_preferences(db, prefs)
         db.commit()
+    preference_cache.committed(prefs)
     return {"status": "ok"}
 
 @router.get("/{session_id}")
 def get_preferences(session_id: str):
     with Session(engine) as db:
-        q = select(Preference).where(Preference.session_id == session_id)
-        prefs = db.exec(q).all()
-        if not prefs:
-            # return 404 to match frontend check logic
-            raise HTTPException(404, "No preferences")
-        out = {p.key: p.value for p in prefs}
-        return out
+        prefs = preference_cache.get(db, session_id)
+    if not prefs:
+        # return 404 to match frontend check logic
+        raise HTTPException(404, "No preferences")
+    return prefs
@@ -1,17 +1,31 @@
-from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel
-from ddgs import DDGS
-from groq import Groq
+from fastapi import APIRouter, HTTPException, Depends, Request, Response, Query
+from fastapi.responses import StreamingResponse, JSONResponse
+from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
 import os
 from dotenv import load_dotenv
 import json
 import re
+import asyncio
 import yfinance as yf
+from collections import Counter
 from datetime import datetime, timedelta
-from sqlmodel import Session, select, desc
-from app.db import get_session
-from app.models import ChatSession, ChatMessage, Preference
+from sqlmodel import Session, select, desc, func, or_, and_
+from sqlalchemy.exc import IntegrityError
+from app.db import get_session, engine
+from app.models import ChatSession, ChatMessage, RetentionPolicy
+from app.retention import purge_sessions, policy_for
 from app.routers.preferences import QUESTIONS
+from app.cascade import cascade, min_length
+from app.intent import intent_router
+from app.utils import sse_event, MarkerSplitter, SSE_HEADERS, encode_cursor, decode_cursor
+from app.jsonstream import JSONStreamParser, parse_json
+from app.dashboard import dashboard
+from app.sentiment import annotate_news
+from app.news_store import news_ingester, find_articles, to_item
+from app.unit_of_work import UnitOfWork
+from app.recommendations import recommendation_cache, normalize_profile, generate_recommendations
+from app.ranking import local_recommendations, explain
 import uuid
 import pandas as pd
 import numpy as np
@@ -22,7 +36,16 @@ load_dotenv()
 
 router = APIRouter()
 
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+# LLM response cache TTLs (seconds) per call site
+ROUTER_CACHE_TTL = 24 * 3600 # Routing JSON for the same query doesn't change
+COMPANY_SUMMARY_CACHE_TTL = 7 * 24 * 3600
+
+# Per-component budget for the /trades pipeline (seconds)
+COMPONENT_TIMEOUT = float(os.getenv("TRADES_COMPONENT_TIMEOUT", "25"))
+
+# Stored articles needed to answer a news component without the LLM
+STORED_NEWS_MIN = 3
+STORED_NEWS_LIMIT = 6
 
 class ChatRequest(BaseModel):
     message: str
@@ -38,9 +61,22 @@ class MarketDataRequest(BaseModel):
 
 class RecommendationRequest(BaseModel):
     profile: dict
+    explain: bool = False # LLM-worded summary on top of the local ranking
+
+def valid_routing(text: str) -> bool:
+    decision = parse_json(text)
+    return isinstance(decision, dict) and isinstance(decision.get("components"), list) and bool(decision["components"])
+
+async def analyze_query(query: str) -> dict:
+    """Analyze query intent and extract entities.
+
+    Common queries are routed locally by app.intent; the LLM only decides
+    the ones the local router isn't confident about.
+    """
+    decision = intent_router.route(query)
+    if decision:
+        return decision
 
-def analyze_query(query: str) -> dict:
-    """Analyze query intent and extract entities using LLM"""
     system_prompt = """You are a financial query router. Analyze the user's request to decide what information to show.
     
     Your goal is to determine which UI components are needed:
@@ -64,57 +100,114 @@ def analyze_query(query: str) -> dict:
     """
     
     try:
-        completion = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
+        response_text = await cascade.complete(
+            "routing",
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": query}
             ],
+            validate=valid_routing,
             max_tokens=150,
-            temperature=0.1
+            temperature=0.1,
+            cache_ttl=ROUTER_CACHE_TTL
         )
         
-        response_text = completion.choices[0].message.content
-        json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-        if json_match:
-            return json.loads(json_match.group())
+        decision = parse_json(response_text)
+        if isinstance(decision, dict):
+            intent_router.record(query, decision)
+            await run_in_threadpool(intent_router.flush)
+            decision["route"] = "slow"
+            return decision
             
     except Exception as e:
         print(f"Router error: {e}")
         
     # Fallback
-    return {"components": ["answer"], "symbol": None, "topic": query}
+    return {"components": ["answer"], "symbol": None, "topic": query, "route": "slow"}
+
+SUGGESTIONS_MARKER = "---SUGGESTIONS---"
+
+# Shared by /trades and /trades/stream, so both answer the same way
+ANSWER_PROMPT = f"""You are a helpful trade and market assistant. Answer questions about trades, markets, investments, and financial topics. 
+    Provide accurate, concise, and practical information as plain text (markdown allowed).
+    After the answer, output a line {SUGGESTIONS_MARKER} followed by a JSON list of 3-5 follow-up questions."""
 
-def generate_basic_response(query: str) -> dict:
+def answer_messages(query: str) -> list:
+    return [
+        {"role": "system", "content": ANSWER_PROMPT},
+        {"role": "user", "content": query}
+    ]
+
+def parse_suggestions(tail: str) -> list:
+    """The JSON list after SUGGESTIONS_MARKER"""
+    suggestions = parse_json(tail, default=[])
+    return suggestions if isinstance(suggestions, list) else []
+
+def split_answer(text: str) -> dict:
+    """The answer and follow-up suggestions of a reply to ANSWER_PROMPT"""
+    answer, found, tail = text.partition(SUGGESTIONS_MARKER)
+    return {"answer": answer.strip(), "suggestions": parse_suggestions(tail) if found else []}
+
+async def generate_basic_response(query: str) -> dict:
     """Generate response for basic queries"""
-    system_prompt = """You are a helpful trade and market assistant. Answer questions about trades, markets, investments, and financial topics. 
-    Provide accurate, concise, and practical information. Format your response as JSON with fields: "answer" (string), "type" (string), "suggestions" (list of 3-5 follow-up questions)"""
-    
     try:
-        completion = client.chat.completions.create(
-            model="groq/compound",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": query}
-            ],
+        response_text = await cascade.complete(
+            "answer",
+            messages=answer_messages(query),
+            validate=min_length(1),
             max_tokens=1024,
             temperature=0.7
         )
-        
-        response_text = completion.choices[0].message.content
-        try:
-            json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-            if json_match:
-                response_data = json.loads(json_match.group())
-                return {"success": True, "type": "basic", "data": response_data}
-        except:
-            pass
-        return {"success": True, "type": "basic", "data": {"answer": response_text, "suggestions": []}}
+        return {"success": True, "type": "basic", "data": split_answer(response_text)}
     except Exception as e:
         return {"success": False, "error": str(e)}
 
-def generate_news_response(query: str) -> dict:
-    """Generate response for news queries"""
+async def stream_basic_response(query: str):
+    """generate_basic_response as plain text deltas, for the SSE endpoint.
+
+    The answer is streamed as prose; follow-up suggestions come after the
+    marker line and are returned by the caller's MarkerSplitter.
+    """
+    async for delta in cascade.stream(
+        "answer",
+        messages=answer_messages(query),
+        max_tokens=1024,
+        temperature=0.7
+    ):
+        yield delta
+
+def news_insight(topic: str, items: list) -> str:
+    """One-line summary of stored articles, without an LLM round trip"""
+    mood, count = Counter(item["sentiment"] for item in items).most_common(1)[0]
+    return f"{len(items)} recent stories on {topic}, {count} of them {mood.lower()}. Latest: {items[0]['title']}"
+
+async def stored_news_response(query: str, symbol: Optional[str]) -> Optional[dict]:
+    """News for the query from the local store, or None if it has too little"""
+    await news_ingester.ensure(symbol)
+    articles = await find_articles(symbol=symbol, query=query, limit=STORED_NEWS_LIMIT)
+    if len(articles) < STORED_NEWS_MIN:
+        return None
+    items = [to_item(a) for a in articles]
+    return {"main_insight": news_insight(query, items), "news_items": items}
+
+async def generate_news_response(query: str, on_item=None, symbol: Optional[str] = None) -> dict:
+    """Generate response for news queries.
+
+    Served from the local news store when it has enough articles; otherwise
+    the completion is parsed as it streams. Either way on_item (async) is
+    awaited with each news item as soon as it is available.
+    """
+    try:
+        stored = await stored_news_response(query, symbol)
+    except Exception as e:
+        print(f"News store error: {e}")
+        stored = None
+    if stored:
+        if on_item:
+            for item in stored["news_items"]:
+                await on_item(item)
+        return {"success": True, "type": "news", "source": "store", "data": stored}
+
     system_prompt = """You are a financial news summarizer. Provide:
     1. main_insight: A concise 1-2 sentence summary of the most important news.
     2. news_items: List of news items with the following fields:
@@ -126,28 +219,38 @@ def generate_news_response(query: str) -> dict:
        - sentiment: "Positive", "Negative", or "Neutral" based on the news impact.
     Format as JSON: {"main_insight": "...", "news_items": [...], "recommendations": [...]}"""
     
+    parser = JSONStreamParser(items_at=["news_items"])
+    chunks = []
     try:
-        completion = client.chat.completions.create(
-            model="groq/compound",
+        async for delta in cascade.stream(
+            "news",
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": f"News about: {query}"}
             ],
             max_tokens=2048,
             temperature=0.8
-        )
-        
-        response_text = completion.choices[0].message.content
-        try:
-            json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-            if json_match:
-                response_data = json.loads(json_match.group())
-                return {"success": True, "type": "news", "data": response_data}
-        except:
-            pass
-        return {"success": True, "type": "news", "data": {"main_insight": response_text, "news_items": []}}
+        ):
+            chunks.append(delta)
+            for _, item in parser.feed(delta):
+                if on_item:
+                    annotate_news([item])
+                    await on_item(item)
+
+        response_data = parser.close()
+        if isinstance(response_data, dict):
+            # Labels come from the local scorer; the model's is kept as llm_sentiment
+            if isinstance(response_data.get("news_items"), list):
+                annotate_news(response_data["news_items"])
+            return {"success": True, "type": "news", "data": response_data}
+        return {"success": True, "type": "news", "data": {"main_insight": "".join(chunks), "news_items": []}}
     except Exception as e:
         print(f"News generation error: {e}")
+        partial = parser.close()
+        if isinstance(partial, dict) and isinstance(partial.get("news_items"), list) and partial["news_items"]:
+            # Cut off mid-stream: keep the items that did arrive
+            annotate_news(partial["news_items"])
+            return {"success": True, "type": "news", "data": partial}
         # Fallback to mock data so UI still works
         return {
             "success": True, 
@@ -195,226 +298,422 @@ def generate_news_response(query: str) -> dict:
     except Exception as e:
         return {"success": False, "error": str(e)}
 
-def get_interview_state(session_id: str, db: Session):
+async def run_components(jobs: dict, timeout: float = COMPONENT_TIMEOUT) -> dict:
+    """Run component coroutines concurrently, each under its own timeout.
+
+    Returns {name: result}; a component that raised or timed out maps to None
+    instead of failing the others.
+    """
+    async def run(name, coro):
+        try:
+            return await asyncio.wait_for(coro, timeout)
+        except asyncio.TimeoutError:
+            print(f"⏱️ Component '{name}' timed out after {timeout}s")
+        except Exception as e:
+            print(f"⚠️ Component '{name}' failed: {e}")
+        return None
+
+    names = list(jobs)
+    results = await asyncio.gather(*(run(name, jobs[name]) for name in names))
+    return dict(zip(names, results))
+
+INTERVIEW_STATE_KEY = "interview_current_question_index"
+
+def get_interview_state(session_id: str, uow: UnitOfWork):
     """Get the current interview state (question index)"""
-    state = db.exec(select(Preference).where(Preference.session_id == session_id, Preference.key == "interview_current_question_index")).first()
-    if state:
-        return int(state.value)
+    state = uow.preference(session_id, INTERVIEW_STATE_KEY)
+    if state is not None:
+        return int(state)
     return None
 
-def set_interview_state(session_id: str, index: int, db: Session):
+def set_interview_state(session_id: str, index: int, uow: UnitOfWork):
     """Set the current interview state"""
-    state = db.exec(select(Preference).where(Preference.session_id == session_id, Preference.key == "interview_current_question_index")).first()
-    if state:
-        state.value = str(index)
-        state.updated_at = datetime.utcnow()
-        db.add(state)
-    else:
-        db.add(Preference(session_id=session_id, key="interview_current_question_index", value=str(index)))
-    db.commit()
+    uow.set_preference(session_id, INTERVIEW_STATE_KEY, str(index))
 
-def save_preference(session_id: str, key: str, value: str, db: Session):
+def save_preference(session_id: str, key: str, value: str, uow: UnitOfWork):
     """Save a user preference"""
-    pref = db.exec(select(Preference).where(Preference.session_id == session_id, Preference.key == key)).first()
-    if pref:
-        pref.value = value
-        pref.updated_at = datetime.utcnow()
-        db.add(pref)
-    else:
-        db.add(Preference(session_id=session_id, key=key, value=value))
-    db.commit()
+    uow.set_preference(session_id, key, value)
 
-def get_all_preferences(session_id: str, db: Session):
+def get_all_preferences(session_id: str, uow: UnitOfWork):
     """Get all user preferences"""
-    prefs = db.exec(select(Preference).where(Preference.session_id == session_id)).all()
-    return {p.key: p.value for p in prefs}
+    return uow.all_preferences(session_id)
 
-@router.post("/trades")
-async def trades_query(req: TradesQueryRequest, db: Session = Depends(get_session)):
-    """Handle trades queries - dynamically constructs response based on LLM decision"""
-    try:
-        # 1. Manage Session
-        session_id = req.session_id
-        if not session_id:
-            session_id = str(uuid.uuid4())
-            session = ChatSession(session_id=session_id, user_id=req.user_id, title=req.query[:50])
-            db.add(session)
-        else:
-            session = db.exec(select(ChatSession).where(ChatSession.session_id == session_id)).first()
-            if not session:
-                session = ChatSession(session_id=session_id, user_id=req.user_id, title=req.query[:50])
-                db.add(session)
-            else:
-                session.updated_at = datetime.utcnow()
-                db.add(session)
-        
-        db.commit()
-        db.refresh(session)
+def start_exchange(req: TradesQueryRequest, uow: UnitOfWork) -> str:
+    """Create or touch the chat session and store the user's message"""
+    session_id = req.session_id or str(uuid.uuid4())
+    uow.touch_session(session_id, req.user_id, req.query[:50])
+    uow.add_message(session_id, "user", req.query)
+    return session_id
 
-        # 2. Save User Message
-        user_msg = ChatMessage(session_id=session_id, role="user", content=req.query)
-        db.add(user_msg)
-        db.commit()
+async def handle_interview(req: TradesQueryRequest, session_id: str, uow: UnitOfWork) -> Optional[dict]:
+    """Response for the stock recommendation interview, or None when the
+    session isn't in one"""
+    # --- INTERVIEW LOGIC START ---
 
-        # --- INTERVIEW LOGIC START ---
-        
-        # Check if starting interview
-        if req.query == "START_STOCK_RECOMMENDATION_INTERVIEW":
-            set_interview_state(session_id, 0, db)
-            first_q = QUESTIONS[0]
-            
+    # Check if starting interview
+    if req.query == "START_STOCK_RECOMMENDATION_INTERVIEW":
+        set_interview_state(session_id, 0, uow)
+        first_q = QUESTIONS[0]
+
+        response_data = {
+            "success": True,
+            "type": "interview_question",
+            "session_id": session_id,
+            "data": {
+                "question": first_q["question"],
+                "options": first_q["options"],
+                "question_id": first_q["id"],
+                "progress": f"1/{len(QUESTIONS)}"
+            }
+        }
+
+        uow.add_message(session_id, "assistant", json.dumps(response_data))
+        return response_data
+
+    # Check if in interview
+    current_index = get_interview_state(session_id, uow)
+
+    if current_index is not None and current_index < len(QUESTIONS):
+        # This message is the answer to QUESTIONS[current_index]
+        current_q = QUESTIONS[current_index]
+        save_preference(session_id, current_q["id"], req.query, uow)
+
+        # Move to next question
+        next_index = current_index + 1
+        set_interview_state(session_id, next_index, uow)
+
+        if next_index < len(QUESTIONS):
+            next_q = QUESTIONS[next_index]
             response_data = {
                 "success": True,
                 "type": "interview_question",
                 "session_id": session_id,
                 "data": {
-                    "question": first_q["question"],
-                    "options": first_q["options"],
-                    "question_id": first_q["id"],
-                    "progress": f"1/{len(QUESTIONS)}"
+                    "question": next_q["question"],
+                    "options": next_q["options"],
+                    "question_id": next_q["id"],
+                    "progress": f"{next_index + 1}/{len(QUESTIONS)}"
                 }
             }
-            
-            assistant_msg = ChatMessage(session_id=session_id, role="assistant", content=json.dumps(response_data))
-            db.add(assistant_msg)
-            db.commit()
+
+            uow.add_message(session_id, "assistant", json.dumps(response_data))
             return response_data
+        else:
+            # Interview Complete! Generate Recommendations
+            # Mark interview as done (or just leave index at len(QUESTIONS))
 
-        # Check if in interview
-        current_index = get_interview_state(session_id, db)
-        
-        if current_index is not None and current_index < len(QUESTIONS):
-            # This message is the answer to QUESTIONS[current_index]
-            current_q = QUESTIONS[current_index]
-            save_preference(session_id, current_q["id"], req.query, db)
-            
-            # Move to next question
-            next_index = current_index + 1
-            set_interview_state(session_id, next_index, db)
-            
-            if next_index < len(QUESTIONS):
-                next_q = QUESTIONS[next_index]
-                response_data = {
-                    "success": True,
-                    "type": "interview_question",
-                    "session_id": session_id,
-                    "data": {
-                        "question": next_q["question"],
-                        "options": next_q["options"],
-                        "question_id": next_q["id"],
-                        "progress": f"{next_index + 1}/{len(QUESTIONS)}"
-                    }
-                }
-                
-                assistant_msg = ChatMessage(session_id=session_id, role="assistant", content=json.dumps(response_data))
-                db.add(assistant_msg)
-                db.commit()
-                return response_data
-            else:
-                # Interview Complete! Generate Recommendations
-                # Mark interview as done (or just leave index at len(QUESTIONS))
-                
-                # Fetch all preferences
-                prefs = get_all_preferences(session_id, db)
-                
-                # Call recommendation logic
-                rec_req = RecommendationRequest(profile=prefs)
-                rec_res = await get_recommendations(rec_req)
-                
-                response_data = {
-                    "success": True,
-                    "type": "stock_recommendation",
-                    "session_id": session_id,
-                    "data": rec_res["data"]
-                }
-                
-                assistant_msg = ChatMessage(session_id=session_id, role="assistant", content=json.dumps(response_data))
-                db.add(assistant_msg)
-                db.commit()
-                return response_data
+            # Fetch all preferences
+            prefs = get_all_preferences(session_id, uow)
+            uow.release()
 
-        # --- INTERVIEW LOGIC END ---
+            # Call recommendation logic
+            rec_req = RecommendationRequest(profile=prefs)
+            rec_res = await get_recommendations(rec_req)
 
-        analysis = analyze_query(req.query)
+            response_data = {
+                "success": True,
+                "type": "stock_recommendation",
+                "session_id": session_id,
+                "data": rec_res["data"]
+            }
+
+            uow.add_message(session_id, "assistant", json.dumps(response_data))
+            return response_data
+
+    # --- INTERVIEW LOGIC END ---
+
+    return None
+
+def market_intel_response(session_id: str, analysis: dict) -> dict:
+    components = analysis.get("components", ["answer"])
+    symbol = analysis.get("symbol")
+    return {
+        "success": True,
+        "type": "market_intel", # Unified type
+        "session_id": session_id,
+        "route": analysis.get("route"),
+        "data": {
+            "symbol": symbol if "chart" in components else None,
+            "description": f"Market Data for {symbol}" if symbol else None,
+            "news_items": [],
+            "main_insight": None,
+            "suggestions": []
+        }
+    }
+
+@router.post("/trades")
+async def trades_query(req: TradesQueryRequest, db: Session = Depends(get_session)):
+    """Handle trades queries - dynamically constructs response based on LLM decision"""
+    # Every write of the exchange is committed together at the end
+    uow = UnitOfWork(db)
+    try:
+        session_id = start_exchange(req, uow)
+        interview = await handle_interview(req, session_id, uow)
+        if interview:
+            uow.commit()
+            return interview
+        uow.release() # Don't hold a pooled connection through the LLM calls
+
+        analysis = await analyze_query(req.query)
         components = analysis.get("components", ["answer"])
-        symbol = analysis.get("symbol")
         topic = analysis.get("topic") or req.query
         
-        print(f"Query Analysis: {analysis}")
+        print(f"Query Analysis ({analysis.get('route')} path): {analysis}")
         
-        response_data = {
-            "success": True,
-            "type": "market_intel", # Unified type
-            "session_id": session_id,
-            "data": {
-                "symbol": symbol if "chart" in components else None,
-                "description": f"Market Data for {symbol}" if symbol else None,
-                "news_items": [],
-                "main_insight": None,
-                "suggestions": []
-            }
-        }
+        response_data = market_intel_response(session_id, analysis)
         
-        # 1. Fetch News if requested
+        # 1. News and answer are independent, so generate them concurrently
+        jobs = {}
         if "news" in components:
-            news_res = generate_news_response(topic)
-            if news_res.get("success"):
-                response_data["data"]["news_items"] = news_res["data"].get("news_items", [])
-                # If answer not explicitly requested, use news insight as answer
-                if "answer" not in components:
-                     response_data["data"]["main_insight"] = news_res["data"].get("main_insight")
-
-        # 2. Generate Answer if requested (or if it's the only component)
+            jobs["news"] = generate_news_response(topic, symbol=analysis.get("symbol"))
         if "answer" in components:
-            # If we already have news, we can incorporate it into the answer generation or just use basic response
-            # For now, let's use the basic response but contextually aware
-            basic_res = generate_basic_response(req.query)
-            if basic_res.get("success"):
-                response_data["data"]["main_insight"] = basic_res["data"].get("answer")
-                response_data["data"]["suggestions"] = basic_res["data"].get("suggestions", [])
+            jobs["answer"] = generate_basic_response(req.query)
+        results = await run_components(jobs)
+
+        failed = [name for name in jobs if not (results.get(name) or {}).get("success")]
+        if failed:
+            # Return whatever finished; the client shows the missing parts as unavailable
+            response_data["partial"] = True
+            response_data["failed_components"] = failed
+
+        news_res = results.get("news")
+        if news_res and news_res.get("success"):
+            response_data["data"]["news_items"] = news_res["data"].get("news_items", [])
+            # If answer not requested (or it failed), use news insight as answer
+            if "answer" not in components or "answer" in failed:
+                 response_data["data"]["main_insight"] = news_res["data"].get("main_insight")
+
+        # 2. Answer (if requested) takes precedence for the insight text
+        basic_res = results.get("answer")
+        if basic_res and basic_res.get("success"):
+            response_data["data"]["main_insight"] = basic_res["data"].get("answer")
+            response_data["data"]["suggestions"] = basic_res["data"].get("suggestions", [])
 
         # 3. Chart is handled by frontend seeing "symbol" in data
         
         # 4. Save Assistant Response
         # We save the full response data as JSON string to reconstruct the UI
-        assistant_msg = ChatMessage(
-            session_id=session_id, 
-            role="assistant", 
-            content=json.dumps(response_data)
-        )
-        db.add(assistant_msg)
-        db.commit()
+        uow.add_message(session_id, "assistant", json.dumps(response_data))
+        uow.commit()
         
         return response_data
     
     except Exception as e:
+        try:
+            uow.commit() # Keep the session and the user's message
+        except Exception as commit_error:
+            print(f"⚠️ Failed to save exchange: {commit_error}")
         return {"success": False, "error": str(e)}
 
+@router.post("/trades/stream")
+async def trades_query_stream(req: TradesQueryRequest, db: Session = Depends(get_session)):
+    """Server-sent-event variant of /trades.
+
+    Events, in order of availability: "route" (components and symbol, so the
+    chart can load immediately), "news_item" (each news item as it is parsed),
+    "news" (all items and the insight), "token" (answer text deltas),
+    "suggestions", "error" (a failed or timed out component), and finally
+    "done" with the same payload /trades returns, once it has been persisted
+    (or queued, with WRITE_BEHIND=1).
+    Interview turns are sent as a single "done" event.
+    """
+    uow = UnitOfWork(db)
+    session_id = start_exchange(req, uow)
+    interview = await handle_interview(req, session_id, uow)
+    if interview:
+        uow.commit()
+    else:
+        uow.release()
+
+    async def events():
+        try:
+            async for event in exchange_events():
+                yield event
+        finally:
+            # No-op after a full exchange; keeps the user's message if the client left early
+            uow.commit()
+
+    async def exchange_events():
+        if interview:
+            yield sse_event("done", interview)
+            return
+
+        analysis = await analyze_query(req.query)
+        components = analysis.get("components", ["answer"])
+        topic = analysis.get("topic") or req.query
+        response_data = market_intel_response(session_id, analysis)
+        yield sse_event("route", {"session_id": session_id, **analysis})
+
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def news_job():
+            async def on_item(item):
+                await queue.put(("news_item", item))
+            res = await generate_news_response(topic, on_item=on_item, symbol=analysis.get("symbol"))
+            await queue.put(("news", res))
+
+        async def answer_job():
+            splitter = MarkerSplitter(SUGGESTIONS_MARKER)
+            async for delta in stream_basic_response(req.query):
+                visible = splitter.feed(delta)
+                if visible:
+                    await queue.put(("token", visible))
+            rest = splitter.flush()
+            if rest:
+                await queue.put(("token", rest))
+            await queue.put(("suggestions", parse_suggestions(splitter.tail) if splitter.found else []))
+
+        async def run(name, job):
+            try:
+                await asyncio.wait_for(job(), COMPONENT_TIMEOUT)
+            except Exception as e:
+                error = "timed out" if isinstance(e, asyncio.TimeoutError) else str(e)
+                print(f"⚠️ Component '{name}' failed: {error}")
+                await queue.put(("error", {"component": name, "error": error}))
+            finally:
+                await queue.put(("finished", name))
+
+        jobs = {}
+        if "news" in components:
+            jobs["news"] = news_job
+        if "answer" in components:
+            jobs["answer"] = answer_job
+        tasks = [asyncio.create_task(run(name, job)) for name, job in jobs.items()]
+
+        data = response_data["data"]
+        answer_parts = []
+        failed = []
+        news_insight = None
+        pending = len(tasks)
+        try:
+            while pending:
+                kind, payload = await queue.get()
+                if kind == "finished":
+                    pending -= 1
+                elif kind == "news":
+                    if payload.get("success"):
+                        data["news_items"] = payload["data"].get("news_items", [])
+                        news_insight = payload["data"].get("main_insight")
+                        yield sse_event("news", {"news_items": data["news_items"], "main_insight": news_insight})
+                    else:
+                        failed.append("news")
+                elif kind == "news_item":
+                    yield sse_event("news_item", payload)
+                elif kind == "token":
+                    answer_parts.append(payload)
+                    yield sse_event("token", {"text": payload})
+                elif kind == "suggestions":
+                    data["suggestions"] = payload
+                    yield sse_event("suggestions", payload)
+                elif kind == "error":
+                    failed.append(payload["component"])
+                    yield sse_event("error", payload)
+        finally:
+            # Client went away: stop generating
+            for task in tasks:
+                task.cancel()
+
+        if answer_parts:
+            data["main_insight"] = "".join(answer_parts).strip()
+        elif "answer" not in components or "answer" in failed:
+            data["main_insight"] = news_insight
+        if failed:
+            response_data["partial"] = True
+            response_data["failed_components"] = failed
+
+        # The session and user message are committed with the answer
+        uow.add_message(session_id, "assistant", json.dumps(response_data))
+        uow.commit()
+        yield sse_event("done", response_data)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+# Keyset pagination for the session and message lists: rows are ordered by
+# (timestamp, id) descending and the X-Next-Cursor header carries the last one
+SESSION_PAGE_SIZE = 50
+MESSAGE_PAGE_SIZE = 20
+
+def _parse_cursor(cursor: Optional[str]) -> Optional[list]:
+    if not cursor:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _older_than(ts_col, id_col, cursor: list):
+    c_ts, c_id = cursor
+    return or_(ts_col < c_ts, and_(ts_col == c_ts, id_col < c_id))
+
+def _page(rows: list, limit: int, ts_field: str, response: Response) -> list:
+    """First limit rows, setting X-Next-Cursor if there are more"""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(getattr(rows[-1], ts_field), rows[-1].id)
+    return [dict(row._mapping) for row in rows]
+
 @router.get("/sessions/{user_id}")
-async def get_user_sessions(user_id: str, db: Session = Depends(get_session)):
-    sessions = db.exec(select(ChatSession).where(ChatSession.user_id == user_id).order_by(desc(ChatSession.updated_at))).all()
-    return {"success": True, "sessions": sessions}
+async def get_user_sessions(
+    user_id: str,
+    response: Response,
+    limit: int = Query(SESSION_PAGE_SIZE, ge=1, le=200),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_session),
+):
+    """One page of a user's chat sessions, most recently active first
+    (served by ix_chat_sessions_user_updated; loads the listing columns only)"""
+    after = _parse_cursor(cursor)
+    query = select(ChatSession.id, ChatSession.session_id, ChatSession.title, ChatSession.created_at, ChatSession.updated_at).where(ChatSession.user_id == user_id)
+    if after:
+        query = query.where(_older_than(ChatSession.updated_at, ChatSession.id, after))
+    rows = db.exec(query.order_by(desc(ChatSession.updated_at), desc(ChatSession.id)).limit(limit + 1)).all()
+    return {"success": True, "sessions": _page(rows, limit, "updated_at", response)}
 
 @router.get("/sessions/{session_id}/messages")
-async def get_session_messages(session_id: str, db: Session = Depends(get_session)):
-    messages = db.exec(select(ChatMessage).where(ChatMessage.session_id == session_id).order_by(ChatMessage.created_at)).all()
-    return {"success": True, "messages": messages}
+async def get_session_messages(
+    session_id: str,
+    response: Response,
+    limit: int = Query(MESSAGE_PAGE_SIZE, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_session),
+):
+    """One page of a session's messages, newest first; follow X-Next-Cursor
+    to load older ones (served by ix_chat_messages_session_created)"""
+    after = _parse_cursor(cursor)
+    query = select(ChatMessage.id, ChatMessage.role, ChatMessage.content, ChatMessage.created_at).where(ChatMessage.session_id == session_id)
+    if after:
+        query = query.where(_older_than(ChatMessage.created_at, ChatMessage.id, after))
+    rows = db.exec(query.order_by(desc(ChatMessage.created_at), desc(ChatMessage.id)).limit(limit + 1)).all()
+    return {"success": True, "messages": _page(rows, limit, "created_at", response)}
 
 @router.delete("/sessions/{session_id}")
 async def delete_session(session_id: str, db: Session = Depends(get_session)):
-    session = db.exec(select(ChatSession).where(ChatSession.session_id == session_id)).first()
-    if not session:
+    if not db.exec(select(ChatSession.id).where(ChatSession.session_id == session_id)).first():
         raise HTTPException(status_code=404, detail="Session not found")
-    
-    # Delete messages
-    messages = db.exec(select(ChatMessage).where(ChatMessage.session_id == session_id)).all()
-    for msg in messages:
-        db.delete(msg)
-        
-    db.delete(session)
-    db.commit()
+    # Set-based deletes of the messages, preferences and session
+    await run_in_threadpool(purge_sessions, db, [session_id])
     return {"success": True}
 
+class RetentionPolicyRequest(BaseModel):
+    retain_days: Optional[int] = Field(None, ge=1) # None keeps sessions forever
+    archive: bool = True
+
+@router.get("/retention/{user_id}")
+def get_retention_policy(user_id: str, db: Session = Depends(get_session)):
+    retain_days, archive = policy_for(db, user_id)
+    return {"success": True, "user_id": user_id, "retain_days": retain_days, "archive": archive}
+
+@router.put("/retention/{user_id}")
+def set_retention_policy(user_id: str, req: RetentionPolicyRequest, db: Session = Depends(get_session)):
+    """Sessions inactive for retain_days are archived (if archive) and removed by the retention job"""
+    policy = db.exec(select(RetentionPolicy).where(RetentionPolicy.user_id == user_id)).first() or RetentionPolicy(user_id=user_id)
+    policy.retain_days = req.retain_days
+    policy.archive = req.archive
+    policy.updated_at = datetime.utcnow()
+    db.add(policy)
+    db.commit()
+    return {"success": True, "user_id": user_id, "retain_days": policy.retain_days, "archive": policy.archive}
+
 @router.post("/market-data")
 async def get_market_data(req: MarketDataRequest):
     """Fetch historical market data using yfinance"""
@@ -446,15 +745,16 @@ async def get_market_data(req: MarketDataRequest):
         if long_summary:
             try:
                 summary_prompt = f"Summarize this company description in 2 concise sentences: {long_summary[:1000]}"
-                completion = client.chat.completions.create(
-                    model="llama-3.3-70b-versatile",
+                about_summary = await cascade.complete(
+                    "summary",
                     messages=[
                         {"role": "user", "content": summary_prompt}
                     ],
+                    validate=min_length(40),
                     max_tokens=100,
-                    temperature=0.5
+                    temperature=0.5,
+                    cache_ttl=COMPANY_SUMMARY_CACHE_TTL
                 )
-                about_summary = completion.choices[0].message.content
             except Exception as e:
                 print(f"Summary generation failed: {e}")
                 about_summary = long_summary[:200] + "..."
@@ -517,121 +817,39 @@ async def get_market_data(req: MarketDataRequest):
 
 @router.post("/recommendations")
 async def get_recommendations(req: RecommendationRequest):
-    """Generate personalized stock recommendations using Web Search + LLM"""
+    """Personalized stock recommendations.
+
+    Ranked locally from cached fundamentals and bars (app.ranking). Until
+    the universe has data, served from the per-bucket cache
+    app.recommendations precomputes; a profile whose buckets aren't cached
+    yet is generated online (Web Search + LLM) and its buckets are queued
+    for precompute.
+    """
+    profile = req.profile
     try:
-        profile = req.profile
+        normalized = normalize_profile(profile)
+        ranked = await run_in_threadpool(local_recommendations, normalized)
+        if ranked:
+            if req.explain:
+                ranked["summary"] = await explain(normalized, ranked) or ranked["summary"]
+            return {"success": True, "data": ranked}
+
+        cached = await recommendation_cache.lookup(normalized)
+        if cached:
+            return {"success": True, "data": cached}
+
         print(f"Generating recommendations for profile: {profile}")
-        
-        # 1. Construct Search Query
-        goal = profile.get("investmentGoal", "Growth")
-        risk = profile.get("riskTolerance", "Medium")
-        sectors = " ".join(profile.get("preferredSectors", ["Tech"]))
-        region = profile.get("regionalFocus", "US")
-        amount = profile.get("amount", "$1k-$10k")
-        experience = profile.get("experience", "Beginner")
-        
-        search_query = f"Best {risk} risk {goal} stocks {sectors} {region} for {amount} investment {experience} trader November 2024 analyst picks price targets"
-        print(f"Searching: {search_query}")
-        
-        # 2. Perform Web Search
-        search_results = []
-        try:
-            with DDGS() as ddgs:
-                results = list(ddgs.text(search_query, max_results=5))
-                for r in results:
-                    search_results.append(f"Title: {r['title']}\nSnippet: {r['body']}\nSource: {r['href']}")
-        except Exception as e:
-            print(f"Search failed: {e}")
-            # Fallback to generic query if specific fails
-            pass
-            
-        search_context = "\n\n".join(search_results)
-        
-        # 3. LLM Extraction
-        system_prompt = """You are a senior financial analyst. 
-        Analyze the provided Search Results to identify the best stock/asset recommendations that match the User Profile.
-        
-        User Profile:
-        - Goal: {goal}
-        - Risk: {risk}
-        - Sectors: {sectors}
-        - Investment Amount: {amount}
-        - Experience Level: {experience}
-        
-        Search Results:
-        {context}
-        
-        Task:
-        1. Write a "summary": A personalized 2-sentence explanation of WHY these picks were chosen for this specific profile.
-        2. Extract 3 to 5 distinct recommendations.
-        3. Determine a "buy_price" (entry point) and "sell_price" (target) based on the analysis.
-        
-        CRITICAL: 
-        - You MUST provide a valid Ticker Symbol for each recommendation (e.g., AAPL, BTC-USD). Infer from context if needed.
-        - You MUST explain WHY it fits the profile in "match_reason".
-        - "buy_price" and "sell_price" should be specific numbers or ranges (e.g. "$150.00" or "$145-150").
-        
-        Output JSON ONLY inside a code block like this:
-        ```json
-        {{
-            "summary": "Personalized explanation text...",
-            "recommendations": [
-                {{
-                    "symbol": "TICKER",
-                    "name": "Company Name",
-                    "reason": "General reason for buying...",
-                    "match_reason": "Specific link to user profile (e.g. 'Matches your High Risk tolerance')",
-                    "risk_level": "Low/Medium/High",
-                    "type": "Stock/Crypto/ETF",
-                    "source": "Source Name",
-                    "buy_price": "$100.00",
-                    "sell_price": "$120.00"
-                }}
-            ]
-        }}
-        ```
-        """
-        
-        formatted_prompt = system_prompt.format(
-            goal=goal,
-            risk=risk,
-            sectors=sectors,
-            amount=amount,
-            experience=experience,
-            context=search_context
+        data = await generate_recommendations(
+            goal=profile.get("investmentGoal") or profile.get("goal") or "Growth",
+            risk=profile.get("riskTolerance") or profile.get("risk_tolerance") or "Medium",
+            sectors=" ".join(profile.get("preferredSectors") or normalized["sectors"]),
+            region=profile.get("regionalFocus") or profile.get("region") or "US",
+            amount=profile.get("amount", "$1k-$10k"),
+            experience=profile.get("experience", "Beginner"),
         )
-        
-        completion = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[
-                {"role": "system", "content": formatted_prompt},
-                {"role": "user", "content": "Generate recommendations from search results."}
-            ],
-            max_tokens=1024,
-            temperature=0.5
-        )
-        
-        response_text = completion.choices[0].message.content
-        
-        # Extract JSON from code block
-        json_match = re.search(r'```json\s*(\{.*?\})\s*```', response_text, re.DOTALL)
-        if not json_match:
-            # Fallback to loose JSON matching
-            json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-        
-        if json_match:
-            try:
-                json_str = json_match.group(1) if '```' in json_match.group(0) else json_match.group(0)
-                data = json.loads(json_str)
-                
-                # Validate data structure
-                if "recommendations" not in data or not isinstance(data["recommendations"], list) or len(data["recommendations"]) == 0:
-                    raise ValueError("Invalid recommendations format or empty list")
-                    
-                return {"success": True, "data": data}
-            except (json.JSONDecodeError, ValueError) as e:
-                print(f"JSON Parse/Validation Error: {e} in text: {response_text}")
-                # Fall through to mock data
+        if data:
+            return {"success": True, "data": data}
+        # Fall through to mock data
             
     except Exception as e:
         print(f"Recommendation error: {e}")
@@ -685,95 +903,27 @@ def calculate_technical_indicators(df):
         return df
 
 @router.get("/market-analysis")
-async def get_market_analysis():
-    """Get broad market analysis"""
-    try:
-        # 1. Indices
-        indices = {
-            "S&P 500": "SPY",
-            "NASDAQ": "QQQ",
-            "Dow Jones": "DIA",
-            "Bitcoin": "BTC-USD"
-        }
-        indices_data = []
-        for name, ticker in indices.items():
-            try:
-                t = yf.Ticker(ticker)
-                hist = t.history(period="2d")
-                if len(hist) >= 2:
-                    current = hist["Close"].iloc[-1]
-                    prev = hist["Close"].iloc[-2]
-                    change = ((current - prev) / prev) * 100
-                    indices_data.append({
-                        "name": name,
-                        "price": round(current, 2),
-                        "change": round(change, 2)
-                    })
-            except:
-                pass
-
-        # 2. Sector Performance (Using Sector ETFs)
-        sectors = {
-            "Tech": "XLK",
-            "Finance": "XLF",
-            "Healthcare": "XLV",
-            "Energy": "XLE",
-            "Consumer": "XLY"
-        }
-        sector_data = []
-        for name, ticker in sectors.items():
-            try:
-                t = yf.Ticker(ticker)
-                hist = t.history(period="2d")
-                if len(hist) >= 2:
-                    current = hist["Close"].iloc[-1]
-                    prev = hist["Close"].iloc[-2]
-                    change = ((current - prev) / prev) * 100
-                    sector_data.append({
-                        "name": name,
-                        "change": round(change, 2)
-                    })
-            except:
-                pass
-
-        # 3. Market Sentiment (LLM)
-        try:
-            sentiment_prompt = "Based on recent global financial news (inflation, interest rates, tech earnings), give a market sentiment score from 0 (Extreme Fear) to 100 (Extreme Greed) and a 1 sentence explanation."
-            completion = client.chat.completions.create(
-                model="llama-3.3-70b-versatile",
-                messages=[{"role": "user", "content": sentiment_prompt}],
-                max_tokens=100
-            )
-            sentiment_text = completion.choices[0].message.content
-            # Extract number if possible, else random
-            import random
-            score = random.randint(40, 70) # Fallback
-            match = re.search(r'\d+', sentiment_text)
-            if match:
-                score = int(match.group())
-            
-            sentiment = {
-                "score": score,
-                "text": sentiment_text
-            }
-        except:
-            sentiment = {"score": 50, "text": "Market is neutral awaiting further data."}
+async def get_market_analysis(request: Request):
+    """Get broad market analysis (served from the background snapshot)"""
+    snapshot = await dashboard.current()
+    if snapshot is None:
+        return JSONResponse(
+            {"success": False, "error": "Market analysis is not available yet"},
+            status_code=503,
+            headers={"Retry-After": str(int(dashboard.interval))},
+        )
 
-        return {
-            "success": True,
-            "data": {
-                "indices": indices_data,
-                "sectors": sector_data,
-                "sentiment": sentiment,
-                "top_movers": [ # Mock for now as yfinance doesn't give easy top movers
-                    {"symbol": "NVDA", "change": 2.5},
-                    {"symbol": "TSLA", "change": -1.2},
-                    {"symbol": "AAPL", "change": 0.8}
-                ]
-            }
-        }
-    except Exception as e:
-        return {"success": False, "error": str(e)}
+    headers = {"ETag": snapshot.etag, "Cache-Control": "public, max-age=60"}
+    client_tags = [t.strip().removeprefix("W/") for t in request.headers.get("if-none-match", "").split(",")]
+    if snapshot.etag in client_tags:
+        return Response(status_code=304, headers=headers)
+
+    return JSONResponse({
+        "success": True,
+        "version": snapshot.version,
+        "generated_at": snapshot.generated_at.isoformat(),
+        "data": snapshot.data
+    }, headers=headers)
 
 @router.get("/stock-research/{symbol}")
 async def get_stock_research(symbol: str):
@@ -794,32 +944,15 @@ async def get_stock_research(symbol: str):
                     "earnings": row.get("Net Income", 0)
                 })
         
-        # News
-        news = ticker.news[:5] if ticker.news else []
-        formatted_news = []
-        
-        if not news:
-            # Fallback to DuckDuckGo
-            try:
-                with DDGS() as ddgs:
-                    results = list(ddgs.news(keywords=f"{symbol} stock news", max_results=5))
-                    for r in results:
-                        formatted_news.append({
-                            "title": r.get("title"),
-                            "link": r.get("url"),
-                            "publisher": r.get("source"),
-                            "thumbnail": r.get("image")
-                        })
-            except Exception as e:
-                print(f"News fallback failed: {e}")
-        else:
-            for n in news:
-                formatted_news.append({
-                    "title": n.get("title"),
-                    "link": n.get("link"),
-                    "publisher": n.get("publisher"),
-                    "thumbnail": n.get("thumbnail", {}).get("resolutions", [{}])[0].get("url")
-                })
+        # News, from the local store (fetched live only the first time a symbol is seen)
+        await news_ingester.ensure(symbol.upper())
+        articles = await find_articles(symbol=symbol.upper(), limit=5)
+        formatted_news = [{
+            "title": a.title,
+            "link": a.url,
+            "publisher": a.source,
+            "thumbnail": a.thumbnail
+        } for a in articles]
 
         # Analyst Ratings (Mock/LLM if not in info)
         recommendation_key = info.get("recommendationKey", "hold")
@@ -943,43 +1076,7 @@ async def get_trade_analysis(symbol: str):
     except Exception as e:
         return {"success": False, "error": str(e)}
 
-@router.get("/profile-summary/{user_id}")
-async def get_profile_summary(user_id: str, db: Session = Depends(get_session)):
-    """Generate a profile summary of user based on their last 20 trades"""
-    try:
-        # Import the Transaction model from trading_models
-        from app.trading_models import Transaction, Portfolio
-        
-        # Get user's portfolio to access transactions
-        portfolio = db.exec(select(Portfolio).where(Portfolio.user_id == user_id)).first()
-        
-        if not portfolio:
-            return {"success": False, "error": "No trading history found for this user"}
-        
-        # Get last 20 transactions
-        transactions = db.exec(
-            select(Transaction)
-            .where(Transaction.portfolio_id == portfolio.id)
-            .order_by(desc(Transaction.timestamp))
-            .limit(20)
-        ).all()
-        
-        if not transactions or len(transactions) == 0:
-            return {"success": False, "error": "No trades found in your history"}
-        
-        # Format transactions for LLM
-        trades_context = []
-        for txn in transactions:
-            trades_context.append({
-                "symbol": txn.symbol,
-                "type": txn.type,
-                "quantity": txn.quantity,
-                "price": txn.price,
-                "timestamp": txn.timestamp.strftime("%Y-%m-%d %H:%M:%S")
-            })
-        
-        # Create prompt for LLM to analyze trading patterns
-        system_prompt = """You are a senior financial analyst and trading psychology expert specializing in behavioral finance. 
+PROFILE_SYSTEM_PROMPT = """You are a senior financial analyst and trading psychology expert specializing in behavioral finance. 
 
 Your task is to analyze a trader's transaction history and create a highly personalized trading profile summary.
 
@@ -1008,31 +1105,111 @@ Example tone: "Based on your recent trading activity, you've been quite active i
 
 Be insightful, specific, and helpful."""
 
-        user_prompt = f"""Analyze this trader's last {len(transactions)} transactions and create their personalized trading profile summary.
+# More new trades than this since the stored summary: regenerate from scratch
+PROFILE_DELTA_LIMIT = 20
+
+def _trades_context(transactions) -> str:
+    return json.dumps([{
+        "symbol": txn.symbol,
+        "type": txn.type,
+        "quantity": txn.quantity,
+        "price": txn.price,
+        "timestamp": txn.timestamp.strftime("%Y-%m-%d %H:%M:%S")
+    } for txn in transactions], indent=2)
+
+@router.get("/profile-summary/{user_id}")
+async def get_profile_summary(user_id: str, db: Session = Depends(get_session)):
+    """Profile summary of the user based on their recent trades.
+
+    Summaries are stored per user with the id of the latest transaction they
+    cover: with no new trades the stored one is returned as is, and a few new
+    trades update it from a delta prompt instead of re-reading the history.
+    """
+    try:
+        # Import the Transaction model from trading_models
+        from app.trading_models import Transaction, Portfolio, ProfileSummary
+        
+        # Get user's portfolio to access transactions
+        portfolio = db.exec(select(Portfolio).where(Portfolio.user_id == user_id)).first()
+        
+        if not portfolio:
+            return {"success": False, "error": "No trading history found for this user"}
+
+        latest_id = db.exec(select(func.max(Transaction.id)).where(Transaction.portfolio_id == portfolio.id)).one()
+        if latest_id is None:
+            return {"success": False, "error": "No trades found in your history"}
+
+        cached = db.exec(select(ProfileSummary).where(ProfileSummary.user_id == user_id)).first()
+        if cached and cached.last_transaction_id == latest_id:
+            return {
+                "success": True,
+                "data": {
+                    "summary": cached.summary,
+                    "trades_analyzed": cached.trades_analyzed,
+                    "cached": True
+                }
+            }
+
+        query = select(Transaction).where(Transaction.portfolio_id == portfolio.id)
+        if cached:
+            query = query.where(Transaction.id > cached.last_transaction_id)
+        # Most recent first; one extra row tells us the delta is too large
+        transactions = db.exec(query.order_by(desc(Transaction.id)).limit(PROFILE_DELTA_LIMIT + 1)).all()
+        is_delta = cached is not None and len(transactions) <= PROFILE_DELTA_LIMIT
+        transactions = transactions[:PROFILE_DELTA_LIMIT]
+
+        if is_delta:
+            user_prompt = f"""Here is the trading profile summary you previously wrote for this trader:
+
+{cached.summary}
+
+They have made {len(transactions)} new trades since then.
+
+NEW TRANSACTION DATA (most recent first):
+{_trades_context(transactions)}
+
+Update the summary to reflect the new trades. Keep what still holds, revise what the new trades change, and mention the new activity specifically. Keep the same structure and tone."""
+            trades_analyzed = cached.trades_analyzed + len(transactions)
+        else:
+            user_prompt = f"""Analyze this trader's last {len(transactions)} transactions and create their personalized trading profile summary.
 
 TRANSACTION DATA (most recent first):
-{json.dumps(trades_context, indent=2)}
+{_trades_context(transactions)}
 
 Remember: Be specific, mention actual stock symbols, reference concrete patterns, and write in friendly paragraph form."""
+            trades_analyzed = len(transactions)
 
         # Call LLM
-        completion = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
+        summary = await cascade.complete(
+            "profile",
             messages=[
-                {"role": "system", "content": system_prompt},
+                {"role": "system", "content": PROFILE_SYSTEM_PROMPT},
                 {"role": "user", "content": user_prompt}
             ],
+            validate=min_length(200),
             max_tokens=800,
             temperature=0.7
         )
-        
-        summary = completion.choices[0].message.content
+
+        try:
+            if not cached:
+                cached = ProfileSummary(user_id=user_id, last_transaction_id=latest_id, trades_analyzed=0, summary="")
+            cached.last_transaction_id = latest_id
+            cached.trades_analyzed = trades_analyzed
+            cached.summary = summary
+            cached.updated_at = datetime.utcnow()
+            db.add(cached)
+            db.commit()
+        except IntegrityError:
+            # A concurrent request stored one first; this summary is equally fresh
+            db.rollback()
         
         return {
             "success": True,
             "data": {
                 "summary": summary,
-                "trades_analyzed": len(transactions)
+                "trades_analyzed": trades_analyzed,
+                "cached": False
             }
         }
         
@@ -1,31 +1,48 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlmodel import Session, select, or_, and_
 from app.db import get_session
-from app.trading_models import Portfolio, Holding, Transaction, AutoTradeRule
-from pydantic import BaseModel
+from app.trading_models import Portfolio, Holding, Transaction, AutoTradeRule, Order
+from app.orderbook import order_books
+from app.risk import portfolio_risk
+from app.similarity import similarity_index
+from app.utils import encode_cursor, decode_cursor
+from app.execution import OrderRejected, ConcurrentUpdateError, run_with_retry, load_holdings, apply_order, prune_holdings
+from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import datetime
 import yfinance as yf
 import requests
-import os
-from groq import Groq
-import json
+from starlette.concurrency import run_in_threadpool
+from app.cascade import cascade, json_list
+from app.jsonstream import parse_json
+import heapq
+from itertools import islice
 
 router = APIRouter()
 
-# Initialize Groq client
-client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
-
 # --- Schemas ---
 class TradeRequest(BaseModel):
     user_id: str
     symbol: str
     type: str # "BUY" or "SELL"
-    quantity: int
-    price: Optional[float] = None # If None, use market price
+    quantity: int = Field(gt=0)
+    price: Optional[float] = None # Limit price; if None, use market price
+    stop_price: Optional[float] = None # Rests as a STOP order until triggered
     stop_loss: Optional[float] = None
     target_price: Optional[float] = None
 
+class BatchOrder(BaseModel):
+    symbol: str
+    type: str # "BUY" or "SELL"
+    quantity: int = Field(gt=0)
+    price: Optional[float] = None # Limit price; if None, use market price
+    stop_price: Optional[float] = None
+
+class BatchTradeRequest(BaseModel):
+    user_id: str
+    orders: List[BatchOrder] = Field(..., min_length=1, max_length=100)
+    all_or_none: bool = False # Roll back the whole batch if any order is rejected
+
 class RuleRequest(BaseModel):
     user_id: str
     symbol: str
@@ -57,6 +74,48 @@ def get_current_price(symbol: str) -> float:
     except:
         return 0.0
 
+def get_price_snapshot(symbols: List[str]) -> dict:
+    """Last prices for several symbols from a single batched download"""
+    prices = {}
+    if not symbols:
+        return prices
+    try:
+        closes = yf.download(symbols, period="5d", progress=False)["Close"]
+        if not hasattr(closes, "columns"):
+            closes = closes.to_frame(symbols[0])
+        last = closes.ffill().iloc[-1]
+        for symbol in symbols:
+            price = last.get(symbol)
+            if price is not None and price == price: # skip NaN
+                prices[symbol] = float(price)
+    except Exception as e:
+        print(f"Batch price error: {e}")
+    # Anything the batch call missed falls back to a single quote
+    for symbol in symbols:
+        if symbol not in prices:
+            prices[symbol] = get_current_price(symbol)
+    return prices
+
+def resting_order(user_id: str, symbol: str, side: str, quantity: int, price: Optional[float], stop_price: Optional[float]) -> Optional[Order]:
+    """Order for the book if the request carries a limit or stop price"""
+    if price is None and stop_price is None:
+        return None
+    if price is not None and stop_price is not None:
+        raise OrderRejected("Stop-limit orders are not supported")
+    if side not in ("BUY", "SELL"):
+        raise OrderRejected(f"Unknown order type {side}")
+    trigger = price if price is not None else stop_price
+    if quantity <= 0 or trigger <= 0:
+        raise OrderRejected("Quantity and price must be positive")
+    return Order(
+        user_id=user_id,
+        symbol=symbol,
+        side=side,
+        order_type="LIMIT" if price is not None else "STOP",
+        price=trigger,
+        quantity=quantity
+    )
+
 @router.get("/search")
 def search_symbols(query: str):
     try:
@@ -130,120 +189,268 @@ def get_portfolio(user_id: str, db: Session = Depends(get_session)):
 def place_trade(req: TradeRequest, db: Session = Depends(get_session)):
     portfolio = get_or_create_portfolio(req.user_id, db)
     
-    price = req.price
-    # If price is provided for BUY, it's a LIMIT order -> Create Rule
-    if req.type == "BUY" and price is not None:
-        rule = AutoTradeRule(
-            user_id=req.user_id,
-            symbol=req.symbol,
-            condition=f"price < {price}",
-            action="BUY",
-            quantity=req.quantity
-        )
-        db.add(rule)
+    # A limit or stop price makes it a resting order for the order book
+    try:
+        order = resting_order(req.user_id, req.symbol, req.type, req.quantity, req.price, req.stop_price)
+    except OrderRejected as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if order:
+        db.add(order)
         db.commit()
-        return {"success": True, "message": f"Buy Limit order placed for {req.symbol} at {price}"}
-
-    # Market Order (or Sell Market)
-    if not price:
-        price = get_current_price(req.symbol)
-        if price == 0:
-            raise HTTPException(status_code=400, detail="Could not fetch market price")
-            
-    cost = price * req.quantity
-    
-    if req.type == "BUY":
-        if portfolio.balance < cost:
-            raise HTTPException(status_code=400, detail="Insufficient funds")
-        
-        portfolio.balance -= cost
-        
-        # Update or create holding
-        holding = db.exec(select(Holding).where(Holding.portfolio_id == portfolio.id, Holding.symbol == req.symbol)).first()
-        if holding:
-            # Avg price calculation
-            total_cost = (holding.quantity * holding.average_price) + cost
-            total_qty = holding.quantity + req.quantity
-            holding.average_price = total_cost / total_qty
-            holding.quantity = total_qty
-        else:
-            holding = Holding(portfolio_id=portfolio.id, symbol=req.symbol, quantity=req.quantity, average_price=price)
-            db.add(holding)
-            
-    elif req.type == "SELL":
-        holding = db.exec(select(Holding).where(Holding.portfolio_id == portfolio.id, Holding.symbol == req.symbol)).first()
-        if not holding or holding.quantity < req.quantity:
-            raise HTTPException(status_code=400, detail="Insufficient holdings")
-            
-        portfolio.balance += cost
-        holding.quantity -= req.quantity
-        if holding.quantity == 0:
-            db.delete(holding)
-            
-    # Record transaction
-    txn = Transaction(
-        portfolio_id=portfolio.id,
-        symbol=req.symbol,
-        type=req.type,
-        quantity=req.quantity,
-        price=price
-    )
-    db.add(txn)
-    db.add(portfolio)
-    db.commit()
+        order_books.add(order)
+        return {"success": True, "order_id": order.id, "message": f"{req.type} {order.order_type.title()} order placed for {req.symbol} at {order.price}"}
+
+    # Market Order
+    price = get_current_price(req.symbol)
+    if price == 0:
+        raise HTTPException(status_code=400, detail="Could not fetch market price")
+
+    def work():
+        holdings = load_holdings(db, portfolio, [req.symbol])
+        apply_order(db, portfolio, holdings, req.symbol, req.type, req.quantity, price)
+        prune_holdings(db, holdings)
+
+    try:
+        run_with_retry(db, work)
+    except OrderRejected as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ConcurrentUpdateError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     
     return {"success": True, "message": f"{req.type} order executed for {req.symbol} at {price}"}
 
+@router.post("/paper/trade/batch")
+def place_trades_batch(req: BatchTradeRequest, db: Session = Depends(get_session)):
+    """Execute many orders against one price snapshot with a single commit.
+
+    Orders are applied in request order, so cash and holdings are validated
+    cumulatively (a SELL can fund a later BUY in the same batch).
+    """
+    portfolio = get_or_create_portfolio(req.user_id, db)
+
+    # One quote snapshot for every order that executes at market
+    market_symbols = sorted({
+        o.symbol for o in req.orders
+        if o.price is None and o.stop_price is None
+    })
+    snapshot = get_price_snapshot(market_symbols)
+
+    results = []
+    resting = []
+
+    def work():
+        holdings = load_holdings(db, portfolio)
+        results.clear()
+        resting.clear()
+        for order in req.orders:
+            result = {"symbol": order.symbol, "type": order.type, "quantity": order.quantity}
+            try:
+                book_order = resting_order(req.user_id, order.symbol, order.type, order.quantity, order.price, order.stop_price)
+            except OrderRejected as e:
+                result.update(success=False, error=str(e))
+                results.append(result)
+                continue
+            if book_order:
+                db.add(book_order)
+                resting.append(book_order)
+                result.update(success=True, status="PENDING", price=book_order.price)
+                results.append(result)
+                continue
+
+            price = snapshot.get(order.symbol, 0.0)
+            if not price:
+                result.update(success=False, error="Could not fetch market price")
+            else:
+                try:
+                    apply_order(db, portfolio, holdings, order.symbol, order.type, order.quantity, price)
+                    result.update(success=True, status="EXECUTED", price=price)
+                except OrderRejected as e:
+                    result.update(success=False, error=str(e))
+            results.append(result)
+
+        if req.all_or_none and any(not r["success"] for r in results):
+            raise OrderRejected("Batch rejected")
+        prune_holdings(db, holdings)
+
+    try:
+        run_with_retry(db, work)
+    except OrderRejected:
+        # Nothing was committed: orders that went through are undone with the rest
+        for r in results:
+            if r["success"]:
+                r.pop("price", None)
+                r.update(success=False, status="ROLLED_BACK", error="Rolled back with the rest of the batch")
+        return {"success": False, "executed": 0, "balance": None, "results": results}
+    except ConcurrentUpdateError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    for book_order in resting:
+        order_books.add(book_order)
+
+    failed = [r for r in results if not r["success"]]
+    return {
+        "success": not failed,
+        "executed": len(results) - len(failed),
+        "balance": portfolio.balance,
+        "results": results
+    }
+
+# Keyset pagination for /paper/history. Rows are ordered by
+# (timestamp, rank, id) descending; rank breaks ties between the streams.
+HISTORY_PAGE_SIZE = 50
+HISTORY_RANK_TXN = 0
+HISTORY_RANK_RULE = 1
+HISTORY_RANK_ORDER = 2
+
+def _keyset_before(ts_col, id_col, rank: int, cursor: list):
+    """WHERE clause selecting rows of one stream that sort after the cursor"""
+    c_ts, c_rank, c_id = cursor
+    if rank < c_rank:
+        return ts_col <= c_ts
+    if rank > c_rank:
+        return ts_col < c_ts
+    return or_(ts_col < c_ts, and_(ts_col == c_ts, id_col < c_id))
+
+def _rule_target_price(condition: str) -> float:
+    # Extract price from condition if possible
+    try:
+        parts = condition.split()
+        if len(parts) >= 3:
+            return float(parts[2])
+    except:
+        pass
+    return 0.0
+
 @router.get("/paper/history/{user_id}")
-def get_history(user_id: str, db: Session = Depends(get_session)):
+def get_history(
+    user_id: str,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_session),
+):
+    """Executed and pending items, newest first.
+
+    With limit or cursor, returns one page (limit defaults to
+    HISTORY_PAGE_SIZE) and the cursor for the next page in the X-Next-Cursor
+    header, so the body stays a plain list. Without either, returns the whole
+    history, as clients that predate pagination expect.
+    """
     portfolio = get_or_create_portfolio(user_id, db)
-    
-    # 1. Executed Transactions
-    txns = db.exec(select(Transaction).where(Transaction.portfolio_id == portfolio.id).order_by(Transaction.timestamp.desc())).all()
-    
-    # 2. Pending Rules
-    rules = db.exec(select(AutoTradeRule).where(AutoTradeRule.user_id == user_id, AutoTradeRule.active == True)).all()
-    
-    history = []
-    
-    # Add Pending Rules
-    for r in rules:
-        # Extract price from condition if possible
-        target_price = 0.0
+    paginated = limit is not None or cursor is not None
+    limit = limit or HISTORY_PAGE_SIZE
+    fetch = limit + 1 if paginated else None # None: no LIMIT
+
+    after = None
+    if cursor:
         try:
-            parts = r.condition.split()
-            if len(parts) >= 3:
-                target_price = float(parts[2])
-        except:
-            pass
-            
-        history.append({
-            "id": f"rule-{r.id}",
-            "symbol": r.symbol,
-            "type": r.action,
-            "quantity": r.quantity,
-            "price": target_price,
-            "timestamp": r.created_at,
-            "status": "PENDING"
-        })
-        
-    # Add Executed Transactions
-    for t in txns:
-        history.append({
-            "id": f"txn-{t.id}",
-            "symbol": t.symbol,
-            "type": t.type,
-            "quantity": t.quantity,
-            "price": t.price,
-            "timestamp": t.timestamp,
-            "status": "EXECUTED"
-        })
-        
-    # Sort by timestamp desc
-    history.sort(key=lambda x: x["timestamp"], reverse=True)
-    
+            after = decode_cursor(cursor)
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # 1. Executed Transactions (served by ix_transaction_portfolio_timestamp)
+    txn_q = select(Transaction).where(Transaction.portfolio_id == portfolio.id)
+    if after:
+        txn_q = txn_q.where(_keyset_before(Transaction.timestamp, Transaction.id, HISTORY_RANK_TXN, after))
+    txns = db.exec(txn_q.order_by(Transaction.timestamp.desc(), Transaction.id.desc()).limit(fetch)).all()
+
+    # 2. Pending Rules (served by ix_autotraderule_user_active_created)
+    rule_q = select(AutoTradeRule).where(AutoTradeRule.user_id == user_id, AutoTradeRule.active == True)
+    if after:
+        rule_q = rule_q.where(_keyset_before(AutoTradeRule.created_at, AutoTradeRule.id, HISTORY_RANK_RULE, after))
+    rules = db.exec(rule_q.order_by(AutoTradeRule.created_at.desc(), AutoTradeRule.id.desc()).limit(fetch)).all()
+
+    # 3. Open limit/stop orders (served by ix_trade_order_user_active_created)
+    order_q = select(Order).where(Order.user_id == user_id, Order.active == True)
+    if after:
+        order_q = order_q.where(_keyset_before(Order.created_at, Order.id, HISTORY_RANK_ORDER, after))
+    orders = db.exec(order_q.order_by(Order.created_at.desc(), Order.id.desc()).limit(fetch)).all()
+
+    # 4. Merge the sorted streams and keep one page
+    merged = heapq.merge(
+        ((t.timestamp, HISTORY_RANK_TXN, t.id, t) for t in txns),
+        ((r.created_at, HISTORY_RANK_RULE, r.id, r) for r in rules),
+        ((o.created_at, HISTORY_RANK_ORDER, o.id, o) for o in orders),
+        key=lambda row: row[:3],
+        reverse=True,
+    )
+    page = list(islice(merged, fetch))
+    if paginated and len(page) > limit:
+        page = page[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(*page[-1][:3])
+
+    history = []
+    for _, rank, _, item in page:
+        if rank == HISTORY_RANK_ORDER:
+            history.append({
+                "id": f"order-{item.id}",
+                "symbol": item.symbol,
+                "type": item.side,
+                "order_type": item.order_type,
+                "quantity": item.quantity - item.filled_quantity,
+                "price": item.price,
+                "timestamp": item.created_at,
+                "status": "PENDING"
+            })
+        elif rank == HISTORY_RANK_RULE:
+            history.append({
+                "id": f"rule-{item.id}",
+                "symbol": item.symbol,
+                "type": item.action,
+                "quantity": item.quantity,
+                "price": _rule_target_price(item.condition),
+                "timestamp": item.created_at,
+                "status": "PENDING"
+            })
+        else:
+            history.append({
+                "id": f"txn-{item.id}",
+                "symbol": item.symbol,
+                "type": item.type,
+                "quantity": item.quantity,
+                "price": item.price,
+                "timestamp": item.timestamp,
+                "status": "EXECUTED"
+            })
+
     return history
 
+# --- Resting Orders ---
+
+@router.get("/paper/orders/{user_id}")
+def get_open_orders(user_id: str, db: Session = Depends(get_session)):
+    orders = db.exec(
+        select(Order)
+        .where(Order.user_id == user_id, Order.active == True)
+        .order_by(Order.created_at.desc())
+    ).all()
+    return orders
+
+@router.delete("/paper/orders/{order_id}")
+def cancel_order(order_id: int, db: Session = Depends(get_session)):
+    order = db.get(Order, order_id)
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+
+    def work():
+        db.refresh(order)
+        if not order.active:
+            return False
+        order.active = False
+        order.status = "CANCELLED"
+        order.updated_at = datetime.utcnow()
+        db.add(order)
+        return True
+
+    try:
+        cancelled = run_with_retry(db, work)
+    except ConcurrentUpdateError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not cancelled:
+        raise HTTPException(status_code=400, detail=f"Order is already {order.status.lower()}")
+    order_books.cancel(order.symbol, order.id)
+    return {"success": True, "filled_quantity": order.filled_quantity}
+
 # --- Auto Trade Rules ---
 
 @router.post("/auto-trade/rules")
@@ -273,10 +480,74 @@ def delete_rule(rule_id: int, db: Session = Depends(get_session)):
     db.commit()
     return {"success": True}
 
+# --- Risk Analytics ---
+
+@router.get("/risk/{user_id}")
+def get_portfolio_risk(
+    user_id: str,
+    lookback: int = Query(252, ge=20, le=1000),
+    confidence: float = Query(0.95, gt=0.5, lt=1.0),
+    db: Session = Depends(get_session),
+):
+    """Historical/parametric VaR, volatility, beta vs SPY and NIFTY, and the
+    holdings correlation matrix from stored daily bars"""
+    return portfolio_risk(db, user_id, lookback, confidence)
+
+# --- Similar Stocks & Diversification ---
+
+@router.get("/similar/{symbol}")
+async def get_similar_stocks(symbol: str, limit: int = Query(5, ge=1, le=20), cheaper: bool = False):
+    """Most correlated stocks from the similarity index, optionally with a lower P/E"""
+    result = await run_in_threadpool(similarity_index.similar, symbol, limit, cheaper)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"Not enough price history for {symbol.upper()}")
+    return {"success": True, "data": result}
+
+@router.get("/diversify")
+async def get_diversifiers(symbols: str = Query(..., description="Comma-separated symbols"), limit: int = Query(5, ge=1, le=20)):
+    """Stocks least correlated with an equal-weighted basket of symbols"""
+    weights = {s.strip().upper(): 1.0 for s in symbols.split(",") if s.strip()}
+    result = await run_in_threadpool(similarity_index.diversify, weights, limit)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Not enough price history for these symbols")
+    return {"success": True, "data": result}
+
+@router.get("/diversify/{user_id}")
+async def get_portfolio_diversifiers(user_id: str, limit: int = Query(5, ge=1, le=20), db: Session = Depends(get_session)):
+    """Stocks least correlated with a user's holdings, weighted by position value"""
+    portfolio = get_or_create_portfolio(user_id, db)
+    holdings = db.exec(select(Holding).where(Holding.portfolio_id == portfolio.id)).all()
+    if not holdings:
+        raise HTTPException(status_code=404, detail="Portfolio has no holdings")
+    weights = await holding_values(holdings)
+    result = await run_in_threadpool(similarity_index.diversify, weights, limit)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Not enough price history for these holdings")
+    return {"success": True, "data": result}
+
+async def holding_values(holdings: List[Holding]) -> dict:
+    """{symbol: market value} of holdings"""
+    # Quotes are blocking HTTP calls; keep them off the event loop
+    prices = await run_in_threadpool(get_price_snapshot, sorted({h.symbol for h in holdings}))
+    return {h.symbol: h.quantity * prices.get(h.symbol, 0.0) for h in holdings}
+
+def diversification_context(weights: dict) -> str:
+    """Correlation facts and diversifying candidates for the rebalancing prompt"""
+    lines = []
+    for a, b, corr in similarity_index.crowded_pairs(list(weights)):
+        lines.append(f"- {a} and {b} are highly correlated ({corr:.2f}); they offer little diversification together")
+    result = similarity_index.diversify(weights, limit=5)
+    if result:
+        lines.append("Least correlated candidates with this portfolio (1-year/3-month blended correlation):")
+        for c in result["candidates"]:
+            pe = f", P/E {c['pe']}" if c["pe"] else ""
+            lines.append(f"- {c['symbol']} ({c['sector'] or 'other'}): correlation {c['correlation']:.2f}, volatility {c['volatility']:.0%}{pe}")
+    return "\n".join(lines)
+
 # --- AI Rebalancing ---
 
 @router.get("/rebalance/{user_id}")
-def get_rebalancing_suggestions(user_id: str, db: Session = Depends(get_session)):
+async def get_rebalancing_suggestions(user_id: str, db: Session = Depends(get_session)):
     portfolio = get_or_create_portfolio(user_id, db)
     holdings = db.exec(select(Holding).where(Holding.portfolio_id == portfolio.id)).all()
     
@@ -284,15 +555,15 @@ def get_rebalancing_suggestions(user_id: str, db: Session = Depends(get_session)
         return []
         
     # Prepare portfolio data for LLM
+    weights = await holding_values(holdings)
     portfolio_text = "Current Portfolio:\n"
-    total_value = 0
     for h in holdings:
-        current_price = get_current_price(h.symbol)
-        value = h.quantity * current_price
-        total_value += value
-        portfolio_text += f"- {h.symbol}: {h.quantity} shares, Value: ₹{value:.2f}\n"
-        
-    portfolio_text += f"Total Portfolio Value: ₹{total_value:.2f}\n"
+        portfolio_text += f"- {h.symbol}: {h.quantity} shares, Value: ₹{weights[h.symbol]:.2f}\n"
+    portfolio_text += f"Total Portfolio Value: ₹{sum(weights.values()):.2f}\n"
+
+    context = await run_in_threadpool(diversification_context, weights)
+    if context:
+        portfolio_text += f"\nCorrelation data (prefer these candidates for 'to'):\n{context}\n"
     
     prompt = f"""
     You are a financial advisor. Analyze the following portfolio and provide 3 specific rebalancing suggestions to improve diversification and reduce risk.
@@ -311,7 +582,8 @@ def get_rebalancing_suggestions(user_id: str, db: Session = Depends(get_session)
     """
     
     try:
-        chat_completion = client.chat.completions.create(
+        response_content = await cascade.complete(
+            "rebalance",
             messages=[
                 {
                     "role": "system",
@@ -322,14 +594,14 @@ def get_rebalancing_suggestions(user_id: str, db: Session = Depends(get_session)
                     "content": prompt,
                 }
             ],
-            model="llama3-8b-8192",
+            validate=json_list,
             temperature=0.7,
         )
         
-        response_content = chat_completion.choices[0].message.content
-        # Clean up potential markdown code blocks if present
-        response_content = response_content.replace("```json", "").replace("```", "").strip()
-        suggestions = json.loads(response_content)
+        # Tolerates markdown code blocks and text around the JSON
+        suggestions = parse_json(response_content)
+        if suggestions is None:
+            raise ValueError("No JSON in response")
         return suggestions
     except Exception as e:
         print(f"Error generating suggestions: {e}")
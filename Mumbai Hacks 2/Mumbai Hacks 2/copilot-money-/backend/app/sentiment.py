@@ -0,0 +1,132 @@
+"""Local financial-lexicon sentiment scoring for news headlines.
+
+Texts are scored in a batch: tokens are looked up once in a weighted lexicon
+(in the spirit of Loughran-McDonald, with intensities), negators flip the
+next two tokens, and per-text sums are reduced with NumPy. The score is
+normalized to [-1, 1] and mapped to Positive/Negative/Neutral, so the same
+headline always gets the same label, unlike asking the LLM.
+"""
+from itertools import repeat
+from typing import Dict, Iterable, List, Tuple
+import numpy as np
+
+POSITIVE_THRESHOLD = 0.15
+NEGATIVE_THRESHOLD = -0.15
+_NORMALIZE_ALPHA = 4.0
+
+_POSITIVE = {
+    3.0: ["soar", "skyrocket", "blowout", "boom"],
+    2.0: ["surge", "rally", "jump", "beat", "outperform", "upgrade", "breakthrough", "bullish", "profit",
+          "strong", "record", "exceed", "growth", "expand", "win", "approve", "approval", "optimism", "upbeat"],
+    1.0: ["gain", "rise", "climb", "advance", "improve", "positive", "boost", "recover", "rebound", "buy",
+          "dividend", "buyback", "partnership", "launch", "innovation", "demand", "higher", "up", "success",
+          "robust", "solid", "favorable", "opportunity", "confident", "steady", "stable", "upside", "momentum"],
+}
+_NEGATIVE = {
+    3.0: ["crash", "plunge", "collapse", "bankruptcy", "bankrupt", "fraud", "default", "meltdown"],
+    2.0: ["tumble", "slump", "sink", "miss", "downgrade", "loss", "lawsuit", "probe", "investigation",
+          "recall", "layoff", "bearish", "warn", "warning", "scandal", "fined", "penalty", "recession", "crisis"],
+    1.0: ["fall", "drop", "decline", "slide", "dip", "weak", "lower", "down", "cut", "concern", "risk",
+          "volatile", "volatility", "uncertain", "uncertainty", "fear", "pressure", "sell", "selloff", "sell-off",
+          "inflation", "delay", "slowdown", "slow", "negative", "struggle", "debt", "headwind", "downside"],
+}
+NEGATORS = {"not", "no", "never", "without", "isn't", "wasn't", "aren't", "don't", "doesn't", "didn't", "won't", "fails", "failed"}
+
+def _forms(word: str) -> List[str]:
+    forms = [word, word + "s", word + "es", word + "ed", word + "d", word + "ing"]
+    if word.endswith("e"):
+        forms.append(word[:-1] + "ing")
+    if word.endswith("y"):
+        forms += [word[:-1] + "ied", word[:-1] + "ies"]
+    if len(word) > 2 and word[-1] not in "aeiouwxy" and word[-2] in "aeiou" and word[-3] not in "aeiou":
+        # Doubled consonant: drop -> dropped, slip -> slipping
+        forms += [word + word[-1] + "ed", word + word[-1] + "ing"]
+    return forms
+
+def _build_lexicon() -> Dict[str, float]:
+    lexicon = {}
+    for sign, groups in ((1.0, _POSITIVE), (-1.0, _NEGATIVE)):
+        for weight, words in groups.items():
+            for word in words:
+                for form in _forms(word):
+                    lexicon.setdefault(form, sign * weight)
+    return lexicon
+
+LEXICON = _build_lexicon()
+# Multi-word phrases are joined with "_" before tokenizing
+PHRASES = {
+    "record high": 3.0, "all-time high": 3.0, "all time high": 3.0, "all-time low": -3.0,
+    "all time low": -3.0, "profit warning": -2.0, "price cut": -1.0,
+}
+LEXICON.update({p.replace(" ", "_"): w for p, w in PHRASES.items()})
+
+# Every token maps to a row of these tables (row 0: unknown word), so one
+# dict lookup per token gives its weight, whether it negates, and whether it
+# separates two texts
+_SEPARATOR = "\x01"
+_ROWS = {w: i + 1 for i, w in enumerate(sorted(set(LEXICON) | NEGATORS | {_SEPARATOR}))}
+_WEIGHT = np.zeros(len(_ROWS) + 1)
+_NEGATES = np.zeros(len(_ROWS) + 1, dtype=bool)
+_BOUNDARY = np.zeros(len(_ROWS) + 1, dtype=bool)
+for _word, _row in _ROWS.items():
+    _WEIGHT[_row] = LEXICON.get(_word, 0.0)
+    _NEGATES[_row] = _word in NEGATORS
+    _BOUNDARY[_row] = _word == _SEPARATOR
+
+# Lowercase letters and in-word punctuation survive; everything else splits
+_KEEP = set("abcdefghijklmnopqrstuvwxyz'-_" + _SEPARATOR)
+_TRANSLATE = {c: (chr(c) if chr(c) in _KEEP else " ") for c in range(128)}
+# Typographic quotes, common in feed headlines: "don’t" must match "don't"
+_TRANSLATE.update({0x2018: "'", 0x2019: "'", 0x201C: " ", 0x201D: " "})
+
+def score_texts(texts: Iterable[str]) -> np.ndarray:
+    """Sentiment score in [-1, 1] for each text"""
+    texts = [t.replace(_SEPARATOR, " ") if t else "" for t in texts]
+    if not texts:
+        return np.zeros(0)
+    # The whole batch is tokenized as one string, in C
+    joined = f" {_SEPARATOR} ".join(texts).lower()
+    for phrase in PHRASES:
+        if phrase in joined:
+            joined = joined.replace(phrase, phrase.replace(" ", "_"))
+    tokens = joined.translate(_TRANSLATE).split()
+
+    rows = np.fromiter(map(_ROWS.get, tokens, repeat(0)), dtype=np.int32, count=len(tokens))
+    weights = _WEIGHT[rows]
+    negator = _NEGATES[rows]
+    doc_ids = np.cumsum(_BOUNDARY[rows])
+
+    # A negator flips the polarity of the next two tokens of the same text
+    flip = np.zeros(len(tokens), dtype=bool)
+    for shift in (1, 2):
+        flip[shift:] |= negator[:-shift] & (doc_ids[shift:] == doc_ids[:-shift])
+    weights = np.where(flip, -weights, weights)
+
+    totals = np.bincount(doc_ids, weights=weights, minlength=len(texts))
+    return totals / np.sqrt(totals * totals + _NORMALIZE_ALPHA)
+
+def label(score: float) -> str:
+    if score >= POSITIVE_THRESHOLD:
+        return "Positive"
+    if score <= NEGATIVE_THRESHOLD:
+        return "Negative"
+    return "Neutral"
+
+def classify(texts: Iterable[str]) -> List[Tuple[str, float]]:
+    return [(label(s), round(float(s), 4)) for s in score_texts(texts)]
+
+def annotate_news(items: List[dict], lowercase: bool = False) -> List[dict]:
+    """Set each item's sentiment from the lexicon scorer (title + summary).
+
+    The model's own label is kept as llm_sentiment; items are updated in
+    place and returned.
+    """
+    items = [item for item in items if isinstance(item, dict)]
+    if not items:
+        return items
+    texts = [f"{item.get('title') or ''}. {item.get('summary') or ''}" for item in items]
+    for item, (name, score) in zip(items, classify(texts)):
+        item.setdefault("llm_sentiment", item.get("sentiment"))
+        item["sentiment"] = name.lower() if lowercase else name
+        item["sentiment_score"] = score
+    return items
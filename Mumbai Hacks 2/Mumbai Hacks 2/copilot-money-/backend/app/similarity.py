@@ -0,0 +1,241 @@
+"""Correlation and nearest-neighbour index over daily returns.
+
+The index covers a configurable universe (SIMILARITY_UNIVERSE, defaulting to
+the ranking universe) and is built from the local bar store: a one-year
+correlation matrix, a recent (three-month) one to catch regime changes, and
+each symbol's nearest neighbours by the blend of the two. A background task
+rebuilds it nightly; in between, "similar to" and "diversify away from"
+queries are lookups and small vector products. Symbols outside the universe
+are correlated against it on demand.
+"""
+import os
+import asyncio
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional
+import numpy as np
+from sqlmodel import Session, select
+from starlette.concurrency import run_in_threadpool
+from app.db import engine
+from app.bars import refresh_bars, returns_matrix, load_closes, latest_bar_date
+from app.trading_models import Fundamentals
+from app.ranking import UNIVERSE as RANKING_UNIVERSE
+
+UNIVERSE = [s.strip().upper() for s in os.getenv("SIMILARITY_UNIVERSE", "").split(",") if s.strip()] or list(RANKING_UNIVERSE)
+REFRESH_SECONDS = float(os.getenv("SIMILARITY_REFRESH_SECONDS", str(24 * 3600)))
+LOOKBACK = 252
+RECENT = 63
+MIN_HISTORY = 0.8 # share of LOOKBACK a symbol needs to be indexed
+NEIGHBOURS = 20
+RECENT_WEIGHT = 0.3 # weight of the recent window in the similarity blend
+MIN_SIMILARITY = 0.3 # blended correlation below this isn't "similar"
+TRADING_DAYS = 252
+
+def _correlation(returns: np.ndarray) -> np.ndarray:
+    """Column correlation matrix; constant columns correlate 0 with everything"""
+    centered = returns - returns.mean(axis=0)
+    norms = np.linalg.norm(centered, axis=0)
+    norms[norms == 0] = np.inf
+    unit = centered / norms
+    return unit.T @ unit
+
+@dataclass
+class CorrelationIndex:
+    symbols: List[str]
+    position: Dict[str, int]
+    corr: np.ndarray # (n, n), LOOKBACK days
+    recent: np.ndarray # (n, n), RECENT days
+    blend: np.ndarray
+    neighbours: np.ndarray # (n, NEIGHBOURS) column indices, most similar first
+    volatility: np.ndarray # annualized
+    prices: np.ndarray # last close
+    pe: np.ndarray # trailing P/E, NaN if unknown
+    as_of: Optional[str]
+    built_at: datetime
+
+def build_index(session: Session, symbols: List[str]) -> Optional[CorrelationIndex]:
+    # Short histories would trim every column to their length
+    counts = load_closes(session, symbols, LOOKBACK).count()
+    eligible = [s for s in symbols if counts.get(s, 0) >= LOOKBACK * MIN_HISTORY]
+    if len(eligible) < 3:
+        return None
+    columns, returns = returns_matrix(session, eligible, LOOKBACK)
+    if returns.shape[0] < RECENT:
+        return None
+
+    corr = _correlation(returns)
+    recent = _correlation(returns[-RECENT:])
+    blend = (1 - RECENT_WEIGHT) * corr + RECENT_WEIGHT * recent
+    ranked = np.argsort(-blend, axis=1)
+    # Drop each row's own column (always first, correlation 1)
+    neighbours = np.array([row[row != i][:NEIGHBOURS] for i, row in enumerate(ranked)])
+
+    closes = load_closes(session, columns, 10).ffill()
+    pe = {f.symbol: f.trailing_pe for f in session.exec(select(Fundamentals).where(Fundamentals.symbol.in_(columns))).all()}
+    as_of = latest_bar_date(session, columns)
+    return CorrelationIndex(
+        symbols=columns,
+        position={s: i for i, s in enumerate(columns)},
+        corr=corr,
+        recent=recent,
+        blend=blend,
+        neighbours=neighbours,
+        volatility=returns.std(axis=0, ddof=1) * np.sqrt(TRADING_DAYS),
+        prices=np.array([float(closes[s].iloc[-1]) for s in columns]),
+        pe=np.array([pe[s] if pe.get(s) and pe[s] > 0 else np.nan for s in columns]),
+        as_of=as_of.isoformat() if as_of else None,
+        built_at=datetime.utcnow(),
+    )
+
+class SimilarityIndex:
+    def __init__(self, symbols: List[str] = UNIVERSE, interval: float = REFRESH_SECONDS):
+        self.symbols = symbols
+        self.interval = interval
+        self.index: Optional[CorrelationIndex] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            print("✅ Similarity index refresher started")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await run_in_threadpool(self.rebuild, True)
+            except Exception as e:
+                print(f"⚠️ Similarity index build failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def rebuild(self, download: bool = False):
+        """Build a new index (blocking); the previous one is served until it's ready"""
+        with Session(engine) as session:
+            if download:
+                refresh_bars(session, self.symbols)
+            index = build_index(session, self.symbols)
+        if index is not None:
+            self.index = index
+            print(f"📈 Similarity index built: {len(index.symbols)} symbols as of {index.as_of}")
+
+    def current(self) -> Optional[CorrelationIndex]:
+        """The latest index, building the first one from stored bars if none exists yet"""
+        if self.index is None:
+            with self._lock:
+                if self.index is None:
+                    self.rebuild()
+        return self.index
+
+    def _vectors(self, index: CorrelationIndex, symbol: str) -> Optional[np.ndarray]:
+        """Blended correlation of symbol with every indexed symbol"""
+        if symbol in index.position:
+            return index.blend[index.position[symbol]]
+        with Session(engine) as session:
+            refresh_bars(session, [symbol])
+            columns, returns = returns_matrix(session, index.symbols + [symbol], LOOKBACK)
+        if symbol not in columns or returns.shape[0] < RECENT:
+            return None
+        target = columns.index(symbol)
+        positions = [index.position[s] for s in columns if s in index.position]
+        long, short = _correlation(returns)[target], _correlation(returns[-RECENT:])[target]
+        vector = np.zeros(len(index.symbols))
+        others = [i for i, s in enumerate(columns) if s != symbol]
+        vector[positions] = (1 - RECENT_WEIGHT) * long[others] + RECENT_WEIGHT * short[others]
+        return vector
+
+    def _item(self, index: CorrelationIndex, i: int, score: float) -> dict:
+        pe = index.pe[i]
+        return {
+            "symbol": index.symbols[i],
+            "sector": RANKING_UNIVERSE.get(index.symbols[i], (None,))[0],
+            "correlation": round(float(score), 4),
+            "volatility": round(float(index.volatility[i]), 4),
+            "price": round(float(index.prices[i]), 2),
+            "pe": round(float(pe), 2) if np.isfinite(pe) else None,
+        }
+
+    def _valuation(self, index: CorrelationIndex, symbol: str) -> tuple:
+        """(P/E, last close) of symbol; NaN where unknown"""
+        if symbol in index.position:
+            i = index.position[symbol]
+            return index.pe[i], index.prices[i]
+        with Session(engine) as session:
+            closes = load_closes(session, [symbol], 10).ffill()
+            f = session.exec(select(Fundamentals).where(Fundamentals.symbol == symbol)).first()
+        price = float(closes[symbol].iloc[-1]) if symbol in closes and len(closes) else np.nan
+        pe = f.trailing_pe if f and f.trailing_pe and f.trailing_pe > 0 else np.nan
+        return pe, price
+
+    def similar(self, symbol: str, limit: int = 5, cheaper: bool = False) -> Optional[dict]:
+        """Symbols whose blended correlation with symbol is at least
+        MIN_SIMILARITY, most correlated first; cheaper keeps those with a lower
+        P/E (or, if symbol has none, a lower share price)"""
+        index = self.current()
+        if index is None:
+            return None
+        symbol = symbol.upper()
+        vector = self._vectors(index, symbol)
+        if vector is None:
+            return None
+        anchor = index.position.get(symbol)
+        if anchor is not None and not cheaper:
+            candidates = index.neighbours[anchor]
+        else:
+            candidates = [i for i in np.argsort(-vector) if i != anchor]
+        candidates = [i for i in candidates if vector[i] >= MIN_SIMILARITY]
+        if cheaper:
+            pe, price = self._valuation(index, symbol)
+            if np.isfinite(pe):
+                candidates = [i for i in candidates if index.pe[i] < pe] # NaN compares False
+            else:
+                candidates = [i for i in candidates if index.prices[i] < price]
+        items = [self._item(index, i, vector[i]) for i in list(candidates)[:limit]]
+        return {"symbol": symbol, "as_of": index.as_of, "similar": items}
+
+    def diversify(self, weights: Dict[str, float], limit: int = 5) -> Optional[dict]:
+        """Symbols least correlated with a position-weighted basket"""
+        index = self.current()
+        if index is None or not weights:
+            return None
+        total = sum(weights.values())
+        if total <= 0: # No prices: weight equally
+            weights, total = {s: 1.0 for s in weights}, float(len(weights))
+        exposure = np.zeros(len(index.symbols))
+        covered = []
+        for symbol, weight in weights.items():
+            vector = self._vectors(index, symbol.upper())
+            if vector is not None:
+                exposure += weight / total * vector
+                covered.append(symbol.upper())
+        if not covered:
+            return None
+        candidates = [i for i in np.argsort(exposure) if index.symbols[i] not in covered]
+        return {
+            "symbols": covered,
+            "as_of": index.as_of,
+            "candidates": [self._item(index, i, exposure[i]) for i in candidates[:limit]],
+        }
+
+    def crowded_pairs(self, symbols: List[str], threshold: float = 0.7) -> List[tuple]:
+        """Pairs of indexed symbols whose blended correlation is at least threshold"""
+        index = self.current()
+        if index is None:
+            return []
+        held = [s for s in symbols if s in index.position]
+        return [
+            (a, b, round(float(index.blend[index.position[a], index.position[b]]), 2))
+            for n, a in enumerate(held) for b in held[n + 1:]
+            if index.blend[index.position[a], index.position[b]] >= threshold
+        ]
+
+similarity_index = SimilarityIndex()
@@ -1,6 +1,8 @@
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import Index
+from sqlalchemy.orm import declared_attr
 from typing import Optional, List
-from datetime import datetime
+from datetime import datetime, date as date_type
 import uuid
 
 class Portfolio(SQLModel, table=True):
@@ -9,20 +11,40 @@ class Portfolio(SQLModel, table=True):
     balance: float = Field(default=100000.0)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
+    # Optimistic-concurrency counter: every UPDATE is conditional on it, so a
+    # concurrent write from another worker raises StaleDataError on commit
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
+
+    @declared_attr
+    def __mapper_args__(cls):
+        return {"version_id_col": cls.__table__.c.version}
     
     holdings: List["Holding"] = Relationship(back_populates="portfolio")
     transactions: List["Transaction"] = Relationship(back_populates="portfolio")
 
 class Holding(SQLModel, table=True):
+    __table_args__ = (
+        # Two workers opening the same position race on this instead of
+        # creating duplicate rows
+        Index("ux_holding_portfolio_symbol", "portfolio_id", "symbol", unique=True),
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
     portfolio_id: int = Field(foreign_key="portfolio.id")
     symbol: str = Field(index=True)
     quantity: int
     average_price: float
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
+
+    @declared_attr
+    def __mapper_args__(cls):
+        return {"version_id_col": cls.__table__.c.version}
     
     portfolio: Optional[Portfolio] = Relationship(back_populates="holdings")
 
 class Transaction(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_transaction_portfolio_timestamp", "portfolio_id", "timestamp"),
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
     portfolio_id: int = Field(foreign_key="portfolio.id")
     symbol: str
@@ -33,7 +55,20 @@ class Transaction(SQLModel, table=True):
     
     portfolio: Optional[Portfolio] = Relationship(back_populates="transactions")
 
+class ProfileSummary(SQLModel, table=True):
+    """LLM trading-profile summary, valid until the user trades again"""
+    __tablename__ = "profile_summary"
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: str = Field(index=True, unique=True)
+    last_transaction_id: int
+    trades_analyzed: int
+    summary: str
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
 class AutoTradeRule(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_autotraderule_user_active_created", "user_id", "active", "created_at"),
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: str = Field(index=True)
     symbol: str
@@ -42,3 +77,75 @@ class AutoTradeRule(SQLModel, table=True):
     quantity: int
     active: bool = Field(default=True)
     created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class Order(SQLModel, table=True):
+    """Resting limit/stop order. Open orders are loaded into the in-memory
+    order book (app.orderbook) at startup; the id doubles as time priority."""
+    __tablename__ = "trade_order"
+    __table_args__ = (
+        Index("ix_trade_order_user_active_created", "user_id", "active", "created_at"),
+        Index("ix_trade_order_active_id", "active", "id"),
+    )
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: str
+    symbol: str
+    side: str # "BUY" or "SELL"
+    order_type: str # "LIMIT" or "STOP"
+    price: float # Limit price, or trigger price for stops
+    quantity: int
+    filled_quantity: int = Field(default=0)
+    status: str = Field(default="OPEN") # OPEN, PARTIAL, FILLED, CANCELLED
+    active: bool = Field(default=True)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
+
+    @declared_attr
+    def __mapper_args__(cls):
+        return {"version_id_col": cls.__table__.c.version}
+
+class OrderFill(SQLModel, table=True):
+    """Journal of every (partial) fill against a resting order"""
+    __tablename__ = "order_fill"
+    id: Optional[int] = Field(default=None, primary_key=True)
+    order_id: int = Field(foreign_key="trade_order.id", index=True)
+    transaction_id: Optional[int] = Field(default=None, foreign_key="transaction.id")
+    symbol: str
+    side: str
+    quantity: int
+    price: float
+    timestamp: datetime = Field(default_factory=datetime.utcnow)
+
+class DailyBar(SQLModel, table=True):
+    """Completed daily OHLCV bar, filled incrementally by app.bars"""
+    __tablename__ = "daily_bar"
+    __table_args__ = (
+        Index("ux_daily_bar_symbol_date", "symbol", "date", unique=True),
+    )
+    id: Optional[int] = Field(default=None, primary_key=True)
+    symbol: str
+    date: date_type
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float = Field(default=0)
+
+class Fundamentals(SQLModel, table=True):
+    """Fields of yfinance's ticker.info used for ranking, refreshed daily by app.ranking"""
+    __tablename__ = "fundamentals"
+    id: Optional[int] = Field(default=None, primary_key=True)
+    symbol: str = Field(unique=True)
+    name: Optional[str] = None
+    quote_type: Optional[str] = None
+    currency: Optional[str] = None
+    market_cap: Optional[float] = None
+    trailing_pe: Optional[float] = None
+    dividend_yield: Optional[float] = None # fraction, e.g. 0.012
+    return_on_equity: Optional[float] = None
+    profit_margin: Optional[float] = None
+    debt_to_equity: Optional[float] = None
+    revenue_growth: Optional[float] = None
+    earnings_growth: Optional[float] = None
+    target_mean_price: Optional[float] = None
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,166 @@
+"""Batched persistence for chat exchanges.
+
+A UnitOfWork records the writes of one /trades exchange (session upsert,
+preferences, messages) while the request runs and applies them in a single
+transaction at the end: one commit per exchange instead of one per step, and
+no write transaction (on SQLite, the database lock) held while LLM calls are
+in flight. Preference reads go through the write-through preference cache
+(app.preference_cache), with the pending writes layered on top; release()
+hands its connection back to the pool before slow work, so a request never
+holds one connection while waiting for another.
+
+With WRITE_BEHIND=1, session touches and messages are handed to a
+background queue instead, which batches them across requests into one
+transaction every WRITE_BEHIND_INTERVAL seconds; only interview state, which
+the next request depends on, is still committed inline.
+"""
+import os
+import asyncio
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlmodel import Session, select
+from app.db import engine
+from app.models import ChatSession, ChatMessage
+from app.preference_cache import preference_cache, upsert_preferences
+
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "0") == "1"
+FLUSH_INTERVAL = float(os.getenv("WRITE_BEHIND_INTERVAL", "0.05"))
+MAX_BATCH = int(os.getenv("WRITE_BEHIND_BATCH", "500"))
+FLUSH_ATTEMPTS = 3
+
+# session_id -> (user_id, title, touched_at)
+SessionTouches = Dict[str, Tuple[str, Optional[str], datetime]]
+
+def apply_writes(db: Session, sessions: SessionTouches, preferences: Dict[Tuple[str, str], str], messages: List[ChatMessage]):
+    """Add session upserts, preference upserts and messages to db (no commit)"""
+    if sessions:
+        existing = {s.session_id: s for s in db.exec(select(ChatSession).where(ChatSession.session_id.in_(sessions))).all()}
+        for session_id, (user_id, title, touched_at) in sessions.items():
+            row = existing.get(session_id)
+            if row:
+                row.updated_at = max(row.updated_at, touched_at)
+                db.add(row)
+            else:
+                db.add(ChatSession(session_id=session_id, user_id=user_id, title=title, created_at=touched_at, updated_at=touched_at))
+    upsert_preferences(db, preferences)
+    db.add_all(messages)
+
+class UnitOfWork:
+    def __init__(self, db: Session):
+        self.db = db
+        self.sessions: SessionTouches = {}
+        self.preferences: Dict[Tuple[str, str], str] = {}
+        self.messages: List[ChatMessage] = []
+
+    def touch_session(self, session_id: str, user_id: str, title: Optional[str]):
+        """Create the chat session if it doesn't exist, else bump updated_at"""
+        self.sessions[session_id] = (user_id, title, datetime.utcnow())
+
+    def add_message(self, session_id: str, role: str, content: str):
+        self.messages.append(ChatMessage(session_id=session_id, role=role, content=content))
+
+    def set_preference(self, session_id: str, key: str, value: str):
+        self.preferences[(session_id, key)] = value
+
+    def preference(self, session_id: str, key: str) -> Optional[str]:
+        if (session_id, key) in self.preferences:
+            return self.preferences[(session_id, key)]
+        return preference_cache.get(self.db, session_id).get(key)
+
+    def all_preferences(self, session_id: str) -> Dict[str, str]:
+        prefs = preference_cache.get(self.db, session_id)
+        prefs.update({key: value for (sid, key), value in self.preferences.items() if sid == session_id})
+        return prefs
+
+    def release(self):
+        """Return the session's connection to the pool (it reconnects on next use)"""
+        self.db.close()
+
+    def commit(self):
+        """Apply every recorded write in one transaction (or queue the
+        non-critical ones for the write-behind queue), then release"""
+        sessions, messages = self.sessions, self.messages
+        if write_behind.running:
+            write_behind.put(sessions, messages)
+            sessions, messages = {}, []
+        try:
+            if sessions or self.preferences or messages:
+                apply_writes(self.db, sessions, self.preferences, messages)
+                self.db.commit()
+                preference_cache.committed(self.preferences)
+        finally:
+            self.sessions, self.preferences, self.messages = {}, {}, []
+            self.release()
+
+class WriteBehindQueue:
+    def __init__(self, enabled: bool = WRITE_BEHIND, interval: float = FLUSH_INTERVAL):
+        self.enabled = enabled
+        self.interval = interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self):
+        if self.enabled and self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+            print("✅ Write-behind queue started")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            # Flush whatever is still queued before shutting down
+            while not self._queue.empty():
+                await asyncio.to_thread(self._flush, self._drain())
+
+    def put(self, sessions: SessionTouches, messages: List[ChatMessage]):
+        self._queue.put_nowait((sessions, messages))
+
+    def _drain(self) -> list:
+        batch = []
+        while not self._queue.empty() and len(batch) < MAX_BATCH:
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        while True:
+            first = await self._queue.get()
+            try:
+                await asyncio.sleep(self.interval) # Let other requests' writes join the batch
+            except asyncio.CancelledError:
+                self._queue.put_nowait(first) # Flushed by stop()
+                raise
+            batch = [first] + self._drain()
+            await asyncio.to_thread(self._flush, batch)
+
+    def _flush(self, batch: list):
+        if not batch:
+            return
+        sessions: SessionTouches = {}
+        messages: List[ChatMessage] = []
+        for touches, msgs in batch:
+            for session_id, touch in touches.items():
+                if session_id not in sessions or touch[2] > sessions[session_id][2]:
+                    sessions[session_id] = touch
+            messages.extend(msgs)
+        for attempt in range(FLUSH_ATTEMPTS):
+            try:
+                with Session(engine) as db:
+                    apply_writes(db, sessions, {}, messages)
+                    db.commit()
+                return
+            except Exception as e:
+                print(f"⚠️ Write-behind flush failed (attempt {attempt + 1}): {e}")
+                # Rows from a rolled-back flush keep their ids; retry with fresh copies
+                messages = [ChatMessage(session_id=m.session_id, role=m.role, content=m.content, created_at=m.created_at) for m in messages]
+        print(f"❌ Dropped {len(messages)} messages and {len(sessions)} session updates")
+
+write_behind = WriteBehindQueue()
@@ -1,4 +1,7 @@
 import re
+import json
+import base64
+from datetime import datetime
 from typing import Optional
 
 TICKER_REGEX = re.compile(r"\b([A-Z]{1,5})(?:\b|$)")
@@ -9,3 +12,60 @@ def extract_ticker_from_text(text: str) -> Optional[str]:
     if m:
         return m.group(1)
     return None
+
+def encode_cursor(*key) -> str:
+    """Opaque keyset cursor for paginated endpoints (timestamps as ISO strings)."""
+    parts = [k.isoformat() if isinstance(k, datetime) else k for k in key]
+    return base64.urlsafe_b64encode(json.dumps(parts).encode()).decode()
+
+def decode_cursor(cursor: str) -> list:
+    """Inverse of encode_cursor. The first element is always the timestamp."""
+    parts = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    parts[0] = datetime.fromisoformat(parts[0])
+    return parts
+
+# Keep proxies (nginx) from buffering the event stream
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+def sse_event(event: str, data) -> str:
+    """One server-sent event frame with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+class MarkerSplitter:
+    """Splits streamed text at a marker line (e.g. ---METADATA---).
+
+    feed() returns the text that is safe to show so far, holding back any
+    tail that could be the start of the marker; everything after the marker
+    is collected in .tail.
+    """
+
+    def __init__(self, marker: str):
+        self.marker = marker
+        self.buffer = ""
+        self.tail = ""
+        self.found = False
+
+    def feed(self, chunk: str) -> str:
+        if self.found:
+            self.tail += chunk
+            return ""
+        self.buffer += chunk
+        index = self.buffer.find(self.marker)
+        if index >= 0:
+            self.found = True
+            visible, self.tail = self.buffer[:index], self.buffer[index + len(self.marker):]
+            self.buffer = ""
+            return visible
+        # Keep back the longest suffix that is a prefix of the marker
+        keep = 0
+        for n in range(min(len(self.marker) - 1, len(self.buffer)), 0, -1):
+            if self.marker.startswith(self.buffer[-n:]):
+                keep = n
+                break
+        visible = self.buffer[:len(self.buffer) - keep]
+        self.buffer = self.buffer[len(self.buffer) - keep:]
+        return visible
+
+    def flush(self) -> str:
+        visible, self.buffer = self.buffer, ""
+        return visible
@@ -0,0 +1,64 @@
+"""Storage savings and cost of the message codec on stored transcripts.
+
+Reads assistant messages from DATABASE_URL, trains a dictionary on half of
+them and measures the other half: stored bytes as is, with plain zlib and
+with the dictionary, and the encode/decode time per message. Nothing is
+written to the database. To bench on stand-in transcripts:
+
+    LOAD_DATABASE_URL=sqlite:///transcripts.db python load_test.py -n 1000 --scenario trades --scenario trades_stream
+    DATABASE_URL=sqlite:///transcripts.db python bench_codec.py
+    python bench_codec.py 20000          # at most 20k messages (default 5000)
+"""
+import sys
+import json
+import time
+from sqlmodel import Session, select, desc
+from app.db import engine
+from app.models import ChatMessage
+from app.message_codec import MessageCodec, train_dictionary, MIN_LENGTH
+
+def timed(fn, values, runs: int = 3) -> float:
+    """Best mean microseconds per value over runs"""
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        for v in values:
+            fn(v)
+        best = min(best, (time.perf_counter() - start) / len(values))
+    return best * 1e6
+
+if __name__ == "__main__":
+    limit = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    with Session(engine) as db:
+        messages = db.exec(
+            select(ChatMessage.content).where(ChatMessage.role == "assistant").order_by(desc(ChatMessage.id)).limit(limit)
+        ).all()
+    if len(messages) < 2:
+        sys.exit("Need assistant messages in DATABASE_URL; see the usage above")
+
+    # Train on one half, measure on the other, like a dictionary trained
+    # last week compressing today's messages
+    training, held_out = messages[1::2], messages[0::2]
+    start = time.perf_counter()
+    dictionary = train_dictionary(training)
+    print(f"Trained a {len(dictionary)}-byte dictionary on {len(training)} messages in {time.perf_counter() - start:.1f}s")
+
+    plain = MessageCodec(enabled=True)
+    trained = MessageCodec(enabled=True)
+    trained.dictionaries[1] = dictionary
+    trained.current = 1
+
+    raw = sum(len(m.encode()) for m in held_out)
+    print(f"\n{len(held_out)} held-out messages, {raw / len(held_out):.0f} bytes on average, {sum(len(m) < MIN_LENGTH for m in held_out)} below MIN_LENGTH")
+    print(f"{'storage':<12}{'bytes':>12}{'ratio':>8}{'encode us':>12}{'decode us':>12}")
+    print(f"{'as is':<12}{raw:>12}{1.0:>8.2f}{'':>12}{'':>12}")
+    for name, codec in (("zlib", plain), ("dictionary", trained)):
+        stored = [codec.encode(m) for m in held_out]
+        assert [codec.decode(s) for s in stored] == held_out
+        size = sum(len(s.encode()) for s in stored)
+        encode, decode = timed(codec.encode, held_out), timed(codec.decode, stored)
+        print(f"{name:<12}{size:>12}{raw / size:>8.2f}{encode:>12.1f}{decode:>12.1f}")
+
+    parseable = [m for m in held_out if m.startswith("{")]
+    if parseable:
+        print(f"\nFor scale, json.loads of the same payloads: {timed(json.loads, parseable):.1f} us per message")
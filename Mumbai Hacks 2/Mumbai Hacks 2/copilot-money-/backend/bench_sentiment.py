@@ -0,0 +1,50 @@
+"""Throughput benchmark for the local news sentiment scorer.
+
+Builds a synthetic headline corpus from templates and times batch scoring.
+
+    python bench_sentiment.py            # 100k headlines
+    python bench_sentiment.py 500000
+"""
+import sys
+import time
+import random
+from app.sentiment import score_texts, classify
+
+COMPANIES = ["Apple", "Microsoft", "Nvidia", "Tesla", "Amazon", "Reliance", "Infosys", "HDFC Bank", "JPMorgan", "Meta"]
+TEMPLATES = [
+    "{c} shares surge after earnings beat estimates",
+    "{c} stock plunges as regulators open fraud probe",
+    "{c} announces new partnership to expand cloud business",
+    "Analysts downgrade {c} citing slowing demand and margin pressure",
+    "{c} holds annual shareholder meeting in {city}",
+    "{c} did not miss revenue forecasts despite inflation concerns",
+    "{c} hits record high as AI rally continues",
+    "{c} faces lawsuit over product recall; shares slide",
+    "{c} names new chief financial officer",
+    "{c} issues profit warning, warns of weak quarter ahead",
+]
+CITIES = ["New York", "Mumbai", "London", "Cupertino", "Bengaluru"]
+
+def corpus(n: int, seed: int = 7):
+    rng = random.Random(seed)
+    return [rng.choice(TEMPLATES).format(c=rng.choice(COMPANIES), city=rng.choice(CITIES)) for _ in range(n)]
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    headlines = corpus(n)
+
+    score_texts(headlines[:1000]) # warm up
+    for batch in (100, 1000, n):
+        sample = headlines[:batch]
+        runs = max(1, 20_000 // batch)
+        start = time.perf_counter()
+        for _ in range(runs):
+            scores = score_texts(sample)
+        elapsed = (time.perf_counter() - start) / runs
+        print(f"batch {batch:>7}: {elapsed * 1000:8.2f} ms  ({batch / (elapsed * 1000):7.0f} headlines/ms)")
+
+    # Same input, same labels
+    assert classify(headlines[:1000]) == classify(headlines[:1000])
+    print("\nSample labels:")
+    for text, (name, score) in zip(TEMPLATES, classify(t.format(c="Apple", city="Mumbai") for t in TEMPLATES)):
+        print(f"  {name:8} {score:+.3f}  {text.format(c='Apple', city='Mumbai')}")
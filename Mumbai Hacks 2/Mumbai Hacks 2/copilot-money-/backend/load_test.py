@@ -0,0 +1,178 @@
+"""Throughput and tail-latency test of the LLM-backed endpoints.
+
+Drives /trades (plain and streamed), chat messages, /recommendations and
+/profile-summary with a seeded mix of requests. By default the backend runs
+in-process with a throwaway SQLite database, the offline LLM stand-in
+(app/llm_standin.py) and the offline market data and search stand-in
+(app/market_standin.py), so runs need no network, cost no quota and are
+reproducible; tune the LLM with the STANDIN_* variables. --url targets a
+running server instead, which uses whatever sources it was started with.
+
+    python load_test.py                              # 400 requests, 32 concurrent
+    python load_test.py -n 2000 -c 128
+    python load_test.py --scenario trades            # one endpoint only
+    STANDIN_429_RATE=0.1 python load_test.py         # with injected rate limits
+    python load_test.py --url http://localhost:8000  # e.g. GROQ_BASE_URL=... uvicorn main:app
+    WRITE_BEHIND=1 python load_test.py               # batch message writes across requests
+
+In-process runs also report database commits per request. Stream
+first-byte latency is only reported with --url: httpx's ASGITransport
+buffers the whole response, so in-process it would equal the total latency.
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from collections import defaultdict
+
+os.environ.setdefault("LLM_BACKEND", "standin")
+# The stand-in has no quota; lift the client-side limiter so it doesn't
+# dominate the numbers (STANDIN_429_RATE simulates the provider's limits)
+os.environ.setdefault("LLM_RATE_LIMIT_SCALE", "1000")
+if not os.getenv("LOAD_DATABASE_URL"):
+    os.environ["LOAD_DATABASE_URL"] = f"sqlite:///{tempfile.mktemp(suffix='.db')}"
+os.environ["DATABASE_URL"] = os.environ["LOAD_DATABASE_URL"]
+# Fresh response cache and intent log, so every run starts from the same state
+os.environ.setdefault("LLM_CACHE_PATH", tempfile.mktemp(suffix=".db"))
+os.environ.setdefault("INTENT_LOG_PATH", tempfile.mktemp(suffix=".jsonl"))
+
+import httpx
+
+USERS = [f"load_user_{i}" for i in range(8)]
+QUERIES = [
+    "Apple stock", "News about Tesla", "what is a p/e ratio", "market update", "how is NVDA doing?",
+    "should I invest in index funds", "latest headlines on Microsoft", "explain dollar cost averaging",
+    "Amazon earnings", "compare gold and bitcoin", "why did the market fall today", "Reliance outlook",
+]
+PROFILE = {"investmentGoal": "Growth", "riskTolerance": "Medium", "preferredSectors": ["Tech"], "amount": "$1k-$10k"}
+# (scenario, weight)
+MIX = [("trades", 4), ("trades_stream", 2), ("chat", 2), ("recommendations", 1), ("profile_summary", 1)]
+
+def seed_trades():
+    """Give each load user a trade history for /profile-summary"""
+    from datetime import datetime, timedelta
+    from sqlmodel import Session
+    from app.db import engine
+    from app.trading_models import Portfolio, Transaction
+
+    rng = random.Random(1)
+    with Session(engine) as db:
+        for user_id in USERS:
+            portfolio = Portfolio(user_id=user_id)
+            db.add(portfolio)
+            db.flush()
+            for i in range(30):
+                db.add(Transaction(
+                    portfolio_id=portfolio.id, symbol=rng.choice(["AAPL", "MSFT", "NVDA", "TSLA"]),
+                    type=rng.choice(["BUY", "SELL"]), quantity=rng.randint(1, 20), price=rng.uniform(100, 500),
+                    timestamp=datetime(2025, 1, 1) + timedelta(hours=i),
+                ))
+        db.commit()
+
+async def run_one(client: httpx.AsyncClient, scenario: str, rng: random.Random) -> float:
+    """Run one request; returns seconds to the first byte of a stream, else None"""
+    user_id = rng.choice(USERS)
+    if scenario == "trades":
+        r = await client.post("/api/trades/trades", json={"query": rng.choice(QUERIES), "user_id": user_id})
+    elif scenario == "trades_stream":
+        start = time.perf_counter()
+        first = None
+        async with client.stream("POST", "/api/trades/trades/stream", json={"query": rng.choice(QUERIES), "user_id": user_id}) as r:
+            async for _ in r.aiter_bytes():
+                first = first or time.perf_counter() - start
+        r.raise_for_status()
+        return first
+    elif scenario == "chat":
+        r = await client.post("/api/chat/sessions", json={"title": "load"})
+        r.raise_for_status()
+        r = await client.post(f"/api/chat/sessions/{r.json()['session_id']}/messages", json={"content": rng.choice(QUERIES)})
+    elif scenario == "recommendations":
+        r = await client.post("/api/trades/recommendations", json={"profile": PROFILE})
+    else:
+        r = await client.get(f"/api/trades/profile-summary/{user_id}")
+    r.raise_for_status()
+    return None
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))] if values else 0.0
+
+async def main(args):
+    commits = defaultdict(int)
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=120)
+    else:
+        from sqlalchemy import event
+        from app.db import init_db, engine
+        import main as backend
+
+        if os.getenv("LLM_BACKEND") == "standin":
+            from app.market_standin import install
+            install()
+        await init_db()
+        seed_trades()
+        event.listen(engine, "commit", lambda conn: commits.__setitem__("total", commits["total"] + 1))
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=backend.app), base_url="http://backend", timeout=120)
+        # ASGITransport doesn't run startup/shutdown; start the write-behind queue ourselves
+        from app.unit_of_work import write_behind
+        write_behind.start()
+
+    rng = random.Random(args.seed)
+    mix = [(s, w) for s, w in MIX if not args.scenario or s in args.scenario]
+    scenarios = rng.choices([s for s, _ in mix], weights=[w for _, w in mix], k=args.requests)
+    latencies = defaultdict(list)
+    first_bytes = []
+    errors = defaultdict(int)
+    sem = asyncio.Semaphore(args.concurrency)
+
+    async def worker(i, scenario):
+        async with sem:
+            start = time.perf_counter()
+            try:
+                first = await run_one(client, scenario, random.Random(args.seed * 100003 + i))
+            except Exception as e:
+                errors[f"{scenario}: {type(e).__name__}"] += 1
+                return
+            latencies[scenario].append(time.perf_counter() - start)
+            if first is not None and args.url:
+                first_bytes.append(first)
+
+    start = time.perf_counter()
+    async with client:
+        await asyncio.gather(*(worker(i, s) for i, s in enumerate(scenarios)))
+    elapsed = time.perf_counter() - start
+    if not args.url:
+        await write_behind.stop()
+
+    done = sum(len(v) for v in latencies.values())
+    print(f"\n{done}/{args.requests} requests in {elapsed:.1f}s ({done / elapsed:.1f} req/s, concurrency {args.concurrency})")
+    print(f"{'scenario':<18}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for scenario, _ in MIX:
+        values = latencies[scenario]
+        if values:
+            row = [percentile(values, p) * 1000 for p in (50, 95, 99, 100)]
+            print(f"{scenario:<18}{len(values):>6}" + "".join(f"{v:>10.0f}" for v in row))
+    if first_bytes:
+        print(f"stream first byte: p50 {percentile(first_bytes, 50) * 1000:.0f} ms, p99 {percentile(first_bytes, 99) * 1000:.0f} ms")
+    elif latencies["trades_stream"] and not args.url:
+        print("stream first byte: unavailable in-process (the ASGI transport buffers responses); run against --url")
+    if not args.url:
+        print(f"db commits: {commits['total']} ({commits['total'] / max(done, 1):.2f} per request)")
+    if not args.url and os.getenv("LLM_BACKEND") == "standin":
+        from app.llm_standin import standin
+        print(f"stand-in: {dict(standin.stats)}")
+    for error, count in sorted(errors.items()):
+        print(f"❌ {error}: {count}")
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--requests", type=int, default=400)
+    parser.add_argument("-c", "--concurrency", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--scenario", action="append", choices=[s for s, _ in MIX], help="Only run these scenarios (repeatable)")
+    parser.add_argument("--url", help="Base URL of a running backend (default: in-process)")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -17,6 +17,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 @app.on_event("startup")
@@ -32,14 +33,35 @@ app.include_router(trades.router, prefix="/api/trades", tags=["trades"])
 app.include_router(trading.router, prefix="/api/trading", tags=["trading"])
 
 from app.engine import trading_engine
+from app.dashboard import dashboard
+from app.news_store import news_ingester
+from app.recommendations import recommendation_cache
+from app.ranking import universe_refresher
+from app.similarity import similarity_index
+from app.unit_of_work import write_behind
+from app.retention import retention_job
 
 @app.on_event("startup")
 async def start_engine():
     trading_engine.start()
+    dashboard.start()
+    news_ingester.start()
+    recommendation_cache.start()
+    universe_refresher.start()
+    similarity_index.start()
+    write_behind.start()
+    retention_job.start()
 
 @app.on_event("shutdown")
 async def stop_engine():
     trading_engine.stop()
+    await dashboard.stop()
+    await news_ingester.stop()
+    await recommendation_cache.stop()
+    await universe_refresher.stop()
+    await similarity_index.stop()
+    await retention_job.stop()
+    await write_behind.stop()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,132 @@
+"""Concurrency stress test for paper-trading execution.
+
+Runs several API-worker and engine processes against the same portfolio and
+then checks that the balance and holdings agree with the transaction log.
+
+    DATABASE_URL=postgresql://... python stress_trading.py
+    python stress_trading.py            # uses a throwaway SQLite file
+"""
+import os
+import random
+import tempfile
+import multiprocessing as mp
+from collections import defaultdict
+
+if not os.getenv("STRESS_DATABASE_URL"):
+    os.environ["STRESS_DATABASE_URL"] = f"sqlite:///{tempfile.mktemp(suffix='.db')}"
+os.environ["DATABASE_URL"] = os.environ["STRESS_DATABASE_URL"]
+os.environ.setdefault("GROQ_API_KEY", "stress-test")
+
+USER_ID = "stress_user"
+SYMBOLS = ["AAPL", "MSFT", "NVDA", "TSLA"]
+PRICES = {"AAPL": 190.0, "MSFT": 410.0, "NVDA": 120.0, "TSLA": 250.0}
+API_WORKERS = 4
+ENGINE_WORKERS = 2
+ORDERS_PER_WORKER = 150
+RULES = 200
+
+def api_worker(seed: int):
+    from fastapi import HTTPException
+    from sqlmodel import Session
+    from app.db import engine
+    from app.routers import trading
+
+    engine.dispose(close=False)
+    trading.get_current_price = lambda symbol: PRICES[symbol]
+    rng = random.Random(seed)
+    stats = defaultdict(int)
+    for _ in range(ORDERS_PER_WORKER):
+        req = trading.TradeRequest(
+            user_id=USER_ID,
+            symbol=rng.choice(SYMBOLS),
+            type=rng.choice(["BUY", "BUY", "SELL"]),
+            quantity=rng.randint(1, 20),
+        )
+        with Session(engine) as db:
+            try:
+                trading.place_trade(req, db)
+                stats["executed"] += 1
+            except HTTPException as e:
+                stats["conflict" if e.status_code == 409 else "rejected"] += 1
+    return dict(stats)
+
+def engine_worker(_):
+    from sqlmodel import Session, select
+    from app.db import engine
+    from app.engine import TradingEngine
+    from app.trading_models import AutoTradeRule
+
+    engine.dispose(close=False)
+    worker = TradingEngine()
+    with Session(engine) as session:
+        rules = session.exec(select(AutoTradeRule).where(AutoTradeRule.active == True)).all()
+        for rule in rules:
+            try:
+                worker._execute_trade(session, rule, PRICES[rule.symbol])
+            except Exception as e:
+                print(f"Engine worker error: {e}")
+    return {}
+
+def main():
+    import asyncio
+    from sqlmodel import Session, select
+    from app.db import engine, init_db
+    from app.routers.trading import get_or_create_portfolio
+    from app.trading_models import Portfolio, Holding, Transaction, AutoTradeRule
+
+    print(f"Database: {os.environ['DATABASE_URL']}")
+    asyncio.run(init_db())
+    with Session(engine) as db:
+        get_or_create_portfolio(USER_ID, db)
+        rng = random.Random(0)
+        for _ in range(RULES):
+            db.add(AutoTradeRule(
+                user_id=USER_ID,
+                symbol=rng.choice(SYMBOLS),
+                condition="price > 0",
+                action=rng.choice(["BUY", "SELL"]),
+                quantity=rng.randint(1, 10),
+            ))
+        db.commit()
+    engine.dispose()
+
+    with mp.Pool(API_WORKERS + ENGINE_WORKERS) as pool:
+        api = pool.map_async(api_worker, range(API_WORKERS))
+        eng = pool.map_async(engine_worker, range(ENGINE_WORKERS))
+        api_stats, _ = api.get(), eng.get()
+
+    totals = defaultdict(int)
+    for s in api_stats:
+        for k, v in s.items():
+            totals[k] += v
+    print(f"API orders: {dict(totals)}")
+
+    with Session(engine) as db:
+        portfolio = db.exec(select(Portfolio).where(Portfolio.user_id == USER_ID)).one()
+        txns = db.exec(select(Transaction).where(Transaction.portfolio_id == portfolio.id)).all()
+        holdings = {h.symbol: h.quantity for h in db.exec(select(Holding).where(Holding.portfolio_id == portfolio.id)).all()}
+        fired = len(db.exec(select(AutoTradeRule).where(AutoTradeRule.active == False)).all())
+
+    expected_balance = 100000.0
+    expected_qty = defaultdict(int)
+    for t in txns:
+        sign = 1 if t.type == "BUY" else -1
+        expected_balance -= sign * t.price * t.quantity
+        expected_qty[t.symbol] += sign * t.quantity
+    expected_qty = {k: v for k, v in expected_qty.items() if v}
+
+    print(f"Transactions: {len(txns)} (rules fired: {fired})")
+    print(f"Balance: {portfolio.balance:.2f} expected {expected_balance:.2f}")
+    print(f"Holdings: {holdings} expected {expected_qty}")
+
+    ok = (
+        abs(portfolio.balance - expected_balance) < 1e-6
+        and holdings == expected_qty
+        and len(txns) == totals["executed"] + fired
+        and all(q > 0 for q in holdings.values())
+    )
+    print("SUCCESS: no lost updates" if ok else "FAILED: portfolio drifted from the transaction log")
+    return ok
+
+if __name__ == "__main__":
+    raise SystemExit(0 if main() else 1)
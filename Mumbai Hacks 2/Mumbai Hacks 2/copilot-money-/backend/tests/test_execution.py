@@ -0,0 +1,103 @@
+import pytest
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm.exc import StaleDataError
+from sqlmodel import SQLModel, Session, create_engine, select
+from app.trading_models import Portfolio, Holding, Transaction
+from app.execution import run_with_retry, apply_order, load_holdings, OrderRejected, ConcurrentUpdateError
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'trading.db'}")
+    SQLModel.metadata.create_all(engine, tables=[Portfolio.__table__, Holding.__table__, Transaction.__table__])
+    with Session(engine) as db:
+        db.add(Portfolio(user_id="u1", balance=1000.0))
+        db.commit()
+    return engine
+
+def portfolio(db: Session) -> Portfolio:
+    return db.exec(select(Portfolio).where(Portfolio.user_id == "u1")).one()
+
+def buy(db: Session, symbol: str, quantity: int, price: float):
+    p = portfolio(db)
+    return apply_order(db, p, load_holdings(db, p, [symbol]), symbol, "BUY", quantity, price)
+
+def test_lost_update_is_retried_against_fresh_state(engine):
+    calls = []
+
+    def work():
+        calls.append(1)
+        txn = buy(db, "AAPL", 1, 100.0)
+        if len(calls) == 1:
+            # Another worker buys between our read and our commit
+            with Session(engine) as other:
+                buy(other, "MSFT", 2, 100.0)
+                other.commit()
+        return txn
+
+    with Session(engine) as db:
+        run_with_retry(db, work)
+    assert len(calls) == 2
+    with Session(engine) as db:
+        assert portfolio(db).balance == 700.0
+        assert {h.symbol: h.quantity for h in db.exec(select(Holding)).all()} == {"AAPL": 1, "MSFT": 2}
+
+def test_duplicate_holding_insert_is_retried_as_an_update(engine):
+    calls = []
+
+    def work():
+        calls.append(1)
+        p = portfolio(db)
+        holdings = load_holdings(db, p, ["AAPL"])
+        if len(calls) == 1:
+            # Another worker opens the same position first
+            with Session(engine) as other:
+                buy(other, "AAPL", 1, 100.0)
+                other.commit()
+        return apply_order(db, p, holdings, "AAPL", "BUY", 1, 100.0)
+
+    with Session(engine) as db:
+        run_with_retry(db, work)
+    assert len(calls) == 2
+    with Session(engine) as db:
+        holdings = db.exec(select(Holding)).all()
+        assert [(h.symbol, h.quantity) for h in holdings] == [("AAPL", 2)]
+
+def test_locked_database_is_retried(engine):
+    calls = []
+
+    def work():
+        calls.append(1)
+        if len(calls) == 1:
+            raise OperationalError("UPDATE portfolio", {}, Exception("database is locked"))
+        return buy(db, "AAPL", 1, 100.0)
+
+    with Session(engine) as db:
+        run_with_retry(db, work)
+    assert len(calls) == 2
+
+def test_other_operational_errors_are_not_retried(engine):
+    calls = []
+
+    def work():
+        calls.append(1)
+        raise OperationalError("SELECT", {}, Exception("no such table: portfolio"))
+
+    with Session(engine) as db, pytest.raises(OperationalError):
+        run_with_retry(db, work)
+    assert len(calls) == 1
+
+def test_gives_up_after_the_last_attempt(engine):
+    calls = []
+
+    def work():
+        calls.append(1)
+        raise StaleDataError("version mismatch")
+
+    with Session(engine) as db, pytest.raises(ConcurrentUpdateError):
+        run_with_retry(db, work, attempts=3)
+    assert len(calls) == 3
+
+@pytest.mark.parametrize("quantity", [0, -5])
+def test_non_positive_quantity_is_rejected(engine, quantity):
+    with Session(engine) as db, pytest.raises(OrderRejected):
+        buy(db, "AAPL", quantity, 100.0)
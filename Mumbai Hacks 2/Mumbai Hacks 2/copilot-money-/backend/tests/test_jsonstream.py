@@ -0,0 +1,114 @@
+import json
+import codecs
+import pytest
+from app.jsonstream import JSONStreamParser, parse_json
+
+DOCUMENT = {
+    "main_insight": "Café \"chains\" rally\nafter earnings \\ guidance — up 5%",
+    "news_items": [
+        {"title": "Fed holds rates", "score": -0.25, "tags": ["macro", "rates"], "url": "https://x.example/a/b"},
+        {"title": "Apple beats", "score": 1.5e-2, "tags": [], "flagged": False, "source": None},
+        {"title": "日本 株", "score": 12, "nested": {"deep": [1, [2, {"k": True}]]}},
+    ],
+    "count": 3,
+}
+TEXT = json.dumps(DOCUMENT, indent=1)
+UNICODE_TEXT = json.dumps(DOCUMENT, ensure_ascii=False)
+
+def run(chunks, items_at=("news_items",)):
+    parser = JSONStreamParser(items_at=items_at)
+    emitted = []
+    for chunk in chunks:
+        emitted += parser.feed(chunk)
+    return emitted, parser.close()
+
+def byte_chunks(text: str, size: int):
+    """text as a UTF-8 stream read size bytes at a time"""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    data = text.encode()
+    return [decoder.decode(data[i:i + size]) for i in range(0, len(data), size)] + [decoder.decode(b"", final=True)]
+
+@pytest.mark.parametrize("text", [TEXT, UNICODE_TEXT])
+def test_character_split(text):
+    emitted, result = run(list(text))
+    assert result == DOCUMENT
+    assert emitted == [(("news_items",), item) for item in DOCUMENT["news_items"]]
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7])
+def test_byte_split(size):
+    emitted, result = run(byte_chunks(UNICODE_TEXT, size))
+    assert result == DOCUMENT
+    assert [item for _, item in emitted] == DOCUMENT["news_items"]
+
+def test_every_two_way_split():
+    text = json.dumps({"a": "x\\\"yé", "b": [1, -2.5, None], "c": {"d": "—"}})
+    for i in range(len(text) + 1):
+        assert run([text[:i], text[i:]])[1] == json.loads(text), i
+
+@pytest.mark.parametrize("escape", ["\\n", "\\\"", "\\\\", "\\u00e9", "\\u2014", "\\/"])
+def test_escape_split_across_chunks(escape):
+    text = '{"s": "a' + escape + 'b"}'
+    expected = json.loads(text)
+    start = text.index("\\")
+    for cut in range(start, start + len(escape) + 1):
+        assert run([text[:cut], text[cut:]])[1] == expected, cut
+
+def test_items_are_emitted_as_they_close():
+    parser = JSONStreamParser(items_at=["news_items"])
+    first, second = json.dumps(DOCUMENT["news_items"][0]), json.dumps(DOCUMENT["news_items"][1])
+    assert parser.feed('{"main_insight": "x", "news_items": [' + first[:-1]) == []
+    assert parser.feed("}, " + second[:10]) == [(("news_items",), DOCUMENT["news_items"][0])]
+    assert parser.feed(second[10:]) == [(("news_items",), DOCUMENT["news_items"][1])]
+    assert parser.feed("]}") == []
+
+def test_partial_root_while_streaming():
+    parser = JSONStreamParser()
+    parser.feed('{"a": 1, "b": [1, {"c": "hel')
+    assert parser.root == {"a": 1, "b": [1, {}]}
+    parser.feed('lo"}')
+    assert parser.root == {"a": 1, "b": [1, {"c": "hello"}]}
+    assert not parser.done
+
+def test_nested_paths_and_root_array():
+    emitted, _ = run(['{"a": {"b": [1, ', '2]}}'], items_at=[("a", "b")])
+    assert emitted == [(("a", "b"), 1), (("a", "b"), 2)]
+    emitted, result = run(['[{"x": 1}', ', {"x": 2}]'], items_at=[()])
+    assert emitted == [((), {"x": 1}), ((), {"x": 2})]
+    assert result == [{"x": 1}, {"x": 2}]
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"a": "hel', {"a": "hel"}), # Unterminated string
+    ('{"a": 1, "b"', {"a": 1}), # Dangling key
+    ('{"a": 1, "b":', {"a": 1}),
+    ('{"a": [1, 2', {"a": [1, 2]}), # Unclosed containers
+    ('{"a": {"b": [{"c": 12', {"a": {"b": [{"c": 12}]}}),
+    ('{"a": "x\\', {"a": "x"}), # Cut off inside an escape
+])
+def test_truncated_output_is_closed(text, expected):
+    assert run([text])[1] == expected
+    assert run(list(text))[1] == expected
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"a": 1, "b": 2,}', {"a": 1, "b": 2}), # Trailing comma
+    ('{"a": 1 "b": [1 2]}', {"a": 1, "b": [1, 2]}), # Missing commas
+    ("{'a': 'x', 'b': ['y']}", {"a": "x", "b": ["y"]}), # Single quotes
+    ('{a: 1, b_c: "x"}', {"a": 1, "b_c": "x"}), # Unquoted keys
+    ('{"a": True, "b": None, "c": NaN}', {"a": True, "b": None, "c": None}), # Python literals
+    ('{"a": "line one\nline two"}', {"a": "line one\nline two"}), # Raw newline
+])
+def test_repairs(text, expected):
+    assert run([text])[1] == expected
+    assert run(list(text))[1] == expected
+
+def test_prose_and_fences_are_skipped():
+    text = 'Here you go:\n```json\n{"a": [1, 2]}\n```\nAnything else? {"b": 1}'
+    assert run(list(text))[1] == {"a": [1, 2]}
+    parser = JSONStreamParser()
+    parser.feed("no json yet ")
+    assert not parser.started and parser.close() is None
+
+def test_parse_json():
+    assert parse_json('{"a": 1}') == {"a": 1}
+    assert parse_json('Sure! ```json\n[1, 2,]\n```') == [1, 2]
+    assert parse_json("no json here", default=[]) == []
+    assert parse_json(None, default={}) == {}
@@ -0,0 +1,34 @@
+from datetime import date, timedelta
+import pytest
+from sqlmodel import SQLModel, Session, create_engine
+from app.market_standin import bars
+from app.trading_models import Portfolio, Holding, DailyBar
+from app import risk
+
+END = date.today()
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(risk, "refresh_bars", lambda session, symbols: None)
+    engine = create_engine(f"sqlite:///{tmp_path / 'risk.db'}")
+    SQLModel.metadata.create_all(engine, tables=[t.__table__ for t in (Portfolio, Holding, DailyBar)])
+    with Session(engine) as session:
+        for symbol, days in (("AAPL", 500), ("MSFT", 500), ("SPY", 500), ("^NSEI", 500), ("NEWCO", 30)):
+            frame = bars(symbol, END - timedelta(days=days), END)
+            session.add_all(DailyBar(symbol=symbol, date=ts.date(), open=row.Open, high=row.High, low=row.Low,
+                                     close=row.Close, volume=row.Volume) for ts, row in frame.iterrows())
+        session.add(Portfolio(user_id="u1", balance=0.0))
+        session.flush()
+        session.add_all(Holding(portfolio_id=1, symbol=s, quantity=10, average_price=100.0) for s in ("AAPL", "MSFT", "NEWCO"))
+        session.commit()
+        yield session
+
+def test_short_history_holding_does_not_shorten_the_window(db):
+    result = risk.portfolio_risk(db, "u1", lookback=252)
+
+    assert result["success"]
+    data = result["data"]
+    assert data["missing_history"] == ["NEWCO"]
+    assert set(data["weights"]) == {"AAPL", "MSFT"}
+    assert data["observations"] >= 240
+    assert data["beta"]["SPY"] is not None
@@ -0,0 +1,29 @@
+from app.sentiment import classify, score_texts
+
+def labels(texts):
+    return [name for name, _ in classify(texts)]
+
+def test_labels():
+    assert labels([
+        "Apple shares surge after earnings beat estimates",
+        "Tesla stock plunges as regulators open fraud probe",
+        "Microsoft holds annual shareholder meeting in New York",
+    ]) == ["Positive", "Negative", "Neutral"]
+
+def test_negation():
+    assert labels(["Analysts don't expect strong growth"]) != ["Positive"]
+
+def test_typographic_quotes_match_ascii():
+    pairs = [
+        ("Analysts don't expect strong growth", "Analysts don’t expect strong growth"),
+        ("Nvidia isn't slowing down", "Nvidia isn‘t slowing down"),
+        ('Reliance calls results "strong"', "Reliance calls results “strong”"),
+    ]
+    ascii_scores = score_texts([a for a, _ in pairs])
+    curly_scores = score_texts([c for _, c in pairs])
+    assert list(ascii_scores) == list(curly_scores)
+
+def test_texts_are_scored_independently():
+    batch = score_texts(["Profit warning issued", "Record high as rally continues"])
+    single = [score_texts([t])[0] for t in ("Profit warning issued", "Record high as rally continues")]
+    assert list(batch) == single
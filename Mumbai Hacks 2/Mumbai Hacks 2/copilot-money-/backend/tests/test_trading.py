@@ -0,0 +1,53 @@
+import pytest
+from sqlmodel import SQLModel, Session, create_engine, select
+from app.trading_models import Portfolio, Holding, Transaction, Order
+from app.routers import trading
+from app.routers.trading import BatchTradeRequest, place_trades_batch
+
+PRICES = {"AAPL": 100.0, "MSFT": 400.0}
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(trading, "get_price_snapshot", lambda symbols: {s: PRICES[s] for s in symbols})
+    engine = create_engine(f"sqlite:///{tmp_path / 'trading.db'}")
+    SQLModel.metadata.create_all(engine, tables=[t.__table__ for t in (Portfolio, Holding, Transaction, Order)])
+    with Session(engine) as session:
+        session.add(Portfolio(user_id="u1", balance=1000.0))
+        session.add(Holding(portfolio_id=1, symbol="MSFT", quantity=1, average_price=300.0))
+        session.commit()
+        yield session
+
+def batch(db: Session, orders: list, all_or_none: bool) -> dict:
+    return place_trades_batch(BatchTradeRequest(user_id="u1", orders=orders, all_or_none=all_or_none), db)
+
+ORDERS = [
+    {"symbol": "MSFT", "type": "SELL", "quantity": 1},
+    {"symbol": "AAPL", "type": "BUY", "quantity": 5},
+    {"symbol": "AAPL", "type": "BUY", "quantity": 2, "price": 90.0}, # Rests on the book
+    {"symbol": "AAPL", "type": "BUY", "quantity": 50}, # Insufficient funds
+]
+
+def test_rejected_all_or_none_batch_changes_nothing(db):
+    response = batch(db, ORDERS, all_or_none=True)
+
+    assert response["success"] is False
+    assert response["executed"] == 0
+    assert [r.get("status") for r in response["results"]] == ["ROLLED_BACK", "ROLLED_BACK", "ROLLED_BACK", None]
+    assert not any(r["success"] or "price" in r for r in response["results"])
+
+    db.expire_all()
+    assert db.exec(select(Portfolio)).one().balance == 1000.0
+    assert [(h.symbol, h.quantity) for h in db.exec(select(Holding)).all()] == [("MSFT", 1)]
+    assert db.exec(select(Transaction)).all() == []
+    assert db.exec(select(Order)).all() == []
+
+def test_partial_batch_keeps_the_orders_that_filled(db):
+    response = batch(db, ORDERS, all_or_none=False)
+
+    assert [r.get("status") for r in response["results"]] == ["EXECUTED", "EXECUTED", "PENDING", None]
+    assert response["executed"] == 3
+    assert response["balance"] == 1000.0 + 400.0 - 500.0
+
+    db.expire_all()
+    assert [(h.symbol, h.quantity) for h in db.exec(select(Holding)).all()] == [("AAPL", 5)]
+    assert len(db.exec(select(Order)).all()) == 1
@@ -238,27 +238,29 @@ const PaperTrading = () => {
     let successCount = 0;
 
     try {
-      for (const stock of bulkStocks) {
-        try {
-          const res = await fetch(`${API_BASE_URL}/trading/paper/trade`, {
-            method: "POST",
-            headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({
-              user_id: userId,
-              symbol: stock.symbol.toUpperCase(),
-              type: "BUY",
-              quantity: stock.quantity,
-              price: stock.price || null, // Use limit price if set, else Market
-              stop_loss: null,
-              target_price: null
-            })
-          });
+      // One request, one price snapshot and one commit for the whole basket
+      const res = await fetch(`${API_BASE_URL}/trading/paper/trade/batch`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({
+          user_id: userId,
+          orders: bulkStocks.map((stock) => ({
+            symbol: stock.symbol.toUpperCase(),
+            type: "BUY",
+            quantity: stock.quantity,
+            price: stock.price || null, // Use limit price if set, else Market
+          })),
+        })
+      });
 
-          if (res.ok) {
+      if (res.ok) {
+        const data = await res.json();
+        for (const result of data.results) {
+          if (result.success) {
             successCount++;
+          } else {
+            console.error(`Failed to trade ${result.symbol}: ${result.error}`);
           }
-        } catch (e) {
-          console.error(`Failed to trade ${stock.symbol}`, e);
         }
       }
 